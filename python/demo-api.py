@@ -17,40 +17,556 @@
 
 
 import flask 
+import flask.json.provider
+import werkzeug.exceptions
+import werkzeug.http
+import werkzeug.wrappers
 import logging
+import logging.handlers
+import queue
+import atexit
+import concurrent.futures
 import psycopg2
+import psycopg2.pool
+import psycopg2.extensions
+import psycopg2.errors
 import time
 import random
 import datetime
+import decimal
 import jwt
+import json
+import os
+import select
+import signal
+import threading
+import urllib.parse
+import zlib
 from functools import wraps
 
+# optional response encodings (see RESPONSE COMPRESSION)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+# optional MessagePack wire format (see WIRE FORMATS)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 app = flask.Flask(__name__)
 app.config['JWT_SECRET_KEY'] = 'some_jwt_secret_key'
 
+# Traffic capture (disabled unless a file is given)
+app.config['CAPTURE_FILE'] = os.environ.get('API_CAPTURE_FILE')
+app.config['CAPTURE_SAMPLE_RATE'] = float(os.environ.get('API_CAPTURE_SAMPLE_RATE', '1.0'))
+app.config['CAPTURE_MAX_BYTES'] = int(os.environ.get('API_CAPTURE_MAX_BYTES', str(100 * 1024 * 1024)))
+
 StatusCodes = {
     'success': 200,
+    'accepted': 202,
     'api_error': 400,
     'internal_error': 500,
-    'unauthorized': 401
+    'unauthorized': 401,
+    'service_unavailable': 503,
+    'deadline_exceeded': 504
+}
+
+# Maximum number of items accepted by the bulk endpoints
+MAX_BULK_ITEMS = 10000
+# Students deleted per transaction by the bulk purge
+PURGE_CHUNK_SIZE = 500
+# Sub-requests accepted by /dbproj/batch, and routes that cannot be used in
+# one (they manage their own connections, commit in chunks or are not
+# database calls)
+MAX_BATCH_REQUESTS = 50
+BATCH_EXCLUDED = {'batch_requests', 'student_dashboard', 'export_grades', 'export_enrollments',
+                  'export_attendance', 'register_bulk', 'enroll_degree_bulk', 'purge_students',
+                  'metrics', 'static'}
+# Columns that list_persons may return (?fields=), in response order
+PERSON_FIELDS = ('person_id', 'name', 'age', 'gender', 'nif', 'email', 'address', 'phone')
+# Page size of the person search (type-ahead)
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGE_SIZE = 100
+# Shortest name search: a shorter text has no trigram and cannot use the index
+SEARCH_MIN_QUERY_LENGTH = 3
+# Rejected lines listed in the response of a payment import
+PAYMENT_IMPORT_MAX_REJECTED = 100
+
+
+##########################################################
+## LOGGING
+##########################################################
+
+# Request threads only put records on an in-memory queue; a background
+# listener formats them as single-line JSON and writes them to the file and
+# to the console, so no request waits on file I/O or on the handler locks.
+#
+# LOG_ROUTES sets, per endpoint, the minimum level and the fraction of
+# requests whose records below WARNING are kept. Warnings and errors are
+# never sampled out.
+
+LOG_DEFAULTS = {'level': logging.INFO, 'sample_rate': 1.0}
+
+LOG_ROUTES = {
+    'login_user': {'level': logging.INFO, 'sample_rate': 0.1},
+    'list_persons': {'level': logging.WARNING, 'sample_rate': 1.0},
 }
 
+logger = logging.getLogger('logger')
+log_listener = None
+log_dropped = 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # the record is formatted by the listener thread, not here
+        return record
+
+    def enqueue(self, record):
+        global log_dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_dropped += 1
+
+
+class BlockingQueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # wait for room on shutdown instead of failing with queue.Full
+        self.queue.put(self._sentinel)
+
+
+class RequestLogFilter(logging.Filter):
+    def filter(self, record):
+        if not flask.has_request_context():
+            return True
+
+        request = flask.request._get_current_object()
+        g = flask.g._get_current_object()
+
+        config = LOG_ROUTES.get(request.endpoint, LOG_DEFAULTS)
+        if record.levelno < config['level']:
+            return False
+
+        if record.levelno < logging.WARNING:
+            # decide once per request so that its records are kept or dropped together
+            sampled = g.get('log_sampled')
+            if sampled is None:
+                sampled = g.log_sampled = random.random() < config['sample_rate']
+            if not sampled:
+                return False
+
+        # capture the request context here, the formatter runs in the listener thread
+        record.route = request.endpoint
+        record.method = request.method
+        record.path = request.path
+        record.person_id = g.get('person_id')
+        record.role = g.get('role')
+        return True
+
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage()
+        }
+        for key in ('route', 'method', 'path', 'person_id', 'role'):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if getattr(record, 'fields', None):
+            entry.update(record.fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(filename='log_file.log', stream=None, level=logging.DEBUG, queue_size=10000):
+    global log_listener
+
+    file_handler = logging.FileHandler(filename)
+    stream_handler = logging.StreamHandler(stream)
+    formatter = JsonLogFormatter()
+    file_handler.setFormatter(formatter)
+    stream_handler.setFormatter(formatter)
+
+    # bounded queue: if the writer falls behind records are dropped instead of blocking requests
+    log_queue = queue.Queue(queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestLogFilter())
+
+    logger.handlers = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    # werkzeug's access log goes through the same queue
+    werkzeug_logger = logging.getLogger('werkzeug')
+    werkzeug_logger.handlers = [queue_handler]
+    werkzeug_logger.propagate = False
+
+    log_listener = BlockingQueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(stop_logging)
+    return log_listener
+
+
+def stop_logging():
+    global log_listener
+
+    # flushes the records still in the queue
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
 
 ##########################################################
 ## DATABASE ACCESS
 ##########################################################
 
-def db_connection():
-    db = psycopg2.connect(
-        user='aulaspl',
-        password='aulaspl',
-        host='127.0.0.1',
-        port='5432',
-        database='projeto'
-    )
+# Connections are grouped in bulkheads: each route class (ROUTE_CLASSES) has
+# its own pools, its own concurrency limit (see ADMISSION CONTROL) and its own
+# PostgreSQL statement_timeout, so slow analytic queries can never hold the
+# connections that the short transactional routes (login, enrollments) need.
+#
+# Within a bulkhead, read-only routes (READ_ONLY_ROUTES) are sent to the
+# replica when one is configured; everything else goes to the primary.
+# A read goes to the primary instead of the replica when:
+#   - the request carries the header `X-Read-Your-Writes: 1`;
+#   - the same person made a successful write less than
+#     READ_YOUR_WRITES_WINDOW seconds ago (tracked per worker);
+#   - the replica lags more than REPLICA_MAX_LAG seconds or is unreachable.
+#
+# To test locally run a second PostgreSQL instance (e.g. on port 5433) and
+# start the API with API_DB_REPLICA_PORT=5433.
+
+DB_PRIMARY = {
+    'user': 'aulaspl',
+    'password': 'aulaspl',
+    'host': '127.0.0.1',
+    'port': '5432',
+    'database': 'projeto'
+}
+
+DB_REPLICA = None
+if os.environ.get('API_DB_REPLICA_HOST') or os.environ.get('API_DB_REPLICA_PORT'):
+    DB_REPLICA = dict(DB_PRIMARY,
+                      host=os.environ.get('API_DB_REPLICA_HOST', DB_PRIMARY['host']),
+                      port=os.environ.get('API_DB_REPLICA_PORT', DB_PRIMARY['port']))
+
+# pool_size connections per server; statement_timeout and deadline (the
+# default latency budget of the class, see DEADLINES) in milliseconds
+BULKHEADS = {
+    'transactional': {
+        'pool_size': 8, 'statement_timeout': 5000, 'deadline': 3000,
+        'max_in_flight': 8, 'max_queue': 16, 'queue_timeout': 0.5, 'retry_after': 1
+    },
+    'analytic': {
+        'pool_size': 2, 'statement_timeout': 60000, 'deadline': 30000,
+        'max_in_flight': 2, 'max_queue': 4, 'queue_timeout': 2.0, 'retry_after': 5
+    },
+    # each dashboard holds one connection per part (DASHBOARD_PARTS), so the
+    # pool fits max_in_flight dashboards without touching the transactional pool
+    'dashboard': {
+        'pool_size': 8, 'statement_timeout': 5000, 'deadline': 3000,
+        'max_in_flight': 2, 'max_queue': 8, 'queue_timeout': 0.5, 'retry_after': 1
+    },
+    # CSV exports hold their connection for as long as the client takes to
+    # download, so they get their own slots instead of the analytic ones
+    'export': {
+        'pool_size': 2, 'statement_timeout': 600000, 'deadline': 600000,
+        'max_in_flight': 2, 'max_queue': 2, 'queue_timeout': 1.0, 'retry_after': 30
+    }
+}
+
+ROUTE_CLASSES = {
+    'degree_details': 'analytic',
+    'top3_students': 'analytic',
+    'top_by_district': 'analytic',
+    'monthly_report': 'analytic',
+    'import_payments': 'analytic',
+    'reconcile_payments': 'analytic',
+    'export_grades': 'export',
+    'export_enrollments': 'export',
+    'export_attendance': 'export',
+    'student_dashboard': 'dashboard'
+}
+
+READ_ONLY_ROUTES = {
+    'list_persons',
+    'student_course_details',
+    'degree_details',
+    'top3_students',
+    'top_by_district',
+    'monthly_report',
+    'student_financial_status',
+    'student_dashboard',
+    'search_persons',
+    'export_grades',
+    'export_enrollments',
+    'export_attendance'
+}
+
+READ_YOUR_WRITES_WINDOW = 5.0
+REPLICA_MAX_LAG = 2.0
+REPLICA_CHECK_INTERVAL = 1.0
+
+# (bulkhead, server) -> pool
+db_pools = {}
+db_pools_lock = threading.Lock()
+
+replica_state = {'lag': 0.0, 'healthy': True, 'checked_at': 0.0, 'conn': None}
+replica_state_lock = threading.Lock()
+
+# person_id -> time of the last successful write made by that person
+recent_writers = {}
+
+db_routing_stats = {'primary': 0, 'replica': 0, 'read_your_writes': 0, 'replica_fallback': 0, 'unpooled': 0}
+# guards recent_writers and db_routing_stats
+db_routing_lock = threading.Lock()
+
+bulkhead_stats = {name: {'in_use': 0, 'max_in_use': 0, 'acquired': 0, 'unpooled': 0} for name in BULKHEADS}
+bulkhead_stats_lock = threading.Lock()
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    # remembers where the connection must be returned to and the deadline
+    # of the request using it; `batch` is set while /dbproj/batch shares the
+    # connection with its sub-requests (see batch_requests)
+    pool = None
+    bulkhead = None
+    deadline = None
+    batch = None
+    item_rolled_back = False
+
+    def commit(self):
+        # an all-or-nothing batch commits once, after its last sub-request
+        if self.batch == 'atomic':
+            return
+        super().commit()
+
+    def rollback(self):
+        # inside an all-or-nothing batch a handler only undoes its own
+        # sub-request (batch_requests sets a savepoint before each one)
+        if self.batch == 'atomic':
+            super().cursor(cursor_factory=psycopg2.extensions.cursor).execute('ROLLBACK TO SAVEPOINT batch_item')
+            # even if the handler answers success, part of its work is gone
+            self.item_rolled_back = True
+            return
+        super().rollback()
+
+
+def route_class(endpoint):
+    return ROUTE_CLASSES.get(endpoint, 'transactional')
+
+
+def connection_params(bulkhead, target):
+    params = dict(DB_PRIMARY if target == 'primary' else DB_REPLICA)
+    params['options'] = f'-c statement_timeout={BULKHEADS[bulkhead]["statement_timeout"]}'
+    params['application_name'] = f'api-{bulkhead}'
+    params['cursor_factory'] = DeadlineCursor
+    return params
+
+
+def get_pool(bulkhead, target):
+    key = (bulkhead, target)
+    pool = db_pools.get(key)
+    if pool is None:
+        with db_pools_lock:
+            pool = db_pools.get(key)
+            if pool is None:
+                size = BULKHEADS[bulkhead]['pool_size']
+                # minconn == maxconn: psycopg2 closes returned connections above minconn
+                pool = psycopg2.pool.ThreadedConnectionPool(size, size, connection_factory=PooledConnection,
+                                                            **connection_params(bulkhead, target))
+                db_pools[key] = pool
+    return pool
+
+
+def replica_lag():
+    # dedicated connection, only used by the thread holding replica_state_lock
+    conn = replica_state['conn']
+    if conn is None or conn.closed:
+        conn = replica_state['conn'] = psycopg2.connect(application_name='api-lag-check', **DB_REPLICA)
+        conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        # NULL when the server is not a standby (e.g. two independent local instances)
+        cur.execute('''
+            SELECT CASE
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+            END
+        ''')
+        return float(cur.fetchone()[0] or 0)
+    except (Exception, psycopg2.DatabaseError):
+        conn.close()
+        raise
+
+
+def replica_available():
+    now = time.monotonic()
+    if now - replica_state['checked_at'] >= REPLICA_CHECK_INTERVAL and replica_state_lock.acquire(blocking=False):
+        # only one thread refreshes the state, the others use the cached value
+        try:
+            try:
+                replica_state['lag'] = replica_lag()
+                replica_state['healthy'] = True
+            except (Exception, psycopg2.DatabaseError) as error:
+                logger.warning(f'replica check failed: {error}')
+                replica_state['healthy'] = False
+            replica_state['checked_at'] = now
+        finally:
+            replica_state_lock.release()
+
+    return replica_state['healthy'] and replica_state['lag'] <= REPLICA_MAX_LAG
+
+
+def choose_target():
+    if DB_REPLICA is None or not flask.has_request_context():
+        return 'primary'
+    if flask.request.endpoint not in READ_ONLY_ROUTES:
+        return 'primary'
+
+    person_id = flask.g.get('person_id')
+    last_write = recent_writers.get(person_id) if person_id is not None else None
+    if flask.request.headers.get('X-Read-Your-Writes') == '1' or \
+            (last_write is not None and time.monotonic() - last_write < READ_YOUR_WRITES_WINDOW):
+        with db_routing_lock:
+            db_routing_stats['read_your_writes'] += 1
+        return 'primary'
+
+    if not replica_available():
+        with db_routing_lock:
+            db_routing_stats['replica_fallback'] += 1
+        return 'primary'
+
+    return 'replica'
+
+
+def db_connection(bulkhead=None):
+    # the sub-requests of a batch all use the batch's connection
+    if flask.has_request_context() and flask.g.get('batch_connection') is not None:
+        return flask.g.batch_connection
+
+    if bulkhead is None:
+        bulkhead = route_class(flask.request.endpoint) if flask.has_request_context() else 'transactional'
+    target = choose_target()
+
+    pool = get_pool(bulkhead, target)
+    try:
+        db = pool.getconn()
+    except psycopg2.pool.PoolError:
+        # pool exhausted: fall back to a dedicated connection, closed on release
+        with db_routing_lock:
+            db_routing_stats['unpooled'] += 1
+        with bulkhead_stats_lock:
+            bulkhead_stats[bulkhead]['unpooled'] += 1
+        db = psycopg2.connect(connection_factory=PooledConnection, **connection_params(bulkhead, target))
+        pool = None
+
+    if target == 'replica':
+        db.set_session(readonly=True)
+    db.pool = pool
+    db.bulkhead = bulkhead
+    db.deadline = flask.g.get('deadline') if flask.has_request_context() else None
+    with db_routing_lock:
+        db_routing_stats[target] += 1
+
+    with bulkhead_stats_lock:
+        stats = bulkhead_stats[bulkhead]
+        stats['acquired'] += 1
+        stats['in_use'] += 1
+        stats['max_in_use'] = max(stats['max_in_use'], stats['in_use'])
 
     return db
 
+
+def release_connection(db):
+    if db.batch is not None:
+        return
+    if db.bulkhead is not None:
+        with bulkhead_stats_lock:
+            bulkhead_stats[db.bulkhead]['in_use'] -= 1
+        db.bulkhead = None
+    db.deadline = None
+
+    pool = db.pool
+    if pool is None or pool.closed:
+        db.close()
+    else:
+        # putconn rolls back any transaction left open by the handler
+        pool.putconn(db, close=db.closed != 0)
+
+
+def db_routing_snapshot():
+    with db_routing_lock:
+        return dict(db_routing_stats)
+
+
+def bulkhead_snapshot():
+    with bulkhead_stats_lock:
+        return {
+            name: dict(stats,
+                       pool_size=BULKHEADS[name]['pool_size'],
+                       utilisation=round(stats['in_use'] / BULKHEADS[name]['pool_size'], 3),
+                       statement_timeout=BULKHEADS[name]['statement_timeout'])
+            for name, stats in bulkhead_stats.items()
+        }
+
+
+# psycopg2 has no libpq pipeline mode, so independent statements of a handler
+# are batched explicitly: lookups are combined into one SELECT and writes
+# are sent as one multi-statement string. Both take a single round trip.
+
+def fetch_pipeline(cur, queries):
+    # one value per (query, params); each query must return at most one row and column
+    sql = 'SELECT ' + ', '.join(f'({query})' for query, _ in queries)
+    cur.execute(sql, [param for _, params in queries for param in params])
+    return cur.fetchone()
+
+
+def execute_pipeline(cur, statements):
+    # the cursor holds the result of the last statement only
+    cur.execute(b';\n'.join(cur.mogrify(statement, params) for statement, params in statements))
+
+
+def request_failed(status_code, body):
+    # most handlers answer errors with HTTP 200 and the code in the envelope
+    envelope = body.get('status') if isinstance(body, dict) else None
+    return status_code >= 400 or (isinstance(envelope, int) and envelope >= 400)
+
+
+@app.after_request
+def track_writes(response):
+    # remember who wrote so that their next reads see their own changes
+    if flask.request.method == 'GET' or flask.g.get('person_id') is None:
+        return response
+    body = None
+    if (response.is_json or response.mimetype in MSGPACK_MIMETYPES) and not response.is_streamed:
+        body = response.get_json(silent=True)
+    if request_failed(response.status_code, body):
+        return response
+
+    now = time.monotonic()
+    with db_routing_lock:
+        recent_writers[flask.g.person_id] = now
+        if len(recent_writers) > 10000:
+            for person_id, last_write in list(recent_writers.items()):
+                if now - last_write >= READ_YOUR_WRITES_WINDOW:
+                    del recent_writers[person_id]
+    return response
+
 ##########################################################
 ## AUTHENTICATION HELPERS
 ##########################################################
@@ -59,7 +575,6 @@ def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = flask.request.headers.get('Authorization')
-        logger.info(f'token: {token}')
 
         if not token:
             return flask.jsonify({'status': StatusCodes['unauthorized'], 'errors': 'Token is missing!', 'results': None})
@@ -76,6 +591,7 @@ def token_required(f):
             flask.g.name = data['name']
             flask.g.email = data['email']
             flask.g.role = data['role']
+            logger.debug('authenticated request')
         except jwt.ExpiredSignatureError:
             return flask.jsonify({'status': StatusCodes['unauthorized'], 'errors': 'Token has expired', 'results': None})
         except jwt.InvalidTokenError:
@@ -85,276 +601,2555 @@ def token_required(f):
     return decorated
 
 ##########################################################
-## ENDPOINTS
+## TRAFFIC CAPTURE
 ##########################################################
 
-@app.route('/persons/', methods=['POST'])
-def add_person():
-    logger.info('POST /persons')
-    payload = flask.request.get_json()
+# Records a sample of the requests served (method, path, body, role and
+# timing) as JSON lines, so that they can later be replayed against a test
+# instance with python/tools/replay.py. The Authorization header is never
+# written; the replayer logs in again for each role. Body fields named in
+# CAPTURE_REDACTED_KEYS (passwords, tokens) are replaced by CAPTURE_REDACTED at
+# any depth. When the file reaches CAPTURE_MAX_BYTES it is renamed to
+# `<file>.1` (replacing the previous one) and a new file is started.
 
-    # validação básica dos campos obrigatórios
-    required = ['name', 'age', 'gender', 'nif', 'address', 'phone', 'password']
-    for field in required:
-        if field not in payload:
-            response = {
-                'status': StatusCodes['api_error'],
-                'results': f'{field} value not in payload'
-            }
-            return flask.jsonify(response), 400
+CAPTURE_REDACTED_KEYS = {'password', 'token', 'access_token', 'refresh_token', 'authorization'}
+CAPTURE_REDACTED = '[redacted]'
 
-    conn = db_connection()
-    cur = conn.cursor()
-    
-    try:
-        # Inserir na tabela person
-        stmt = '''
-            INSERT INTO person
-                    (name, age, gender, nif, email, address, phone, password)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING person_id
-        '''
-        vals = (
-            payload['name'],
-            payload['age'],
-            payload['gender'],
-            payload['nif'],
-            payload.get('email'),
-            payload['address'],
-            payload['phone'],
-            payload['password']
-        )
+capture_lock = threading.Lock()
+capture_file = None
 
-        cur.execute(stmt, vals)
-        person_id = cur.fetchone()[0]
 
-        conn.commit()
-        response = {
-            'status': StatusCodes['success'],
-            'results': {
-                'person_id': person_id
-            }
-        }
-        return flask.jsonify(response), 201
+def redact(value):
+    if isinstance(value, dict):
+        return {key: CAPTURE_REDACTED if str(key).lower() in CAPTURE_REDACTED_KEYS else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
 
-    except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'POST /persons - error: {error}')
-        conn.rollback()
-        response = {
-            'status': StatusCodes['internal_error'],
-            'errors': str(error)
-        }
-        return flask.jsonify(response), 500
 
-    finally:
-        if conn is not None:
-            conn.close()
+def capture_enabled():
+    return bool(app.config.get('CAPTURE_FILE')) and app.config.get('CAPTURE_SAMPLE_RATE', 0) > 0
 
-@app.route('/get_persons/', methods=['GET'])
-def list_persons():
-    logger.info('GET /persons')
 
-    stmt = '''
-        SELECT
-            person_id,
-            name,
-            age,
-            gender,
-            nif,
-            email,
-            address,
-            phone
-        FROM person
-        ORDER BY person_id
-    '''
+@app.before_request
+def capture_start():
+    if capture_enabled():
+        flask.g.capture_start = time.time()
+        flask.g.capture_timer = time.perf_counter()
 
-    conn = db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(stmt)
-        rows = cur.fetchall()
 
-        persons = []
-        for person_id, name, age, gender, nif, email, address, phone in rows:
-            persons.append({
-                'person_id': person_id,
-                'name': name,
-                'age': age,
-                'gender': gender,
-                'nif': nif,
-                'email': email,
-                'address': address,
-                'phone': phone
-            })
+@app.after_request
+def capture_request(response):
+    global capture_file
 
-        return flask.jsonify({
-            'status': StatusCodes['success'],
-            'results': persons
-        }), 200
+    if 'capture_timer' not in flask.g or random.random() >= app.config['CAPTURE_SAMPLE_RATE']:
+        return response
 
-    except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'GET /persons - error: {error}')
-        return flask.jsonify({
-            'status': StatusCodes['internal_error'],
-            'errors': str(error)
-        }), 500
+    # Most errors are reported in the JSON envelope with HTTP 200
+    api_status = None
+    if (response.is_json or response.mimetype in MSGPACK_MIMETYPES) and not response.is_streamed:
+        payload = response.get_json(silent=True)
+        if isinstance(payload, dict):
+            api_status = payload.get('status')
 
-    finally:
-        if conn is not None:
-            conn.close()
+    record = {
+        'ts': flask.g.capture_start,
+        'method': flask.request.method,
+        'path': flask.request.full_path.rstrip('?'),
+        'rule': flask.request.url_rule.rule if flask.request.url_rule else None,
+        'body': redact(flask.request.get_json(silent=True)),
+        'role': flask.g.get('role'),
+        'person_id': flask.g.get('person_id'),
+        'status': response.status_code,
+        'api_status': api_status,
+        'duration_ms': round((time.perf_counter() - flask.g.capture_timer) * 1000.0, 3)
+    }
+    line = json.dumps(record, default=str) + '\n'
 
+    with capture_lock:
+        if capture_file is None:
+            capture_file = open(app.config['CAPTURE_FILE'], 'a', buffering=1)
+        capture_file.write(line)
+        if capture_file.tell() >= app.config['CAPTURE_MAX_BYTES']:
+            capture_file.close()
+            capture_file = None
+            os.replace(app.config['CAPTURE_FILE'], app.config['CAPTURE_FILE'] + '.1')
 
-@app.route('/dbproj/user', methods=['PUT'])
-def login_user():
-    data = flask.request.get_json()
-    email = data.get('email')
-    password = data.get('password')
+    return response
 
-    if not email or not password:
-        return flask.jsonify({'status': StatusCodes['api_error'], 'errors': 'Email and password are required', 'results': None})
+##########################################################
+## ADMISSION CONTROL
+##########################################################
 
-    # Connect to database
-    conn = db_connection()
-    cur = conn.cursor()
-    
-    try:
-        # Query para verificar credenciais usando a tabela person
-        stmt = '''
-            SELECT p.person_id, p.name, p.email
-            FROM person p
-            WHERE p.email = %s AND p.password = %s
-        '''
-        cur.execute(stmt, (email, password))
-        user = cur.fetchone()
-        
-        if user is None:
-            return flask.jsonify({'status': StatusCodes['unauthorized'], 'errors': 'Invalid email or password', 'results': None})
-        
-        person_id, name, email = user
-        
-        # Verificar tipo de usuário
-        role = 'unknown'
-        
-        # Verificar se é estudante
-        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (person_id,))
-        is_student = cur.fetchone() is not None
-        
-        # Verificar se é instructor
-        cur.execute('SELECT worker_person_person_id FROM instructor WHERE worker_person_person_id = %s', (person_id,))
-        is_instructor = cur.fetchone() is not None
-        
-        # Verificar se é staff
-        cur.execute('SELECT worker_person_person_id FROM staff WHERE worker_person_person_id = %s', (person_id,))
-        is_staff = cur.fetchone() is not None
-        
-        # Determinar role
-        if is_student:
-            role = 'student'
-        elif is_instructor:
-            role = 'instructor'
-        elif is_staff:
-            role = 'staff'
-        
-        # Gerar token JWT com informações do usuário
-        token_payload = {
-            'person_id': person_id,
-            'name': name,
-            'email': email,
-            'role': role,
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)  # Token expira em 24 horas
-        }
-        
-        token = jwt.encode(token_payload, app.config['JWT_SECRET_KEY'], algorithm="HS256")
-        
-        response = {'status': StatusCodes['success'], 'errors': None, 'results': token}
-        return flask.jsonify(response)
-        
-    except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'PUT /dbproj/user - error: {error}')
-        response = {'status': StatusCodes['internal_error'], 'errors': str(error), 'results': None}
-        return flask.jsonify(response)
-        
-    finally:
-        if conn is not None:
-            conn.close()
+# Bounds the number of requests of each route class (bulkhead, see
+# BULKHEADS) that are being served at the same time. A request that finds its
+# class full waits in a short queue; when the queue is also full, or the wait
+# exceeds `queue_timeout`, it is shed immediately with 503 and a Retry-After
+# header instead of piling more work on a saturated database.
+
+ADMISSION_EXEMPT = {'metrics', 'static'}
+
+
+class AdmissionController:
+    def __init__(self, name, max_in_flight, max_queue, queue_timeout, retry_after):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_timeout': 0, 'max_queue_depth': 0}
+
+    def acquire(self):
+        with self.cond:
+            if self.in_flight < self.max_in_flight and self.waiting == 0:
+                self.in_flight += 1
+                self.stats['admitted'] += 1
+                return True
+
+            if self.waiting >= self.max_queue:
+                self.stats['shed_queue_full'] += 1
+                return False
+
+            self.waiting += 1
+            self.stats['queued'] += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.waiting)
+            try:
+                admitted = self.cond.wait_for(lambda: self.in_flight < self.max_in_flight, self.queue_timeout)
+            finally:
+                self.waiting -= 1
+
+            if not admitted:
+                self.stats['shed_timeout'] += 1
+                return False
+
+            self.in_flight += 1
+            self.stats['admitted'] += 1
+            return True
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify()
+
+    def snapshot(self):
+        with self.cond:
+            return dict(self.stats,
+                        in_flight=self.in_flight,
+                        queue_depth=self.waiting,
+                        max_in_flight=self.max_in_flight,
+                        max_queue=self.max_queue)
+
+
+admission_controllers = {
+    name: AdmissionController(name, config['max_in_flight'], config['max_queue'], config['queue_timeout'], config['retry_after'])
+    for name, config in BULKHEADS.items()
+}
+
+
+@app.before_request
+def admit_request():
+    # time spent waiting for admission counts against the request deadline
+    flask.g.request_start = time.monotonic()
+
+    endpoint = flask.request.endpoint
+    if endpoint is None or endpoint in ADMISSION_EXEMPT:
+        return None
+
+    controller = admission_controllers[route_class(endpoint)]
+    if not controller.acquire():
+        logger.warning(f'request shed by {controller.name} admission control')
+        response = flask.jsonify({
+            'status': StatusCodes['service_unavailable'],
+            'errors': 'Server is busy, please retry later',
+            'results': None
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(controller.retry_after)
+        return response
+
+    flask.g.admission = controller
+    return None
+
+
+@app.teardown_request
+def release_admission(error=None):
+    controller = flask.g.pop('admission', None)
+    if controller is not None:
+        controller.release()
+
+##########################################################
+## DEADLINES
+##########################################################
+
+# Every request has a latency budget: ROUTE_DEADLINES for the listed routes,
+# otherwise the `deadline` of its bulkhead. Each statement a handler runs is
+# sent together with `SET LOCAL statement_timeout` set to what is left of the
+# budget, so a runaway query is cancelled by PostgreSQL when the client would
+# have given up anyway. A request that runs out of budget gets HTTP 504 with
+# status `deadline_exceeded`, which clients may retry.
+
+ROUTE_DEADLINES = {
+    'login_user': 1000,
+    'search_persons': 1000,
+    'register_bulk': 60000,
+    'enroll_degree_bulk': 60000,
+    'purge_students': 120000,
+    'batch_requests': 30000,
+    'degree_details': 10000,
+    'top_by_district': 10000,
+    'export_grades': 600000,
+    'export_enrollments': 600000,
+    'export_attendance': 600000
+}
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class DeadlineCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        deadline = self.connection.deadline
+        if deadline is None or self.connection.autocommit:
+            return super().execute(query, vars)
+        # an aborted transaction accepts only ROLLBACK (TO SAVEPOINT)
+        if self.connection.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            return super().execute(query, vars)
+
+        remaining = int((deadline - time.monotonic()) * 1000)
+        if remaining <= 0:
+            flag_deadline_exceeded()
+            raise DeadlineExceeded('Deadline exceeded before running the query')
+        remaining = min(remaining, BULKHEADS[self.connection.bulkhead]['statement_timeout'])
+
+        # same round trip: the result is the one of the last statement
+        statement = self.mogrify('SET LOCAL statement_timeout = %s; ', (remaining,)) + self.mogrify(query, vars)
+        try:
+            return super().execute(statement)
+        except psycopg2.errors.QueryCanceled:
+            flag_deadline_exceeded()
+            raise
+
+
+def flag_deadline_exceeded():
+    if flask.has_request_context():
+        flask.g.deadline_exceeded = True
+
+
+@app.before_request
+def start_deadline():
+    endpoint = flask.request.endpoint
+    if endpoint is None:
+        return
+    budget = ROUTE_DEADLINES.get(endpoint, BULKHEADS[route_class(endpoint)]['deadline'])
+    flask.g.deadline = flask.g.get('request_start', time.monotonic()) + budget / 1000.0
+
+
+@app.after_request
+def report_deadline(response):
+    if not flask.g.get('deadline_exceeded'):
+        return response
+
+    logger.warning('request deadline exceeded')
+    response = flask.jsonify({
+        'status': StatusCodes['deadline_exceeded'],
+        'errors': 'Deadline exceeded, please retry later',
+        'results': None
+    })
+    response.status_code = 504
+    response.headers['Retry-After'] = '1'
+    return response
+
+##########################################################
+## WIRE FORMATS
+##########################################################
+
+# Every response keeps the {status, errors, results} envelope; clients that
+# send `Accept: application/msgpack` get it encoded as MessagePack instead of
+# JSON (when the msgpack package is installed), and request bodies sent with
+# `Content-Type: application/msgpack` are decoded the same way. Datetimes are
+# sent as the MessagePack Timestamp extension (naive values are taken as
+# UTC), dates as ISO 8601 strings and decimals as strings.
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def msgpack_default(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not MessagePack serializable')
+
+
+def msgpack_dumps(obj):
+    return msgpack.packb(obj, default=msgpack_default)
+
+
+def msgpack_loads(data):
+    return msgpack.unpackb(data, timestamp=3)
+
+
+def prefers_msgpack(request):
+    if msgpack is None:
+        return False
+    return request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES) in MSGPACK_MIMETYPES
+
+
+class ApiJSONProvider(flask.json.provider.DefaultJSONProvider):
+    # flask.jsonify goes through response(), so every endpoint negotiates the format
+    def response(self, *args, **kwargs):
+        if not flask.has_request_context() or not prefers_msgpack(flask.request):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(msgpack_dumps(obj), mimetype=MSGPACK_MIMETYPES[0])
+
+
+class ApiRequest(flask.Request):
+    def get_json(self, force=False, silent=False, cache=True):
+        if msgpack is None or self.mimetype not in MSGPACK_MIMETYPES:
+            return super().get_json(force=force, silent=silent, cache=cache)
+        try:
+            return msgpack_loads(self.get_data(cache=cache))
+        except (ValueError, msgpack.UnpackException):
+            if silent:
+                return None
+            raise werkzeug.exceptions.BadRequest('Failed to decode MessagePack body')
+
+
+class ApiResponse(flask.Response):
+    def get_json(self, force=False, silent=False):
+        if msgpack is None or self.mimetype not in MSGPACK_MIMETYPES:
+            return super().get_json(force=force, silent=silent)
+        try:
+            return msgpack_loads(self.get_data())
+        except (ValueError, msgpack.UnpackException):
+            if silent:
+                return None
+            raise
+
+
+app.json = ApiJSONProvider(app)
+app.request_class = ApiRequest
+app.response_class = ApiResponse
+
+##########################################################
+## RESPONSE COMPRESSION
+##########################################################
+
+# Responses are compressed with the best encoding offered in Accept-Encoding
+# (zstd and br only when the zstandard / brotli packages are installed,
+# gzip always). It is done by a WSGI middleware, around the whole Flask app,
+# so it sees the final response after every after_request hook and works on
+# streamed bodies chunk by chunk. Bodies smaller than COMPRESSION_MIN_SIZE go
+# out uncompressed. Bodies larger than COMPRESSION_STREAM_SIZE are compressed
+# incrementally while they are sent instead of all at once, so the worker
+# does not hold the whole compressed copy nor delay the first byte.
+
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_STREAM_SIZE = 1024 * 1024
+COMPRESSION_CHUNK_SIZE = 64 * 1024
+COMPRESSION_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'application/x-msgpack', 'text/')
+
+compression_stats = {'skipped_small': 0}
+compression_stats_lock = threading.Lock()
+
+
+def available_encodings():
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def compressor(encoding):
+    # (compress(chunk), flush()) for the chosen encoding
+    level = COMPRESSION_LEVELS[encoding]
+    if encoding == 'zstd':
+        obj = zstandard.ZstdCompressor(level=level).compressobj()
+        return obj.compress, obj.flush
+    if encoding == 'br':
+        obj = brotli.Compressor(quality=level)
+        return obj.process, obj.finish
+    obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return obj.compress, obj.flush
+
+
+def record_compression(encoding, bytes_in, bytes_out, cpu):
+    with compression_stats_lock:
+        stats = compression_stats.setdefault(encoding, {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_ms': 0.0})
+        stats['responses'] += 1
+        stats['bytes_in'] += bytes_in
+        stats['bytes_out'] += bytes_out
+        stats['cpu_ms'] += cpu * 1000.0
+
+
+def compression_snapshot():
+    with compression_stats_lock:
+        snapshot = {'skipped_small': compression_stats['skipped_small'], 'available': available_encodings()}
+        for encoding, stats in compression_stats.items():
+            if encoding != 'skipped_small':
+                snapshot[encoding] = dict(stats, bytes_saved=stats['bytes_in'] - stats['bytes_out'],
+                                          cpu_ms=round(stats['cpu_ms'], 3))
+        return snapshot
+
+
+class CompressionMiddleware:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        accept = werkzeug.http.parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = accept.best_match(available_encodings())
+        if encoding is None:
+            return self.wsgi_app(environ, start_response)
+
+        response = werkzeug.wrappers.Response.from_app(self.wsgi_app, environ)
+        if not self.compressible(response):
+            return response(environ, start_response)
+
+        response.vary.add('Accept-Encoding')
+        length = response.content_length
+        if length is not None and length < COMPRESSION_MIN_SIZE:
+            with compression_stats_lock:
+                compression_stats['skipped_small'] += 1
+            return response(environ, start_response)
+
+        if length is not None and length <= COMPRESSION_STREAM_SIZE:
+            body = response.get_data()
+            compress, flush = compressor(encoding)
+            start = time.thread_time()
+            data = compress(body) + flush()
+            record_compression(encoding, len(body), len(data), time.thread_time() - start)
+            response.set_data(data)
+        else:
+            response.response = self.stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+            response.direct_passthrough = True
+
+        response.headers['Content-Encoding'] = encoding
+        return response(environ, start_response)
+
+    def compressible(self, response):
+        return (response.status_code >= 200 and response.status_code not in (204, 304)
+                and 'Content-Encoding' not in response.headers
+                and (response.mimetype or '').startswith(COMPRESSIBLE_TYPES))
+
+    def stream(self, body, encoding):
+        compress, flush = compressor(encoding)
+        bytes_in = bytes_out = 0
+        cpu = 0.0
+        pending = []
+        pending_size = 0
+        try:
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                # juntar pedaços pequenos para que cada um comprima bem
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size < COMPRESSION_CHUNK_SIZE:
+                    continue
+                start = time.thread_time()
+                data = compress(b''.join(pending))
+                cpu += time.thread_time() - start
+                bytes_in += pending_size
+                pending, pending_size = [], 0
+                if data:
+                    bytes_out += len(data)
+                    yield data
+
+            start = time.thread_time()
+            data = (compress(b''.join(pending)) if pending else b'') + flush()
+            cpu += time.thread_time() - start
+            bytes_in += pending_size
+            bytes_out += len(data)
+            yield data
+        finally:
+            # fecha o iterador original (e o contexto de um stream_with_context)
+            if hasattr(body, 'close'):
+                body.close()
+            record_compression(encoding, bytes_in, bytes_out, cpu)
+
+
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+
+##########################################################
+## ATTENDANCE CHECK-IN BUFFER
+##########################################################
+
+# Students check themselves in at the start of a lecture, so hundreds of
+# single-row updates hit the same class within a minute. Check-ins are kept in
+# memory, coalesced per class (a repeated check-in is free), and written by a
+# background thread with one mark_attendance statement per class once
+# CHECKIN_BATCH_SIZE check-ins are pending or CHECKIN_FLUSH_INTERVAL seconds
+# have passed. Pending check-ins are flushed on graceful shutdown and on
+# SIGTERM; a crash or SIGKILL loses at most the check-ins of the last
+# CHECKIN_FLUSH_INTERVAL seconds (up to CHECKIN_BATCH_SIZE of them).
+
+CHECKIN_BATCH_SIZE = 500
+CHECKIN_FLUSH_INTERVAL = 2.0
+# flushes a class may fail before its check-ins are dropped
+CHECKIN_MAX_ATTEMPTS = 5
+
+
+class CheckInBuffer:
+    def __init__(self, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.pending_count = 0
+        self.thread = None
+        self.stopping = False
+        self.latencies = []
+        self.attempts = {}
+        self.stats = {'checkins': 0, 'coalesced': 0, 'flushes': 0, 'batches': 0, 'written': 0,
+                      'not_enrolled': 0, 'flush_errors': 0, 'dropped': 0, 'max_batch_size': 0}
+
+    def add(self, class_id, student_id):
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='checkin-flusher', daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+
+            self.stats['checkins'] += 1
+            students = self.pending.setdefault(class_id, set())
+            if student_id in students:
+                self.stats['coalesced'] += 1
+                return
+            students.add(student_id)
+            self.pending_count += 1
+            if self.pending_count >= self.batch_size:
+                self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.stopping or self.pending_count >= self.batch_size, self.flush_interval)
+                if self.stopping:
+                    return
+            # o flusher nunca pode morrer, senão os check-ins acumulam-se em memória
+            try:
+                self.flush()
+            except Exception as error:
+                logger.exception(f'Check-in flusher error: {error}')
+
+    def flush(self):
+        with self.cond:
+            batch, self.pending, self.pending_count = self.pending, {}, 0
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        failed = {}
+        conn = None
+        try:
+            conn = db_connection('transactional')
+            for class_id, students in list(batch.items()):
+                try:
+                    marked = mark_attendance(conn.cursor(), class_id, [(student_id, True) for student_id in students])
+                    conn.commit()
+                except (Exception, psycopg2.DatabaseError) as error:
+                    conn.rollback()
+                    logger.error(f'Error flushing check-ins of class {class_id}: {error}')
+                    failed[class_id] = students
+                    continue
+                with self.cond:
+                    self.attempts.pop(class_id, None)
+                    self.stats['batches'] += 1
+                    self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(students))
+                    self.stats['written'] += sum(1 for student in marked if student['marked'])
+                    self.stats['not_enrolled'] += sum(1 for student in marked if not student['marked'])
+                del batch[class_id]
+        except (Exception, psycopg2.DatabaseError) as error:
+            # sem ligação (ou erro inesperado): o que não foi escrito volta todo para o buffer
+            logger.error(f'Error flushing check-ins: {error}')
+            failed.update(batch)
+        finally:
+            if conn is not None:
+                release_connection(conn)
+
+        with self.cond:
+            self.stats['flushes'] += 1
+            self.stats['flush_errors'] += len(failed)
+            self.latencies = self.latencies[-999:] + [(time.perf_counter() - start) * 1000.0]
+            # as falhas voltam para o buffer e são tentadas no flush seguinte,
+            # até CHECKIN_MAX_ATTEMPTS vezes por turma
+            for class_id, students in failed.items():
+                self.attempts[class_id] = self.attempts.get(class_id, 0) + 1
+                if self.attempts[class_id] >= CHECKIN_MAX_ATTEMPTS:
+                    logger.error(f'Dropping {len(students)} check-ins of class {class_id} after {self.attempts[class_id]} failed flushes')
+                    del self.attempts[class_id]
+                    self.stats['dropped'] += len(students)
+                    continue
+                pending = self.pending.setdefault(class_id, set())
+                self.pending_count += len(students - pending)
+                pending |= students
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    def snapshot(self):
+        with self.cond:
+            latencies = sorted(self.latencies)
+            return dict(self.stats,
+                        pending=self.pending_count,
+                        mean_batch_size=round((self.stats['written'] + self.stats['not_enrolled']) / self.stats['batches'], 2) if self.stats['batches'] else None,
+                        flush_p50_ms=round(latencies[len(latencies) // 2], 3) if latencies else None,
+                        flush_max_ms=round(latencies[-1], 3) if latencies else None)
+
+
+checkin_buffer = CheckInBuffer(CHECKIN_BATCH_SIZE, CHECKIN_FLUSH_INTERVAL)
+
+
+def handle_sigterm(signum, frame):
+    # SIGTERM does not run the atexit handlers, so the pending check-ins are
+    # written here before handing the signal to whoever handled it before
+    checkin_buffer.stop()
+    if callable(previous_sigterm_handler):
+        previous_sigterm_handler(signum, frame)
+    elif previous_sigterm_handler != signal.SIG_IGN:
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+# signal handlers can only be installed from the main thread
+previous_sigterm_handler = None
+if threading.current_thread() is threading.main_thread():
+    previous_sigterm_handler = signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+##########################################################
+## REFERENCE DATA CACHE
+##########################################################
+
+# Majors, activities, departments, editions and classes change rarely but
+# are looked up on the hot path. Each worker keeps a read-only snapshot of
+# them, loaded in one round trip and replaced as a whole when the tables
+# change. The triggers in sql/triggers.sql bump reference_version and send a
+# NOTIFY on the reference_data channel; a background thread LISTENs and
+# reloads the snapshot. While the listener is down, the version is checked at
+# most every REFERENCE_CHECK_INTERVAL seconds instead.
+
+REFERENCE_CHECK_INTERVAL = 5.0
+
+
+class ReferenceCache:
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.thread = None
+        self.conn = None
+        self.listening = False
+        self.stats = {'loads': 0, 'notifications': 0, 'version_checks': 0, 'listener_errors': 0}
+
+    def get(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.listen, name='reference-listener', daemon=True)
+                    self.thread.start()
+
+        snapshot = self.snapshot
+        if snapshot is None or (not self.listening and time.monotonic() - self.checked_at >= self.check_interval):
+            with self.lock:
+                if self.snapshot is snapshot:
+                    self.refresh(check_version=snapshot is not None)
+                snapshot = self.snapshot
+        return snapshot
+
+    def refresh(self, check_version=False):
+        # dedicated connection, only used by the thread holding self.lock; never
+        # the request's connection, which may be shared by a batch
+        conn = self.conn
+        if conn is None or conn.closed:
+            conn = self.conn = psycopg2.connect(application_name='api-reference-cache', **DB_PRIMARY)
+            conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            if check_version:
+                self.stats['version_checks'] += 1
+                cur.execute('SELECT version FROM reference_version')
+                if cur.fetchone()[0] == self.snapshot['version']:
+                    self.checked_at = time.monotonic()
+                    return
+
+            # uma só instrução, portanto um só snapshot consistente das tabelas
+            version, majors, activities, departments, editions, classes = fetch_pipeline(cur, [
+                ('SELECT version FROM reference_version', ()),
+                ("SELECT COALESCE(json_object_agg(major_id, major_name), '{}') FROM major", ()),
+                ("SELECT COALESCE(json_object_agg(activity_id, name), '{}') FROM extraactivities", ()),
+                ("SELECT COALESCE(json_agg(department_id ORDER BY department_id), '[]') FROM department", ()),
+                ('''
+                    SELECT COALESCE(json_object_agg(e.edition_id, json_build_object(
+                        'course_name', c.course_name, 'capacity', e.capacity, 'course_id', c.course_id)), '{}')
+                    FROM edition e
+                    JOIN course c ON e.course_course_id = c.course_id
+                ''', ()),
+                ("SELECT COALESCE(json_agg(class_id), '[]') FROM class", ())
+            ])
+        except (Exception, psycopg2.DatabaseError):
+            conn.close()
+            raise
+
+        self.snapshot = {
+            'version': version,
+            'majors': {int(key): value for key, value in majors.items()},
+            'activities': {int(key): value for key, value in activities.items()},
+            'departments': departments,
+            'editions': {int(key): value for key, value in editions.items()},
+            'classes': frozenset(classes)
+        }
+        self.checked_at = time.monotonic()
+        self.stats['loads'] += 1
+
+    def listen(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(application_name='api-reference-listener', **DB_PRIMARY)
+                conn.autocommit = True
+                conn.cursor().execute('LISTEN reference_data')
+                self.listening = True
+                # alterações feitas enquanto não estava à escuta
+                with self.lock:
+                    self.refresh()
+
+                while True:
+                    if select.select([conn], [], [], 60.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        self.stats['notifications'] += len(conn.notifies)
+                        conn.notifies.clear()
+                        with self.lock:
+                            self.refresh()
+            except (Exception, psycopg2.DatabaseError) as error:
+                logger.warning(f'reference data listener failed: {error}')
+                self.listening = False
+                self.stats['listener_errors'] += 1
+                if conn is not None:
+                    conn.close()
+                time.sleep(self.check_interval)
+
+    def status(self):
+        snapshot = self.snapshot
+        return dict(self.stats, listening=self.listening, version=snapshot['version'] if snapshot else None)
+
+
+reference_cache = ReferenceCache(REFERENCE_CHECK_INTERVAL)
+
+##########################################################
+## CSV EXPORTS
+##########################################################
+
+# The export endpoints stream `COPY (query) TO STDOUT` straight into the HTTP
+# response. A worker thread runs the COPY and CopyWriter groups the rows
+# psycopg2 hands it into EXPORT_CHUNK_SIZE chunks on a queue of at most
+# EXPORT_QUEUE_CHUNKS; the response iterates the queue. A slow client blocks
+# the COPY instead of growing the queue, so an export holds a few chunks in
+# memory whatever its size. The COPY lasts as long as the client takes to
+# read, so it is bounded by the request deadline (ROUTE_DEADLINES) rather
+# than by the statement_timeout of the bulkhead.
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_QUEUE_CHUNKS = 16
+
+export_stats = {'started': 0, 'completed': 0, 'cancelled': 0, 'failed': 0, 'bytes': 0}
+export_stats_lock = threading.Lock()
+
+
+class CopyWriter:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = []
+        self.pending_size = 0
+        self.cancelled = False
+
+    def write(self, data):
+        # once the export is cancelled the remaining rows are discarded
+        if self.cancelled:
+            return
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= EXPORT_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending and not self.cancelled:
+            self.chunks.put(b''.join(self.pending))
+        self.pending, self.pending_size = [], 0
+
+
+class CopyStream:
+    # response body of an export; owns the connection until it is closed
+    def __init__(self, conn, statement):
+        self.conn = conn
+        self.writer = CopyWriter(queue.Queue(EXPORT_QUEUE_CHUNKS))
+        self.finished = False
+        self.size = 0
+        self.worker = threading.Thread(target=self.run, args=(conn.cursor(), statement), name='csv-export', daemon=True)
+        self.worker.start()
+        with export_stats_lock:
+            export_stats['started'] += 1
+
+    def run(self, cur, statement):
+        # the queue always ends with None (done) or the error of the COPY
+        try:
+            cur.copy_expert(statement, self.writer)
+            self.writer.flush()
+            self.writer.chunks.put(None)
+        except Exception as error:
+            self.writer.chunks.put(error)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.finished:
+            raise StopIteration
+        chunk = self.writer.chunks.get()
+        if isinstance(chunk, bytes):
+            self.size += len(chunk)
+            return chunk
+
+        self.finished = True
+        if chunk is not None:
+            logger.error(f'CSV export failed after {self.size} bytes: {chunk}')
+            with export_stats_lock:
+                export_stats['failed'] += 1
+            # the response is already under way: the client sees a truncated body
+            raise chunk
+        with export_stats_lock:
+            export_stats['completed'] += 1
+        raise StopIteration
+
+    def close(self):
+        if self.conn is None:
+            return
+        if not self.finished:
+            # the client went away: cancel the COPY and drain the queue until the worker is done
+            self.writer.cancelled = True
+            self.conn.cancel()
+            while isinstance(self.writer.chunks.get(), bytes):
+                pass
+            self.finished = True
+            with export_stats_lock:
+                export_stats['cancelled'] += 1
+        self.worker.join()
+        with export_stats_lock:
+            export_stats['bytes'] += self.size
+        self.conn.rollback()
+        release_connection(self.conn)
+        self.conn = None
+
+
+def csv_response(conn, query, params, filename):
+    cur = conn.cursor()
+    if conn.deadline is not None:
+        cur.execute('SET LOCAL statement_timeout = %s', (max(int((conn.deadline - time.monotonic()) * 1000), 1),))
+    statement = cur.mogrify(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)', params)
+
+    response = app.response_class(flask.stream_with_context(CopyStream(conn, statement)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def export_snapshot():
+    with export_stats_lock:
+        return dict(export_stats)
+
+
+##########################################################
+## ENDPOINTS
+##########################################################
+
+@app.route('/persons/', methods=['POST'])
+def add_person():
+    logger.info('POST /persons')
+    payload = flask.request.get_json()
+
+    # validação básica dos campos obrigatórios
+    required = ['name', 'age', 'gender', 'nif', 'address', 'phone', 'password']
+    for field in required:
+        if field not in payload:
+            response = {
+                'status': StatusCodes['api_error'],
+                'results': f'{field} value not in payload'
+            }
+            return flask.jsonify(response), 400
+
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Inserir na tabela person
+        stmt = '''
+            INSERT INTO person
+                    (name, age, gender, nif, email, address, phone, password)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING person_id
+        '''
+        vals = (
+            payload['name'],
+            payload['age'],
+            payload['gender'],
+            payload['nif'],
+            payload.get('email'),
+            payload['address'],
+            payload['phone'],
+            payload['password']
+        )
+
+        cur.execute(stmt, vals)
+        person_id = cur.fetchone()[0]
+
+        conn.commit()
+        response = {
+            'status': StatusCodes['success'],
+            'results': {
+                'person_id': person_id
+            }
+        }
+        return flask.jsonify(response), 201
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f'POST /persons - error: {error}')
+        conn.rollback()
+        response = {
+            'status': StatusCodes['internal_error'],
+            'errors': str(error)
+        }
+        return flask.jsonify(response), 500
+
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/get_persons/', methods=['GET'])
+def list_persons():
+    logger.info('GET /persons')
+
+    # ?fields=person_id,name lê e devolve apenas essas colunas
+    fields = requested_fields(PERSON_FIELDS)
+    if fields is None:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'fields must be a comma-separated subset of: {", ".join(PERSON_FIELDS)}'
+        }), 400
+
+    # os nomes das colunas vêm da whitelist PERSON_FIELDS
+    stmt = f'''
+        SELECT {', '.join(fields)}
+        FROM person
+        ORDER BY person_id
+    '''
+
+    conn = db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(stmt)
+        rows = cur.fetchall()
+
+        persons = [dict(zip(fields, row)) for row in rows]
+
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'results': persons
+        }), 200
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f'GET /persons - error: {error}')
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error)
+        }), 500
+
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+def requested_fields(allowed):
+    # campos pedidos em ?fields=, pela ordem da whitelist; None se algum não for permitido
+    value = flask.request.args.get('fields')
+    if not value:
+        return list(allowed)
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    if not names or not names <= set(allowed):
+        return None
+    return [name for name in allowed if name in names]
+
+
+@app.route('/dbproj/persons/search', methods=['GET'])
+@token_required
+def search_persons():
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can search persons',
+            'results': None
+        }), 403
+
+    query = flask.request.args.get('q', '').strip()
+    email = flask.request.args.get('email', '').strip()
+    nif = flask.request.args.get('nif')
+
+    try:
+        limit = int(flask.request.args.get('limit', SEARCH_PAGE_SIZE))
+        offset = int(flask.request.args.get('offset', 0))
+        if not 0 < limit <= SEARCH_MAX_PAGE_SIZE or offset < 0:
+            raise ValueError
+    except ValueError:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'limit must be between 1 and {SEARCH_MAX_PAGE_SIZE} and offset a non-negative integer',
+            'results': None
+        }), 400
+
+    # nif=0 é um filtro dado (e inválido), não a ausência de filtro
+    if nif is not None:
+        nif = nif.strip()
+        if not (nif.isascii() and nif.isdigit()) or int(nif) <= 0:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'nif must be a positive integer',
+                'results': None
+            }), 400
+        nif = int(nif)
+
+    if sum(1 for value in (query, email) if value) + (nif is not None) != 1:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'Exactly one of q, email or nif is required',
+            'results': None
+        }), 400
+
+    if query and len(query) < SEARCH_MIN_QUERY_LENGTH:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'q must have at least {SEARCH_MIN_QUERY_LENGTH} characters',
+            'results': None
+        }), 400
+
+    if nif is not None:
+        # índice único (nif, email)
+        stmt = '''
+            SELECT person_id, name, email, nif, 1.0
+            FROM person
+            WHERE nif = %s
+            ORDER BY person_id
+            LIMIT %s OFFSET %s
+        '''
+        params = (nif, limit + 1, offset)
+    elif email:
+        # índice person_email_idx
+        stmt = '''
+            SELECT person_id, name, email, nif, 1.0
+            FROM person
+            WHERE email = %s
+            ORDER BY person_id
+            LIMIT %s OFFSET %s
+        '''
+        params = (email, limit + 1, offset)
+    else:
+        stmt, params = name_search(query, limit + 1, offset)
+
+    conn = db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(stmt, params)
+        rows = cur.fetchall()
+
+        # uma linha a mais indica que há uma página seguinte
+        persons = [{
+            'person_id': person_id,
+            'name': name,
+            'email': email,
+            'nif': nif,
+            'score': round(float(score), 4)
+        } for person_id, name, email, nif, score in rows[:limit]]
+
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': {
+                'persons': persons,
+                'limit': limit,
+                'offset': offset,
+                'next_offset': offset + limit if len(rows) > limit else None
+            }
+        })
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f'Error searching persons: {error}')
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        }), 500
+
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+def name_search(query, limit, offset):
+    # Prefixo e semelhança de trigramas usam o mesmo índice GIN (sql/search.sql);
+    # os nomes que começam pelo texto pedido aparecem primeiro
+    prefix = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    stmt = '''
+        SELECT person_id, name, email, nif,
+               CASE WHEN name ILIKE %(prefix)s THEN 1.0 ELSE 0.0 END + similarity(name, %(query)s) AS score
+        FROM person
+        WHERE name ILIKE %(prefix)s OR name %% %(query)s
+        ORDER BY score DESC, person_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    '''
+    return stmt, {'prefix': prefix, 'query': query, 'limit': limit, 'offset': offset}
+
+@app.route('/dbproj/user', methods=['PUT'])
+def login_user():
+    data = flask.request.get_json()
+    email = data.get('email')
+    password = data.get('password')
+
+    if not email or not password:
+        return flask.jsonify({'status': StatusCodes['api_error'], 'errors': 'Email and password are required', 'results': None})
+
+    # Connect to database
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Query para verificar credenciais usando a tabela person
+        stmt = '''
+            SELECT p.person_id, p.name, p.email
+            FROM person p
+            WHERE p.email = %s AND p.password = %s
+        '''
+        cur.execute(stmt, (email, password))
+        user = cur.fetchone()
+        
+        if user is None:
+            return flask.jsonify({'status': StatusCodes['unauthorized'], 'errors': 'Invalid email or password', 'results': None})
+        
+        person_id, name, email = user
+        
+        # Verificar tipo de usuário
+        role = 'unknown'
+        
+        # Verificar se é estudante
+        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (person_id,))
+        is_student = cur.fetchone() is not None
+        
+        # Verificar se é instructor
+        cur.execute('SELECT worker_person_person_id FROM instructor WHERE worker_person_person_id = %s', (person_id,))
+        is_instructor = cur.fetchone() is not None
+        
+        # Verificar se é staff
+        cur.execute('SELECT worker_person_person_id FROM staff WHERE worker_person_person_id = %s', (person_id,))
+        is_staff = cur.fetchone() is not None
+        
+        # Determinar role
+        if is_student:
+            role = 'student'
+        elif is_instructor:
+            role = 'instructor'
+        elif is_staff:
+            role = 'staff'
+        
+        # Gerar token JWT com informações do usuário
+        token_payload = {
+            'person_id': person_id,
+            'name': name,
+            'email': email,
+            'role': role,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)  # Token expira em 24 horas
+        }
+        
+        token = jwt.encode(token_payload, app.config['JWT_SECRET_KEY'], algorithm="HS256")
+        
+        response = {'status': StatusCodes['success'], 'errors': None, 'results': token}
+        return flask.jsonify(response)
+        
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f'PUT /dbproj/user - error: {error}')
+        response = {'status': StatusCodes['internal_error'], 'errors': str(error), 'results': None}
+        return flask.jsonify(response)
+        
+    finally:
+        if conn is not None:
+            release_connection(conn)
 
 @app.route('/dbproj/register/student', methods=['POST'])
 @token_required
-def register_student():
-    # Verificar se o usuário é staff
-    if flask.g.role != 'staff':
+def register_student():
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can register new students',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    person_id = data.get('person_id')
+    enrolment_date = datetime.date.today()  # Use today's date by default
+    mean = data.get('mean', 0.0)
+    major_id = data.get('major_id')  # Opcional
+
+    if not person_id:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'person_id is required',
+            'results': None
+        })
+    
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Verificar se a pessoa existe e se já é um estudante (uma só ida à base de dados)
+        person_exists, already_student = fetch_pipeline(cur, [
+            ('SELECT EXISTS (SELECT 1 FROM person WHERE person_id = %s)', (person_id,)),
+            ('SELECT EXISTS (SELECT 1 FROM student WHERE person_person_id = %s)', (person_id,))
+        ])
+
+        if not person_exists:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Person not found',
+                'results': None
+            })
+            
+        if already_student:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'This person is already a student',
+                'results': None
+            })
+        
+        # Inserir na tabela student com os atributos específicos
+        statements = [('''
+            INSERT INTO student (person_person_id, enrolment_date, mean)
+            VALUES (%s, %s, %s)
+        ''', (person_id, enrolment_date, mean))]
+        
+        # Se foi especificado um major, criar a conta de taxas e a matrícula
+        if major_id:
+            statements.append(('''
+                WITH account AS (
+                    INSERT INTO fees_account (values_acumulate) VALUES (0) RETURNING fees_account_id
+                )
+                INSERT INTO major_info (student_person_person_id, major_major_id, fees, status, fees_account_fees_account_id)
+                SELECT %s, %s, %s, 'Active', fees_account_id FROM account
+            ''', (person_id, major_id, 5000.00)))
+        
+        execute_pipeline(cur, statements)
+        conn.commit()
+        response = {
+            'status': StatusCodes['success'], 
+            'errors': None, 
+            'results': {
+                'person_id': person_id,
+                'enrolment_date': enrolment_date.strftime('%Y-%m-%d'),
+                'mean': mean,
+                'major_id': major_id
+            }
+        }
+        return flask.jsonify(response)
+        
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        })
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/dbproj/register/staff', methods=['POST'])
+@token_required
+def register_staff():
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can register new staff',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    person_id = data.get('person_id')
+    salary = data.get('salary', 0.0)
+    started_working = datetime.date.today()  # Use today's date by default
+
+    if not person_id:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'person_id is required',
+            'results': None
+        })
+    
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Verificar se a pessoa existe e se já é staff (uma só ida à base de dados)
+        person_exists, already_staff = fetch_pipeline(cur, [
+            ('SELECT EXISTS (SELECT 1 FROM person WHERE person_id = %s)', (person_id,)),
+            ('SELECT EXISTS (SELECT 1 FROM staff WHERE worker_person_person_id = %s)', (person_id,))
+        ])
+
+        if not person_exists:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Person not found',
+                'results': None
+            })
+            
+        if already_staff:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'This person is already a staff member',
+                'results': None
+            })
+        
+        # Inserir nas tabelas worker e staff
+        execute_pipeline(cur, [
+            ('''
+                INSERT INTO worker (person_person_id, salary, started_working)
+                VALUES (%s, %s, %s)
+            ''', (person_id, salary, started_working)),
+            ('''
+                INSERT INTO staff (worker_person_person_id)
+                VALUES (%s)
+            ''', (person_id,))
+        ])
+        
+        conn.commit()
+        response = {
+            'status': StatusCodes['success'], 
+            'errors': None, 
+            'results': {
+                'person_id': person_id,
+                'salary': salary,
+                'started_working': started_working.strftime('%Y-%m-%d')
+            }
+        }
+        return flask.jsonify(response)
+        
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        })
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/dbproj/register/instructor', methods=['POST'])
+@token_required
+def register_instructor():
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can register new instructors',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    person_id = data.get('person_id')
+    salary = data.get('salary', 0.0)
+    started_working = data.get('started_working', datetime.date.today())
+    major = data.get('major', 'General')
+    department_id = data.get('department_id')
+
+    if not person_id:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'person_id is required',
+            'results': None
+        })
+    
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Verificar se a pessoa existe e se já é instructor (uma só ida à base de dados)
+        person_exists, already_instructor = fetch_pipeline(cur, [
+            ('SELECT EXISTS (SELECT 1 FROM person WHERE person_id = %s)', (person_id,)),
+            ('SELECT EXISTS (SELECT 1 FROM instructor WHERE worker_person_person_id = %s)', (person_id,))
+        ])
+
+        if not person_exists:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Person not found',
+                'results': None
+            })
+            
+        if already_instructor:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'This person is already an instructor',
+                'results': None
+            })
+        
+        # Se não foi fornecido department_id, usar o primeiro disponível
+        if not department_id:
+            departments = reference_cache.get()['departments']
+            if departments:
+                department_id = departments[0]
+            else:
+                return flask.jsonify({
+                    'status': StatusCodes['api_error'],
+                    'errors': 'No department available',
+                    'results': None
+                })
+        
+        # Inserir nas tabelas worker e instructor
+        execute_pipeline(cur, [
+            ('''
+                INSERT INTO worker (person_person_id, salary, started_working)
+                VALUES (%s, %s, %s)
+            ''', (person_id, salary, started_working)),
+            ('''
+                INSERT INTO instructor (worker_person_person_id, major, department_department_id)
+                VALUES (%s, %s, %s)
+            ''', (person_id, major, department_id))
+        ])
+        
+        conn.commit()
+        response = {
+            'status': StatusCodes['success'], 
+            'errors': None, 
+            'results': {
+                'person_id': person_id,
+                'salary': salary,
+                'started_working': started_working.strftime('%Y-%m-%d'),
+                'major': major,
+                'department_id': department_id
+            }
+        }
+        return flask.jsonify(response)
+        
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        })
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/dbproj/register/<kind>/bulk', methods=['POST'])
+@token_required
+def register_bulk(kind):
+    if kind not in ('student', 'staff', 'instructor'):
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'Unknown registration type',
+            'results': None
+        }), 404
+
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': f'Only staff members can register new {kind}s',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    registrations = data.get('registrations')
+    chunk_size = data.get('chunk_size')
+
+    if not registrations or not isinstance(registrations, list):
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'registrations must be a non-empty list',
+            'results': None
+        }), 400
+
+    if len(registrations) > MAX_BULK_ITEMS:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'At most {MAX_BULK_ITEMS} registrations per request',
+            'results': None
+        }), 400
+
+    try:
+        chunk_size = int(chunk_size) if chunk_size else len(registrations)
+    except (TypeError, ValueError):
+        chunk_size = 0
+    if chunk_size <= 0:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'chunk_size must be a positive integer',
+            'results': None
+        }), 400
+
+    # Validar cada registo antes de ir à base de dados
+    outcomes = [None] * len(registrations)
+    items = []
+    seen = set()
+    for index, registration in enumerate(registrations):
+        item = parse_registration(kind, registration)
+        if isinstance(item, str):
+            outcomes[index] = {'index': index, 'status': 'error', 'error': item}
+        elif item['person_id'] in seen:
+            outcomes[index] = {'index': index, 'person_id': item['person_id'], 'status': 'error',
+                               'error': 'Duplicate person_id in request'}
+        else:
+            seen.add(item['person_id'])
+            item['index'] = index
+            items.append(item)
+
+    conn = db_connection()
+    cur = conn.cursor()
+
+    try:
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            try:
+                for outcome in register_chunk(cur, kind, chunk):
+                    outcomes[outcome['index']] = outcome
+                conn.commit()
+            except (Exception, psycopg2.DatabaseError) as error:
+                conn.rollback()
+                logger.error(f'Error in bulk registration chunk: {error}')
+                for item in chunk:
+                    outcomes[item['index']] = {'index': item['index'], 'person_id': item['person_id'],
+                                               'status': 'error', 'error': str(error)}
+
+        registered = sum(1 for outcome in outcomes if outcome['status'] == 'registered')
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': {
+                'registered': registered,
+                'failed': len(outcomes) - registered,
+                'registrations': outcomes
+            }
+        })
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        }), 500
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+def parse_registration(kind, registration):
+    # devolve o registo normalizado ou a mensagem de erro
+    if not isinstance(registration, dict) or not registration.get('person_id'):
+        return 'person_id is required'
+    try:
+        item = {'person_id': int(registration['person_id'])}
+        if kind == 'student':
+            item['enrolment_date'] = datetime.date.today()
+            item['mean'] = float(registration.get('mean', 0.0))
+            item['ref_id'] = int(registration['major_id']) if registration.get('major_id') else None
+        else:
+            item['salary'] = float(registration.get('salary', 0.0))
+            item['started_working'] = datetime.date.fromisoformat(str(registration['started_working'])) \
+                if kind == 'instructor' and registration.get('started_working') else datetime.date.today()
+            item['ref_id'] = int(registration['department_id']) \
+                if kind == 'instructor' and registration.get('department_id') else None
+            item['major'] = str(registration.get('major', 'General'))
+    except (TypeError, ValueError) as error:
+        return f'Invalid registration: {error}'
+    return item
+
+REGISTRATION_CHECKS = {
+    'student': ('student', 'person_person_id', 'major', 'major_id', 'This person is already a student', 'Major not found'),
+    'staff': ('staff', 'worker_person_person_id', None, None, 'This person is already a staff member', None),
+    'instructor': ('instructor', 'worker_person_person_id', 'department', 'department_id',
+                   'This person is already an instructor', 'Department not found')
+}
+
+def register_chunk(cur, kind, items):
+    table, key, ref_table, ref_key, duplicate_error, ref_error = REGISTRATION_CHECKS[kind]
+    outcomes = []
+    accepted = []
+
+    # Existência da pessoa, papel e referências de todo o bloco numa só consulta
+    ref_check = f'r.ref_id IS NULL OR EXISTS (SELECT 1 FROM {ref_table} WHERE {ref_key} = r.ref_id)' \
+        if ref_table else 'TRUE'
+    cur.execute(f'''
+        SELECT r.person_id,
+               EXISTS (SELECT 1 FROM person WHERE person_id = r.person_id),
+               EXISTS (SELECT 1 FROM {table} WHERE {key} = r.person_id),
+               EXISTS (SELECT 1 FROM worker WHERE person_person_id = r.person_id),
+               {ref_check}
+        FROM unnest(%s::bigint[], %s::bigint[]) AS r(person_id, ref_id)
+    ''', ([item['person_id'] for item in items], [item['ref_id'] for item in items]))
+    checks = {row[0]: row[1:] for row in cur.fetchall()}
+    departments = reference_cache.get()['departments']
+    first_department_id = departments[0] if departments else None
+
+    for item in items:
+        person_exists, already_registered, already_worker, ref_exists = checks[item['person_id']]
+        error = None
+        if not person_exists:
+            error = 'Person not found'
+        elif already_registered:
+            error = duplicate_error
+        elif kind != 'student' and already_worker:
+            error = 'This person is already a worker'
+        elif not ref_exists:
+            error = ref_error
+        elif kind == 'instructor' and item['ref_id'] is None:
+            if first_department_id is None:
+                error = 'No department available'
+            item['ref_id'] = first_department_id
+
+        if error:
+            outcomes.append({'index': item['index'], 'person_id': item['person_id'], 'status': 'error', 'error': error})
+        else:
+            accepted.append(item)
+
+    if not accepted:
+        return outcomes
+
+    # Inserções de várias linhas; se falharem, repetir registo a registo para isolar os que falham
+    try:
+        cur.execute('SAVEPOINT bulk_chunk')
+        execute_pipeline(cur, registration_statements(kind, accepted))
+        cur.execute('RELEASE SAVEPOINT bulk_chunk')
+        failed = {}
+    except psycopg2.DatabaseError as error:
+        if isinstance(error, psycopg2.errors.QueryCanceled):
+            raise
+        cur.execute('ROLLBACK TO SAVEPOINT bulk_chunk')
+        failed = {}
+        for item in accepted:
+            try:
+                cur.execute('SAVEPOINT bulk_item')
+                execute_pipeline(cur, registration_statements(kind, [item]))
+                cur.execute('RELEASE SAVEPOINT bulk_item')
+            except psycopg2.DatabaseError as item_error:
+                if isinstance(item_error, psycopg2.errors.QueryCanceled):
+                    raise
+                cur.execute('ROLLBACK TO SAVEPOINT bulk_item')
+                failed[item['person_id']] = str(item_error).strip()
+
+    for item in accepted:
+        if item['person_id'] in failed:
+            outcomes.append({'index': item['index'], 'person_id': item['person_id'], 'status': 'error',
+                             'error': failed[item['person_id']]})
+            continue
+        outcome = {'index': item['index'], 'person_id': item['person_id'], 'status': 'registered'}
+        if kind == 'student':
+            outcome.update(enrolment_date=item['enrolment_date'].strftime('%Y-%m-%d'), mean=item['mean'],
+                           major_id=item['ref_id'])
+        else:
+            outcome.update(salary=item['salary'], started_working=item['started_working'].strftime('%Y-%m-%d'))
+            if kind == 'instructor':
+                outcome.update(major=item['major'], department_id=item['ref_id'])
+        outcomes.append(outcome)
+    return outcomes
+
+def registration_statements(kind, items):
+    person_ids = [item['person_id'] for item in items]
+    if kind == 'student':
+        statements = [('''
+            INSERT INTO student (person_person_id, enrolment_date, mean)
+            SELECT * FROM unnest(%s::bigint[], %s::date[], %s::float8[])
+        ''', (person_ids, [item['enrolment_date'] for item in items], [item['mean'] for item in items]))]
+        with_major = [item for item in items if item['ref_id'] is not None]
+        if with_major:
+            statements.append(major_enrollments_statement([item['person_id'] for item in with_major],
+                                                          [item['ref_id'] for item in with_major]))
+        return statements
+
+    statements = [('''
+        INSERT INTO worker (person_person_id, salary, started_working)
+        SELECT * FROM unnest(%s::bigint[], %s::float8[], %s::date[])
+    ''', (person_ids, [item['salary'] for item in items], [item['started_working'] for item in items]))]
+    if kind == 'staff':
+        statements.append(('INSERT INTO staff (worker_person_person_id) SELECT unnest(%s::bigint[])', (person_ids,)))
+    else:
+        statements.append(('''
+            INSERT INTO instructor (worker_person_person_id, major, department_department_id)
+            SELECT * FROM unnest(%s::bigint[], %s::text[], %s::bigint[])
+        ''', (person_ids, [item['major'] for item in items], [item['ref_id'] for item in items])))
+    return statements
+
+@app.route('/dbproj/enroll_degree/<int:major_id>', methods=['POST'])
+@token_required
+def enroll_degree(major_id):
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can enroll students in majors',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    student_id = data.get('student_id')
+
+    if not student_id:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'student_id is required',
+            'results': None
+        }), 400
+
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Um major inexistente é rejeitado sem ir à base de dados
+        if major_id not in reference_cache.get()['majors']:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Major not found',
+                'results': None
+            }), 404
+
+        # Todas as verificações e inserções numa única chamada (ver sql/procedures.sql)
+        cur.execute('SELECT enroll_student_degree(%s, %s)', (student_id, major_id))
+        outcome = cur.fetchone()[0]
+
+        if outcome['error'] is not None:
+            conn.rollback()
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': outcome['error'],
+                'results': None
+            }), outcome['http_status']
+
+        conn.commit()
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': {
+                'message': f'Successfully enrolled student {student_id} in major: {outcome["major_name"]}',
+                'student_id': student_id,
+                'major_id': major_id,
+                'major_name': outcome['major_name'],
+                'fees_account_id': outcome['fees_account_id']
+            }
+        })
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        })
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/dbproj/enroll_degree/<int:major_id>/bulk', methods=['POST'])
+@token_required
+def enroll_degree_bulk(major_id):
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can enroll students in majors',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    student_ids = data.get('student_ids')
+    chunk_size = data.get('chunk_size')
+
+    if not student_ids or not isinstance(student_ids, list):
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'student_ids must be a non-empty list',
+            'results': None
+        }), 400
+
+    if len(student_ids) > MAX_BULK_ITEMS:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'At most {MAX_BULK_ITEMS} students per request',
+            'results': None
+        }), 400
+
+    try:
+        student_ids = [int(sid) for sid in student_ids]
+        chunk_size = int(chunk_size) if chunk_size else len(student_ids)
+    except (TypeError, ValueError):
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'student_ids and chunk_size must be integers',
+            'results': None
+        }), 400
+
+    if chunk_size <= 0:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'chunk_size must be positive',
+            'results': None
+        }), 400
+
+    conn = db_connection()
+    cur = conn.cursor()
+
+    try:
+        # Verificar se o major existe (dados de referência em memória)
+        major_name = reference_cache.get()['majors'].get(major_id)
+        if major_name is None:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Major not found',
+                'results': None
+            }), 404
+
+        outcomes = {}
+        unique_ids = []
+        for student_id in student_ids:
+            if student_id in outcomes:
+                continue
+            outcomes[student_id] = None
+            unique_ids.append(student_id)
+
+        # Cada bloco é validado e inserido com consultas sobre o conjunto, numa transação própria
+        for start in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[start:start + chunk_size]
+            try:
+                outcomes.update(enroll_degree_chunk(cur, major_id, chunk))
+                conn.commit()
+            except (Exception, psycopg2.DatabaseError) as error:
+                conn.rollback()
+                logger.error(f'Error in bulk enrollment chunk: {error}')
+                for student_id in chunk:
+                    outcomes[student_id] = {'student_id': student_id, 'status': 'error', 'error': str(error)}
+
+        students = [outcomes[student_id] for student_id in unique_ids]
+        enrolled = sum(1 for outcome in students if outcome['status'] in ('enrolled', 'reactivated'))
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': {
+                'major_id': major_id,
+                'major_name': major_name,
+                'enrolled': enrolled,
+                'failed': len(students) - enrolled,
+                'students': students
+            }
+        })
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        }), 500
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+def enroll_degree_chunk(cur, major_id, student_ids):
+    outcomes = {}
+
+    # Estado de todos os estudantes do bloco numa só consulta
+    cur.execute('''
+        SELECT ids.student_id, s.person_person_id IS NOT NULL, mi.status, m.major_name
+        FROM unnest(%s::bigint[]) AS ids(student_id)
+        LEFT JOIN student s ON s.person_person_id = ids.student_id
+        LEFT JOIN major_info mi ON mi.student_person_person_id = ids.student_id
+        LEFT JOIN major m ON mi.major_major_id = m.major_id
+    ''', (student_ids,))
+
+    new_ids = []
+    inactive_ids = []
+    for student_id, is_student, status, current_major in cur.fetchall():
+        if not is_student:
+            outcomes[student_id] = {'student_id': student_id, 'status': 'error', 'error': 'Student not found'}
+        elif status in ('Active', 'Paid'):
+            outcomes[student_id] = {
+                'student_id': student_id,
+                'status': 'error',
+                'error': f'Student is already enrolled in major: {current_major}. Must unenroll first.'
+            }
+        elif status is not None:
+            inactive_ids.append(student_id)
+        else:
+            new_ids.append(student_id)
+
+    # Reativar os registos inativos com o novo major
+    if inactive_ids:
+        cur.execute('''
+            UPDATE major_info mi
+            SET major_major_id = %s,
+                status = 'Active',
+                fees = 5000.00
+            FROM unnest(%s::bigint[]) AS ids(student_id)
+            WHERE mi.student_person_person_id = ids.student_id AND mi.status NOT IN ('Active', 'Paid')
+            RETURNING mi.student_person_person_id, mi.fees_account_fees_account_id
+        ''', (major_id, inactive_ids))
+        for student_id, fees_account_id in cur.fetchall():
+            outcomes[student_id] = {'student_id': student_id, 'status': 'reactivated', 'fees_account_id': fees_account_id}
+
+    # Criar as contas de taxas e as matrículas novas com inserções de várias linhas
+    if new_ids:
+        cur.execute(*major_enrollments_statement(new_ids, [major_id] * len(new_ids)))
+        for student_id, fees_account_id in cur.fetchall():
+            outcomes[student_id] = {'student_id': student_id, 'status': 'enrolled', 'fees_account_id': fees_account_id}
+
+    for student_id in student_ids:
+        if student_id not in outcomes:
+            # registo alterado por outro pedido entre a validação e a escrita
+            outcomes[student_id] = {'student_id': student_id, 'status': 'error', 'error': 'Enrollment changed concurrently, retry'}
+
+    return outcomes
+
+def major_enrollments_statement(student_ids, major_ids):
+    # os ids das contas são reservados na sequência para ligar cada conta à sua matrícula
+    return ('''
+        WITH new_enrollment AS (
+            SELECT r.student_id, r.major_id, nextval(pg_get_serial_sequence('fees_account', 'fees_account_id')) AS fees_account_id
+            FROM unnest(%s::bigint[], %s::bigint[]) AS r(student_id, major_id)
+        ), accounts AS (
+            INSERT INTO fees_account (fees_account_id, values_acumulate)
+            SELECT fees_account_id, 0 FROM new_enrollment
+        )
+        INSERT INTO major_info (student_person_person_id, major_major_id, fees, status, fees_account_fees_account_id)
+        SELECT student_id, major_id, 5000.00, 'Active', fees_account_id FROM new_enrollment
+        RETURNING student_person_person_id, fees_account_fees_account_id
+    ''', (student_ids, major_ids))
+
+@app.route('/dbproj/unenroll_degree', methods=['POST'])
+@token_required
+def unenroll_degree():
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can unenroll students from majors',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    student_id = data.get('student_id')
+
+    if not student_id:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'student_id is required',
+            'results': None
+        }), 400
+
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Verificar se o estudante existe
+        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (student_id,))
+        if cur.fetchone() is None:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Student not found',
+                'results': None
+            }), 404
+
+        # Verificar se o estudante está matriculado em algum major ('Paid' é uma matrícula ativa já paga)
+        cur.execute('''
+            SELECT m.major_name, mi.major_major_id
+            FROM major_info mi
+            JOIN major m ON mi.major_major_id = m.major_id
+            WHERE mi.student_person_person_id = %s AND mi.status IN ('Active', 'Paid')
+        ''', (student_id,))
+        
+        current_major = cur.fetchone()
+        if not current_major:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Student is not enrolled in any major',
+                'results': None
+            }), 400
+
+        # Inativar a matrícula atual
+        cur.execute('''
+            UPDATE major_info 
+            SET status = 'Inactive'
+            WHERE student_person_person_id = %s AND major_major_id = %s AND status IN ('Active', 'Paid')
+            RETURNING major_major_id
+        ''', (student_id, current_major[1]))
+        
+        if cur.fetchone() is None:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Failed to update major status. The student might already be inactive.',
+                'results': None
+            }), 400
+
+        conn.commit()
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': {
+                'message': f'Successfully unenrolled student {student_id} from major: {current_major[0]}',
+                'student_id': student_id,
+                'major_name': current_major[0],
+                'major_id': current_major[1]
+            }
+        })
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        }), 500
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/dbproj/enroll_activity/<activity_id>', methods=['POST'])
+@token_required
+def enroll_activity(activity_id):
+    # Verificar se o usuário é estudante
+    if flask.g.role != 'student':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only students can enroll in activities',
+            'results': None
+        }), 403
+
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Uma atividade inexistente é rejeitada sem ir à base de dados
+        if not activity_id.isdigit() or int(activity_id) not in reference_cache.get()['activities']:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Activity not found',
+                'results': None
+            }), 404
+
+        # Todas as verificações e inserções numa única chamada (ver sql/procedures.sql)
+        cur.execute('SELECT enroll_student_activity(%s, %s)', (flask.g.person_id, activity_id))
+        outcome = cur.fetchone()[0]
+
+        if outcome['error'] is not None:
+            conn.rollback()
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': outcome['error'],
+                'results': None
+            }), outcome['http_status']
+
+        conn.commit()
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': {
+                'message': f'Successfully enrolled in activity: {outcome["activity_name"]}',
+                'activity_id': outcome['activity_id'],
+                'activity_name': outcome['activity_name'],
+                'fees_account_id': outcome['fees_account_id'],
+                'fees': outcome['fees'],
+                'status': outcome['status']
+            }
+        })
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        })
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/dbproj/enroll_course_edition/<course_edition_id>', methods=['POST'])
+@token_required
+def enroll_course_edition(course_edition_id):
+    # Verificar se o usuário é estudante
+    if flask.g.role != 'student':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only students can enroll in course editions',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    classes = data.get('classes', [])
+
+    if not classes:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'At least one class ID is required',
+            'results': None
+        }), 400
+
+    # Os IDs das classes podem vir como números ou como texto
+    if not isinstance(classes, list) or \
+            not all(isinstance(cid, int) or (isinstance(cid, str) and cid.isdigit()) for cid in classes):
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'Class IDs must be integers',
+            'results': None
+        }), 400
+    classes = [int(cid) for cid in classes]
+
+    conn = db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Verificar se a edição do curso existe (dados de referência em memória)
+        reference = reference_cache.get()
+        edition = reference['editions'].get(int(course_edition_id)) if course_edition_id.isdigit() else None
+        if not edition:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Course edition not found',
+                'results': None
+            }), 404
+        edition = (int(course_edition_id), edition['course_name'], edition['capacity'], edition['course_id'])
+
+        # Verificar se todas as classes existem
+        invalid_classes = [cid for cid in classes if cid not in reference['classes']]
+        if invalid_classes:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': f'Invalid class IDs: {invalid_classes}',
+                'results': None
+            }), 400
+
+        # Verificar se o estudante já está inscrito neste curso
+        cur.execute('''
+            SELECT course_course_id 
+            FROM student_course 
+            WHERE student_person_person_id = %s AND course_course_id = %s
+        ''', (flask.g.person_id, edition[3]))  # edition[3] é o course_id
+        
+        if cur.fetchone():
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Student is already enrolled in this course',
+                'results': None
+            }), 400
+
+        # Verificar se há vagas disponíveis
+        cur.execute('''
+            SELECT COUNT(*) 
+            FROM student_course 
+            WHERE course_course_id = %s
+        ''', (edition[3],))
+        
+        current_enrollments = cur.fetchone()[0]
+        if current_enrollments >= edition[2]:  # edition[2] é a capacidade
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Course edition is at maximum capacity',
+                'results': None
+            }), 400
+
+        # Inscrever o estudante no curso
+        cur.execute('''
+            INSERT INTO student_course (student_person_person_id, course_course_id)
+            VALUES (%s, %s)
+        ''', (flask.g.person_id, edition[3]))
+
+        # Criar registros de presença para cada classe, no ano letivo da edição (data do seu exame)
+        for class_id in classes:
+            cur.execute('''
+                INSERT INTO attendance (student_person_person_id, class_class_id, present, academic_year)
+                SELECT %s, %s, false, academic_year(ex.data)
+                FROM edition e
+                JOIN exam ex ON e.exam_exam_id = ex.exam_id
+                WHERE e.edition_id = %s
+            ''', (flask.g.person_id, class_id, edition[0]))
+
+        conn.commit()
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': {
+                'message': f'Successfully enrolled in course: {edition[1]}',
+                'course_edition_id': edition[0],
+                'course_name': edition[1],
+                'course_id': edition[3],
+                'enrolled_classes': list(classes)
+            }
+        })
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        })
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/dbproj/attendance/<int:class_id>', methods=['POST'])
+@token_required
+def mark_class_attendance(class_id):
+    # Verificar se o usuário é instrutor
+    if flask.g.role != 'instructor':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can register new students',
+            'errors': 'Only instructors can mark attendance',
             'results': None
         }), 403
 
     data = flask.request.get_json()
-    person_id = data.get('person_id')
-    enrolment_date = datetime.date.today()  # Use today's date by default
-    mean = data.get('mean', 0.0)
-    major_id = data.get('major_id')  # Opcional
+    try:
+        present = list(dict.fromkeys(int(sid) for sid in data.get('present', [])))
+        absent = list(dict.fromkeys(int(sid) for sid in data.get('absent', [])))
+    except (TypeError, ValueError):
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'present and absent must be lists of student IDs',
+            'results': None
+        }), 400
 
-    if not person_id:
+    if not present and not absent:
         return flask.jsonify({
             'status': StatusCodes['api_error'],
-            'errors': 'person_id is required',
+            'errors': 'At least one student is required',
+            'results': None
+        }), 400
+
+    both = sorted(set(present) & set(absent))
+    if both:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'Students with IDs {both} are marked both present and absent',
+            'results': None
+        }), 400
+
+    if len(present) + len(absent) > MAX_BULK_ITEMS:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'At most {MAX_BULK_ITEMS} students per request',
             'results': None
+        }), 400
+
+    conn = db_connection()
+    cur = conn.cursor()
+
+    try:
+        # Verificar se o instrutor coordena uma edição desta classe ou é assistente nela
+        cur.execute('''
+            SELECT EXISTS (
+                SELECT 1 FROM edition
+                WHERE class_class_id = %s AND coordinator_instructor_worker_person_person_id = %s
+            ) OR EXISTS (
+                SELECT 1 FROM assistant_class
+                WHERE class_class_id = %s AND assistant_instructor_worker_person_person_id = %s
+            )
+        ''', (class_id, flask.g.person_id, class_id, flask.g.person_id))
+
+        if not cur.fetchone()[0]:
+            return flask.jsonify({
+                'status': StatusCodes['unauthorized'],
+                'errors': 'You do not teach this class',
+                'results': None
+            }), 403
+
+        marks = [(sid, True) for sid in present] + [(sid, False) for sid in absent]
+        students = mark_attendance(cur, class_id, marks)
+
+        not_enrolled = [student['student_id'] for student in students if not student['marked']]
+        if not_enrolled:
+            conn.rollback()
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': f'Students with IDs {not_enrolled} are not enrolled in this class',
+                'results': None
+            }), 400
+
+        conn.commit()
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': {
+                'class_id': class_id,
+                'marked': len(students),
+                'students': students
+            }
         })
-    
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        }), 500
+    finally:
+        if conn is not None:
+            release_connection(conn)
+
+@app.route('/dbproj/attendance/<int:class_id>/check_in', methods=['POST'])
+@token_required
+def check_in(class_id):
+    # Verificar se o usuário é estudante
+    if flask.g.role != 'student':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only students can check in',
+            'results': None
+        }), 403
+
+    # Verificar se a turma existe antes de aceitar o check-in
+    try:
+        classes = reference_cache.get()['classes']
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f'Error checking in: {error}')
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        }), 500
+    if class_id not in classes:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'Class not found',
+            'results': None
+        }), 404
+
+    # A presença é escrita em lote pelo buffer de check-ins
+    checkin_buffer.add(class_id, flask.g.person_id)
+    return flask.jsonify({
+        'status': StatusCodes['accepted'],
+        'errors': None,
+        'results': {'class_id': class_id, 'student_id': flask.g.person_id}
+    }), 202
+
+def mark_attendance(cur, class_id, marks):
+    # Atualizar as presenças e calcular as taxas na mesma instrução: as linhas
+    # atualizadas só são visíveis através do RETURNING, por isso juntam-se às restantes.
+    # A linha da classe pode estar em qualquer ano letivo (o da edição em que o estudante
+    # se inscreveu); a taxa é a desse ano letivo
+    cur.execute('''
+        WITH marks AS (
+            SELECT * FROM unnest(%s::bigint[], %s::bool[]) AS m(student_id, present)
+        ), updated AS (
+            UPDATE attendance a
+            SET present = m.present
+            FROM marks m
+            WHERE a.class_class_id = %s AND a.student_person_person_id = m.student_id
+            RETURNING a.attendance_id, a.student_person_person_id, a.present, a.academic_year
+        ), student_attendance AS (
+            SELECT student_person_person_id, present FROM updated
+            UNION ALL
+            SELECT a.student_person_person_id, a.present
+            FROM attendance a
+            JOIN (SELECT DISTINCT student_person_person_id, academic_year FROM updated) y
+              ON a.student_person_person_id = y.student_person_person_id AND a.academic_year = y.academic_year
+            WHERE a.attendance_id NOT IN (SELECT attendance_id FROM updated)
+        )
+        SELECT m.student_id,
+               m.present,
+               EXISTS (SELECT 1 FROM updated u WHERE u.student_person_person_id = m.student_id),
+               COUNT(*) FILTER (WHERE sa.present),
+               COUNT(sa.present)
+        FROM marks m
+        LEFT JOIN student_attendance sa ON sa.student_person_person_id = m.student_id
+        GROUP BY m.student_id, m.present
+        ORDER BY m.student_id
+    ''', ([mark[0] for mark in marks], [mark[1] for mark in marks], class_id))
+
+    return [{
+        'student_id': student_id,
+        'present': present,
+        'marked': marked,
+        'attended': attended,
+        'total': total,
+        'attendance_rate': round(attended / total, 4) if total else None
+    } for student_id, present, marked, attended, total in cur.fetchall()]
+
+@app.route('/dbproj/submit_grades/<course_edition_id>', methods=['POST'])
+@token_required
+def submit_grades(course_edition_id):
+    # Verificar se o usuário é instrutor
+    if flask.g.role != 'instructor':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only instructors can submit grades',
+            'results': None
+        }), 403
+
+    data = flask.request.get_json()
+    period = data.get('period')
+    grades = data.get('grades', [])
+
+    if not period or not grades:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'Evaluation period and grades are required',
+            'results': None
+        }), 400
+
     conn = db_connection()
     cur = conn.cursor()
     
     try:
-        # Verificar se a pessoa existe
-        cur.execute('SELECT person_id FROM person WHERE person_id = %s', (person_id,))
-        if cur.fetchone() is None:
+        # Verificar se a edição do curso existe e se o instrutor é o coordenador
+        cur.execute('''
+            SELECT e.edition_id, c.course_name, e.exam_exam_id
+            FROM edition e
+            JOIN course c ON e.course_course_id = c.course_id
+            WHERE e.edition_id = %s AND e.coordinator_instructor_worker_person_person_id = %s
+        ''', (course_edition_id, flask.g.person_id))
+        
+        edition = cur.fetchone()
+        if not edition:
+            return flask.jsonify({
+                'status': StatusCodes['unauthorized'],
+                'errors': 'You are not the coordinator of this course edition',
+                'results': None
+            }), 403
+
+        # Verificar se todos os estudantes estão matriculados nesta edição
+        student_ids = [grade[0] for grade in grades]
+        placeholders = ','.join(['%s'] * len(student_ids))
+        
+        cur.execute(f'''
+            SELECT student_person_person_id
+            FROM student_course sc
+            JOIN edition e ON sc.course_course_id = e.course_course_id
+            WHERE e.edition_id = %s AND sc.student_person_person_id IN ({placeholders})
+        ''', (course_edition_id, *student_ids))
+        
+        enrolled_students = {r[0] for r in cur.fetchall()}
+        invalid_students = [sid for sid in student_ids if sid not in enrolled_students]
+        
+        if invalid_students:
             return flask.jsonify({
                 'status': StatusCodes['api_error'],
-                'errors': 'Person not found',
+                'errors': f'Students with IDs {invalid_students} are not enrolled in this course edition',
                 'results': None
-            })
+            }), 400
+
+        # Validar as notas (entre 0 e 20)
+        invalid_grades = [(sid, grade) for sid, grade in grades if not 0 <= grade <= 20]
+        if invalid_grades:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': f'Invalid grades (must be between 0 and 20): {invalid_grades}',
+                'results': None
+            }), 400
+
+        # Inserir ou atualizar as notas
+        results = []
+        for student_id, grade in grades:
+            # Verificar se já existe uma nota para este estudante neste exame
+            cur.execute('''
+                SELECT result_id, academic_year
+                FROM result
+                WHERE student_person_person_id = %s AND exam_exam_id = %s
+            ''', (student_id, edition[2]))  # edition[2] é o exam_exam_id
+            
+            existing_result = cur.fetchone()
+            
+            if existing_result:
+                # Atualizar nota existente (o ano letivo limita a atualização a uma partição)
+                cur.execute('''
+                    UPDATE result
+                    SET score = %s
+                    WHERE result_id = %s AND academic_year = %s
+                    RETURNING result_id
+                ''', (grade, existing_result[0], existing_result[1]))
+                result_id = existing_result[0]
+                action = 'updated'
+            else:
+                # Primeiro garantir que o estudante está inscrito no exame
+                cur.execute('''
+                    INSERT INTO exam_student (exam_exam_id, student_person_person_id)
+                    VALUES (%s, %s)
+                    ON CONFLICT DO NOTHING
+                ''', (edition[2], student_id))
+                
+                # Inserir nova nota na partição do ano letivo do exame
+                cur.execute('''
+                    INSERT INTO result (student_person_person_id, exam_exam_id, score, academic_year)
+                    SELECT %s, exam_id, %s, academic_year(data)
+                    FROM exam
+                    WHERE exam_id = %s
+                    RETURNING result_id
+                ''', (student_id, grade, edition[2]))
+                result_id = cur.fetchone()[0]
+                action = 'inserted'
             
-        # Verificar se já é um estudante
-        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (person_id,))
-        if cur.fetchone() is not None:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'This person is already a student',
-                'results': None
+            results.append({
+                'student_id': student_id,
+                'grade': grade,
+                'result_id': result_id,
+                'action': action
             })
-        
-        # Inserir na tabela student com os atributos específicos
-        cur.execute('''
-            INSERT INTO student (person_person_id, enrolment_date, mean)
-            VALUES (%s, %s, %s)
-        ''', (person_id, enrolment_date, mean))
-        
-        # Se foi especificado um major, criar a matrícula
-        if major_id:
-            # Criar conta de taxas
-            cur.execute('INSERT INTO fees_account (values_acumulate) VALUES (0) RETURNING fees_account_id')
-            fees_account_id = cur.fetchone()[0]
-            
-            # Matricular no major
+
+        # Atualizar a média do estudante
+        for student_id, _ in grades:
             cur.execute('''
-                INSERT INTO major_info (student_person_person_id, major_major_id, fees, status, fees_account_fees_account_id)
-                VALUES (%s, %s, %s, 'Active', %s)
-            ''', (person_id, major_id, 5000.00, fees_account_id))
-        
+                UPDATE student
+                SET mean = (
+                    SELECT AVG(score)
+                    FROM result
+                    WHERE student_person_person_id = %s
+                )
+                WHERE person_person_id = %s
+            ''', (student_id, student_id))
+
         conn.commit()
-        response = {
-            'status': StatusCodes['success'], 
-            'errors': None, 
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
             'results': {
-                'person_id': person_id,
-                'enrolment_date': enrolment_date.strftime('%Y-%m-%d'),
-                'mean': mean,
-                'major_id': major_id
+                'message': f'Successfully submitted grades for {edition[1]}',
+                'course_edition_id': edition[0],
+                'course_name': edition[1],
+                'exam_id': edition[2],
+                'period': period,
+                'grades': results
             }
-        }
-        return flask.jsonify(response)
-        
+        })
+
     except (Exception, psycopg2.DatabaseError) as error:
         conn.rollback()
         return flask.jsonify({
@@ -364,388 +3159,451 @@ def register_student():
         })
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/register/staff', methods=['POST'])
+@app.route('/dbproj/student_details/<int:student_id>', methods=['GET'])
 @token_required
-def register_staff():
-    # Verificar se o usuário é staff
-    if flask.g.role != 'staff':
+def student_course_details(student_id):
+    # Verificar se o usuário é staff ou o próprio estudante
+    if flask.g.role != 'staff' and str(flask.g.person_id) != str(student_id):
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can register new staff',
+            'errors': 'Only staff or the student themselves can access this information',
             'results': None
         }), 403
 
-    data = flask.request.get_json()
-    person_id = data.get('person_id')
-    salary = data.get('salary', 0.0)
-    started_working = datetime.date.today()  # Use today's date by default
-
-    if not person_id:
-        return flask.jsonify({
-            'status': StatusCodes['api_error'],
-            'errors': 'person_id is required',
-            'results': None
-        })
-    
     conn = db_connection()
     cur = conn.cursor()
     
     try:
-        # Verificar se a pessoa existe
-        cur.execute('SELECT person_id FROM person WHERE person_id = %s', (person_id,))
+        # Verificar se o estudante existe
+        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (student_id,))
         if cur.fetchone() is None:
             return flask.jsonify({
                 'status': StatusCodes['api_error'],
-                'errors': 'Person not found',
+                'errors': 'Student not found',
                 'results': None
-            })
+            }), 404
             
-        # Verificar se já é um staff
-        cur.execute('SELECT worker_person_person_id FROM staff WHERE worker_person_person_id = %s', (person_id,))
-        if cur.fetchone() is not None:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'This person is already a staff member',
-                'results': None
-            })
-        
-        # Inserir na tabela worker com os atributos específicos
+        # Buscar todos os cursos em que o estudante está matriculado
         cur.execute('''
-            INSERT INTO worker (person_person_id, salary, started_working)
-            VALUES (%s, %s, %s)
-        ''', (person_id, salary, started_working))
+            SELECT 
+                e.edition_id as course_edition_id,
+                c.course_name as course_name
+            FROM student_course sc
+            JOIN course c ON sc.course_course_id = c.course_id
+            JOIN edition e ON c.course_id = e.course_course_id
+            WHERE sc.student_person_person_id = %s
+            ORDER BY e.edition_id DESC, c.course_name
+        ''', (student_id,))
         
-        # Inserir na tabela staff
-        cur.execute('''
-            INSERT INTO staff (worker_person_person_id)
-            VALUES (%s)
-        ''', (person_id,))
+        results = []
+        for row in cur.fetchall():
+            results.append({
+                'course_edition_id': row[0],
+                'course_name': row[1],
+                'course_edition_year': None,  # Não temos o ano na tabela
+                'grade': None  # Como não temos acesso direto às notas
+            })
         
-        conn.commit()
-        response = {
-            'status': StatusCodes['success'], 
-            'errors': None, 
-            'results': {
-                'person_id': person_id,
-                'salary': salary,
-                'started_working': started_working.strftime('%Y-%m-%d')
-            }
-        }
-        return flask.jsonify(response)
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': results
+        })
         
     except (Exception, psycopg2.DatabaseError) as error:
-        conn.rollback()
+        logger.error(f'Error getting student details: {error}')
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
-        })
+        }), 500
+        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/register/instructor', methods=['POST'])
+@app.route('/dbproj/student/dashboard/<int:student_id>', methods=['GET'])
 @token_required
-def register_instructor():
-    # Verificar se o usuário é staff
-    if flask.g.role != 'staff':
+def student_dashboard(student_id):
+    # Verificar se o usuário é staff ou o próprio estudante
+    if flask.g.role != 'staff' and str(flask.g.person_id) != str(student_id):
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can register new instructors',
+            'errors': 'Only staff or the student themselves can access this information',
             'results': None
         }), 403
 
-    data = flask.request.get_json()
-    person_id = data.get('person_id')
-    salary = data.get('salary', 0.0)
-    started_working = data.get('started_working', datetime.date.today())
-    major = data.get('major', 'General')
-    department_id = data.get('department_id')
+    # Cada parte corre em paralelo na sua própria ligação do bulkhead 'dashboard', com o prazo do pedido
+    conns = []
+    try:
+        for _ in DASHBOARD_PARTS:
+            conns.append(db_connection())
+        futures = {
+            name: dashboard_executor.submit(part, conn, student_id)
+            for (name, part), conn in zip(DASHBOARD_PARTS.items(), conns)
+        }
+        results = {}
+        error = None
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except (Exception, psycopg2.DatabaseError) as part_error:
+                if isinstance(part_error, (psycopg2.errors.QueryCanceled, DeadlineExceeded)):
+                    flag_deadline_exceeded()
+                error = error or part_error
+
+        if error is not None:
+            raise error
+
+        if results['student'] is None:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Student not found',
+                'results': None
+            }), 404
 
-    if not person_id:
         return flask.jsonify({
-            'status': StatusCodes['api_error'],
-            'errors': 'person_id is required',
-            'results': None
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': dict(results['student'], student_id=student_id, grades=results['grades'],
+                            attendance=results['attendance'], financial=results['financial'])
         })
-    
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f'Error getting student dashboard: {error}')
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': None
+        }), 500
+
+    finally:
+        for conn in conns:
+            release_connection(conn)
+
+def dashboard_query(conn, query, params):
+    try:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        conn.rollback()
+
+def dashboard_student(conn, student_id):
+    return dashboard_query(conn, '''
+        SELECT json_build_object(
+            'enrolment_date', to_char(s.enrolment_date, 'YYYY-MM-DD'),
+            'mean', s.mean,
+            'courses', COALESCE((
+                SELECT json_agg(json_build_object('course_edition_id', e.edition_id, 'course_name', c.course_name)
+                                ORDER BY e.edition_id DESC, c.course_name)
+                FROM student_course sc
+                JOIN course c ON sc.course_course_id = c.course_id
+                JOIN edition e ON c.course_id = e.course_course_id
+                WHERE sc.student_person_person_id = s.person_person_id
+            ), '[]')
+        )
+        FROM student s
+        WHERE s.person_person_id = %s
+    ''', (student_id,))
+
+def dashboard_grades(conn, student_id):
+    return dashboard_query(conn, '''
+        SELECT COALESCE(json_agg(json_build_object(
+            'course_name', c.course_name,
+            'exam_type', ex.type,
+            'exam_date', to_char(ex.data, 'YYYY-MM-DD'),
+            'score', r.score
+        ) ORDER BY ex.data DESC), '[]')
+        FROM result r
+        JOIN exam ex ON r.exam_exam_id = ex.exam_id
+        LEFT JOIN edition e ON e.exam_exam_id = ex.exam_id
+        LEFT JOIN course c ON e.course_course_id = c.course_id
+        WHERE r.student_person_person_id = %s
+    ''', (student_id,))
+
+def dashboard_attendance(conn, student_id):
+    return dashboard_query(conn, '''
+        SELECT json_build_object(
+            'attended', COUNT(*) FILTER (WHERE present),
+            'total', COUNT(*),
+            'attendance_rate', ROUND(AVG(present::int), 4)
+        )
+        FROM attendance
+        WHERE student_person_person_id = %s AND academic_year = current_academic_year()
+    ''', (student_id,))
+
+def dashboard_financial(conn, student_id):
+    return dashboard_query(conn, '''
+        SELECT json_build_object(
+            'total_fees', COALESCE(SUM(f.fees), 0),
+            'total_paid', COALESCE(SUM(fa.values_acumulate), 0),
+            'total_pending', COALESCE(SUM(GREATEST(f.fees - fa.values_acumulate, 0)), 0)
+        )
+        FROM (
+            SELECT fees, fees_account_fees_account_id FROM major_info WHERE student_person_person_id = %s
+            UNION ALL
+            SELECT fees, fees_account_fees_account_id FROM extraactivities_fees WHERE student_person_person_id = %s
+        ) f
+        JOIN fees_account fa ON f.fees_account_fees_account_id = fa.fees_account_id
+    ''', (student_id, student_id))
+
+DASHBOARD_PARTS = {
+    'student': dashboard_student,
+    'grades': dashboard_grades,
+    'attendance': dashboard_attendance,
+    'financial': dashboard_financial
+}
+
+dashboard_executor = concurrent.futures.ThreadPoolExecutor(max_workers=BULKHEADS['dashboard']['pool_size'],
+                                                           thread_name_prefix='dashboard')
+
+@app.route('/dbproj/degree_details/<degree_id>', methods=['GET'])
+@token_required
+def degree_details(degree_id):
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
+        return flask.jsonify({
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can access this information',
+            'results': None
+        }), 403
+
     conn = db_connection()
     cur = conn.cursor()
     
     try:
-        # Verificar se a pessoa existe
-        cur.execute('SELECT person_id FROM person WHERE person_id = %s', (person_id,))
-        if cur.fetchone() is None:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Person not found',
-                'results': None
+        # Uma única query para obter todos os detalhes necessários
+        cur.execute('''
+            SELECT 
+                c.course_id,
+                c.course_name,
+                e.edition_id as course_edition_id,
+                e.capacity as course_edition_year,
+                e.capacity,
+                (SELECT COUNT(DISTINCT sc.student_person_person_id)
+                 FROM student_course sc
+                 WHERE sc.course_course_id = c.course_id) as enrolled_count,
+                (SELECT COUNT(DISTINCT r.student_person_person_id)
+                 FROM result r
+                 JOIN exam ex ON r.exam_exam_id = ex.exam_id
+                 WHERE r.score >= 9.5 AND ex.exam_id = e.exam_exam_id) as approved_count,
+                e.coordinator_instructor_worker_person_person_id as coordinator_id,
+                ARRAY(
+                    SELECT DISTINCT i.worker_person_person_id
+                    FROM instructor i
+                    JOIN assistant a ON i.worker_person_person_id = a.instructor_worker_person_person_id
+                    JOIN assistant_class ac ON a.instructor_worker_person_person_id = ac.assistant_instructor_worker_person_person_id
+                    JOIN class cl ON ac.class_class_id = cl.class_id
+                    WHERE cl.class_id = e.class_class_id
+                ) as instructors
+            FROM course c
+            JOIN edition e ON c.course_id = e.course_course_id
+            WHERE c.course_id = %s
+            ORDER BY e.edition_id DESC
+        ''', (degree_id,))
+        
+        results = []
+        for row in cur.fetchall():
+            results.append({
+                'course_id': row[0],
+                'course_name': row[1],
+                'course_edition_id': row[2],
+                'course_edition_year': row[3],
+                'capacity': row[4],
+                'enrolled_count': row[5] or 0,
+                'approved_count': row[6] or 0,
+                'coordinator_id': row[7],
+                'instructors': row[8] if row[8] else []
             })
             
-        # Verificar se já é um instructor
-        cur.execute('SELECT worker_person_person_id FROM instructor WHERE worker_person_person_id = %s', (person_id,))
-        if cur.fetchone() is not None:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'This person is already an instructor',
-                'results': None
-            })
-        
-        # Se não foi fornecido department_id, pegar o primeiro disponível
-        if not department_id:
-            cur.execute('SELECT department_id FROM department LIMIT 1')
-            result = cur.fetchone()
-            if result:
-                department_id = result[0]
-            else:
-                return flask.jsonify({
-                    'status': StatusCodes['api_error'],
-                    'errors': 'No department available',
-                    'results': None
-                })
-        
-        # Inserir na tabela worker com os atributos específicos
-        cur.execute('''
-            INSERT INTO worker (person_person_id, salary, started_working)
-            VALUES (%s, %s, %s)
-        ''', (person_id, salary, started_working))
-        
-        # Inserir na tabela instructor com os atributos específicos
-        cur.execute('''
-            INSERT INTO instructor (worker_person_person_id, major, department_department_id)
-            VALUES (%s, %s, %s)
-        ''', (person_id, major, department_id))
-        
-        conn.commit()
-        response = {
-            'status': StatusCodes['success'], 
-            'errors': None, 
-            'results': {
-                'person_id': person_id,
-                'salary': salary,
-                'started_working': started_working.strftime('%Y-%m-%d'),
-                'major': major,
-                'department_id': department_id
-            }
-        }
-        return flask.jsonify(response)
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': results
+        })
         
     except (Exception, psycopg2.DatabaseError) as error:
-        conn.rollback()
+        logger.error(f'Error getting degree details: {error}')
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
-        })
+        }), 500
+        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/enroll_degree/<int:major_id>', methods=['POST'])
+@app.route('/dbproj/top3', methods=['GET'])
 @token_required
-def enroll_degree(major_id):
+def top3_students():
     # Verificar se o usuário é staff
     if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can enroll students in majors',
+            'errors': 'Only staff members can access this information',
             'results': None
         }), 403
 
-    data = flask.request.get_json()
-    student_id = data.get('student_id')
-
-    if not student_id:
-        return flask.jsonify({
-            'status': StatusCodes['api_error'],
-            'errors': 'student_id is required',
-            'results': None
-        }), 400
-
     conn = db_connection()
     cur = conn.cursor()
     
     try:
-        # Verificar se o estudante existe
-        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (student_id,))
-        if cur.fetchone() is None:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Student not found',
-                'results': None
-            }), 404
-
-        # Verificar se o major existe
-        cur.execute('SELECT major_name FROM major WHERE major_id = %s', (major_id,))
-        major = cur.fetchone()
-        if not major:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Major not found',
-                'results': None
-            }), 404
-
-        # Verificar se o estudante já tem algum registro em major_info
+        # Query única para obter top 3 estudantes do ano acadêmico atual
         cur.execute('''
-            SELECT mi.status, m.major_name, mi.fees_account_fees_account_id
-            FROM major_info mi
-            JOIN major m ON mi.major_major_id = m.major_id
-            WHERE mi.student_person_person_id = %s
-        ''', (student_id,))
-        
-        existing_record = cur.fetchone()
+            WITH top_students AS (
+                SELECT 
+                    p.name as student_name,
+                    AVG(r.score) as average_grade,
+                    ARRAY_AGG(DISTINCT ea.activity_id) as activities,
+                    ROW_NUMBER() OVER (ORDER BY AVG(r.score) DESC) as rank
+                FROM student s
+                JOIN person p ON s.person_person_id = p.person_id
+                JOIN result r ON s.person_person_id = r.student_person_person_id
+                JOIN exam ex ON r.exam_exam_id = ex.exam_id
+                JOIN edition e ON ex.exam_id = e.exam_exam_id
+                LEFT JOIN extraactivities_student eas ON s.person_person_id = eas.student_person_person_id
+                LEFT JOIN extraactivities ea ON eas.extraactivities_activity_id = ea.activity_id
+                WHERE r.academic_year = current_academic_year()
+                GROUP BY p.name
+                HAVING COUNT(DISTINCT e.edition_id) > 0
+            )
+            SELECT 
+                ts.student_name,
+                ROUND(ts.average_grade::numeric, 2) as average_grade,
+                json_agg(
+                    json_build_object(
+                        'course_edition_id', e.edition_id,
+                        'course_name', c.course_name,
+                        'score', r.score,
+                        'exam_date', ex.data
+                    ) ORDER BY ex.data DESC
+                ) as grades,
+                ts.activities
+            FROM top_students ts
+            JOIN result r ON r.student_person_person_id = (
+                SELECT s2.person_person_id 
+                FROM student s2 
+                JOIN person p2 ON s2.person_person_id = p2.person_id 
+                WHERE p2.name = ts.student_name
+                LIMIT 1
+            )
+            JOIN exam ex ON r.exam_exam_id = ex.exam_id
+            JOIN edition e ON ex.exam_id = e.exam_exam_id
+            JOIN course c ON e.course_course_id = c.course_id
+            WHERE ts.rank <= 3
+            GROUP BY ts.student_name, ts.average_grade, ts.activities, ts.rank
+            ORDER BY ts.average_grade DESC
+        ''')
         
-        if existing_record:
-            if existing_record[0] == 'Active':
-                return flask.jsonify({
-                    'status': StatusCodes['api_error'],
-                    'errors': f'Student is already enrolled in major: {existing_record[1]}. Must unenroll first.',
-                    'results': None
-                }), 400
-            else:
-                # Se existe um registro inativo, atualizar para o novo major
-                cur.execute('''
-                    UPDATE major_info 
-                    SET major_major_id = %s, 
-                        status = 'Active',
-                        fees = 5000.00
-                    WHERE student_person_person_id = %s
-                    RETURNING fees_account_fees_account_id
-                ''', (major_id, student_id))
-                fees_account_id = cur.fetchone()[0]
-        else:
-            # Criar nova conta de taxas
-            cur.execute('INSERT INTO fees_account (values_acumulate) VALUES (0) RETURNING fees_account_id')
-            fees_account_id = cur.fetchone()[0]
-
-            # Matricular o estudante no novo major
-            cur.execute('''
-                INSERT INTO major_info (student_person_person_id, major_major_id, fees, status, fees_account_fees_account_id)
-                VALUES (%s, %s, %s, 'Active', %s)
-            ''', (student_id, major_id, 5000.00, fees_account_id))
-
-        conn.commit()
+        results = []
+        for row in cur.fetchall():
+            student_name, average_grade, grades, activities = row
+            results.append({
+                    'student_name': student_name,
+                'average_grade': float(average_grade),
+                'grades': grades,
+                'activities': activities if activities else []
+            })
+            
         return flask.jsonify({
             'status': StatusCodes['success'],
             'errors': None,
-            'results': {
-                'message': f'Successfully enrolled student {student_id} in major: {major[0]}',
-                'student_id': student_id,
-                'major_id': major_id,
-                'major_name': major[0],
-                'fees_account_id': fees_account_id
-            }
+            'results': results
         })
-
+        
     except (Exception, psycopg2.DatabaseError) as error:
-        conn.rollback()
+        logger.error(f'Error getting top 3 students: {error}')
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
-        })
+        }), 500
+        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/unenroll_degree', methods=['POST'])
+@app.route('/dbproj/top_by_district/', methods=['GET'])
 @token_required
-def unenroll_degree():
+def top_by_district():
     # Verificar se o usuário é staff
     if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can unenroll students from majors',
+            'errors': 'This endpoint is only available for staff members',
             'results': None
         }), 403
 
-    data = flask.request.get_json()
-    student_id = data.get('student_id')
-
-    if not student_id:
-        return flask.jsonify({
-            'status': StatusCodes['api_error'],
-            'errors': 'student_id is required',
-            'results': None
-        }), 400
-
     conn = db_connection()
     cur = conn.cursor()
     
     try:
-        # Verificar se o estudante existe
-        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (student_id,))
-        if cur.fetchone() is None:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Student not found',
-                'results': None
-            }), 404
-
-        # Verificar se o estudante está matriculado em algum major
-        cur.execute('''
-            SELECT m.major_name, mi.major_major_id
-            FROM major_info mi
-            JOIN major m ON mi.major_major_id = m.major_id
-            WHERE mi.student_person_person_id = %s AND mi.status = 'Active'
-        ''', (student_id,))
-        
-        current_major = cur.fetchone()
-        if not current_major:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Student is not enrolled in any major',
-                'results': None
-            }), 400
-
-        # Inativar a matrícula atual
+        # Query para obter o melhor aluno por distrito
+        # Usando uma única query SQL com window functions
         cur.execute('''
-            UPDATE major_info 
-            SET status = 'Inactive'
-            WHERE student_person_person_id = %s AND major_major_id = %s AND status = 'Active'
-            RETURNING major_major_id
-        ''', (student_id, current_major[1]))
+            WITH student_averages AS (
+                -- Calcular média de notas por aluno
+                SELECT 
+                    s.person_person_id as student_id,
+                    p.address as district,
+                    AVG(r.score) as average_grade,
+                    -- Rank dentro do distrito
+                    RANK() OVER (PARTITION BY p.address ORDER BY AVG(r.score) DESC) as district_rank
+                FROM student s
+                JOIN person p ON s.person_person_id = p.person_id
+                JOIN result r ON s.person_person_id = r.student_person_person_id
+                GROUP BY s.person_person_id, p.address
+            )
+            -- Selecionar apenas os melhores de cada distrito
+            SELECT 
+                student_id,
+                district,
+                ROUND(average_grade::numeric, 2) as average_grade
+            FROM student_averages
+            WHERE district_rank = 1
+            ORDER BY average_grade DESC;
+        ''')
         
-        if cur.fetchone() is None:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Failed to update major status. The student might already be inactive.',
-                'results': None
-            }), 400
-
-        conn.commit()
-        return flask.jsonify({
-            'status': StatusCodes['success'],
-            'errors': None,
-            'results': {
-                'message': f'Successfully unenrolled student {student_id} from major: {current_major[0]}',
+        results = []
+        for student_id, district, average_grade in cur.fetchall():
+            results.append({
                 'student_id': student_id,
-                'major_name': current_major[0],
-                'major_id': current_major[1]
-            }
+                'district': district,
+                'average_grade': float(average_grade)
+            })
+            
+        return flask.jsonify({
+            'status': StatusCodes['success'],
+            'errors': None,
+            'results': results
         })
-
+        
     except (Exception, psycopg2.DatabaseError) as error:
-        conn.rollback()
+        logger.error(f'Error getting top students by district: {error}')
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
         }), 500
+        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/enroll_activity/<activity_id>', methods=['POST'])
+
+@app.route('/dbproj/report', methods=['GET'])
 @token_required
-def enroll_activity(activity_id):
-    # Verificar se o usuário é estudante
-    if flask.g.role != 'student':
+def monthly_report():
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only students can enroll in activities',
+            'errors': 'Only staff members can access this information',
             'results': None
         }), 403
 
@@ -753,354 +3611,235 @@ def enroll_activity(activity_id):
     cur = conn.cursor()
     
     try:
-        # Verificar se a atividade existe
-        cur.execute('SELECT activity_id, name FROM extraactivities WHERE activity_id = %s', (activity_id,))
-        activity = cur.fetchone()
-        if not activity:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Activity not found',
-                'results': None
-            }), 404
-
-        # Verificar se o estudante já está inscrito nesta atividade
+        # Query única para obter o relatório mensal do ano letivo atual (só é lida a partição desse ano)
         cur.execute('''
-            SELECT extraactivities_activity_id 
-            FROM extraactivities_student 
-            WHERE student_person_person_id = %s AND extraactivities_activity_id = %s
-        ''', (flask.g.person_id, activity_id))
+            WITH monthly_course_stats AS (
+                SELECT 
+                    TO_CHAR(ex.data, 'YYYY-MM') as month,
+                    e.edition_id as course_edition_id,
+                    c.course_name as course_edition_name,
+                    COUNT(DISTINCT r.student_person_person_id) as evaluated,
+                    COUNT(DISTINCT CASE WHEN r.score >= 9.5 THEN r.student_person_person_id END) as approved,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY TO_CHAR(ex.data, 'YYYY-MM')
+                        ORDER BY COUNT(DISTINCT CASE WHEN r.score >= 9.5 THEN r.student_person_person_id END) DESC
+                    ) as rank
+                FROM result r
+                JOIN exam ex ON r.exam_exam_id = ex.exam_id
+                JOIN edition e ON ex.exam_id = e.exam_exam_id
+                JOIN course c ON e.course_course_id = c.course_id
+                WHERE r.academic_year = current_academic_year()
+                GROUP BY month, e.edition_id, c.course_name
+            )
+            SELECT 
+                month,
+                course_edition_id,
+                course_edition_name,
+                approved,
+                evaluated
+            FROM monthly_course_stats
+            WHERE rank = 1
+            ORDER BY month DESC;
+        ''')
         
-        if cur.fetchone():
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Student is already enrolled in this activity',
-                'results': None
-            }), 400
-
-        # Criar uma nova conta de taxas para a atividade
-        cur.execute('INSERT INTO fees_account (values_acumulate) VALUES (0) RETURNING fees_account_id')
-        fees_account_id = cur.fetchone()[0]
-
-        # Inscrever o estudante na atividade
-        cur.execute('''
-            INSERT INTO extraactivities_student (student_person_person_id, extraactivities_activity_id)
-            VALUES (%s, %s)
-        ''', (flask.g.person_id, activity_id))
-
-        # Criar registro de taxas para a atividade (assumindo uma taxa padrão de 50)
-        cur.execute('''
-            INSERT INTO extraactivities_fees 
-            (student_person_person_id, extraactivities_activity_id, fees, status, fees_account_fees_account_id)
-            VALUES (%s, %s, %s, %s, %s)
-        ''', (flask.g.person_id, activity_id, 50.0, 'Pending', fees_account_id))
-
-        conn.commit()
+        results = []
+        for row in cur.fetchall():
+            results.append({
+                'month': row[0],
+                'course_edition_id': row[1],
+                'course_edition_name': row[2],
+                'approved': row[3],
+                'evaluated': row[4]
+            })
+            
         return flask.jsonify({
             'status': StatusCodes['success'],
             'errors': None,
-            'results': {
-                'message': f'Successfully enrolled in activity: {activity[1]}',
-                'activity_id': activity[0],
-                'activity_name': activity[1],
-                'fees_account_id': fees_account_id,
-                'fees': 50.0,
-                'status': 'Pending'
-            }
+            'results': results
         })
-
+        
     except (Exception, psycopg2.DatabaseError) as error:
-        conn.rollback()
+        logger.error(f'Error generating monthly report: {error}')
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
-        })
+        }), 500
+        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/enroll_course_edition/<course_edition_id>', methods=['POST'])
+@app.route('/dbproj/delete_details/<int:student_id>', methods=['DELETE'])
 @token_required
-def enroll_course_edition(course_edition_id):
-    # Verificar se o usuário é estudante
-    if flask.g.role != 'student':
+def delete_student_details(student_id):
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only students can enroll in course editions',
-            'results': None
+            'errors': 'Only staff members can delete student data'
         }), 403
-
-    data = flask.request.get_json()
-    classes = data.get('classes', [])
-
-    if not classes:
-        return flask.jsonify({
-            'status': StatusCodes['api_error'],
-            'errors': 'At least one class ID is required',
-            'results': None
-        }), 400
-
+    
     conn = db_connection()
     cur = conn.cursor()
     
     try:
-        # Verificar se a edição do curso existe
-        cur.execute('''
-            SELECT e.edition_id, c.course_name, e.capacity, c.course_id
-            FROM edition e
-            JOIN course c ON e.course_course_id = c.course_id
-            WHERE e.edition_id = %s
-        ''', (course_edition_id,))
-        
-        edition = cur.fetchone()
-        if not edition:
+        # Verificar se o estudante existe
+        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (student_id,))
+        if cur.fetchone() is None:
             return flask.jsonify({
                 'status': StatusCodes['api_error'],
-                'errors': 'Course edition not found',
-                'results': None
+                'errors': 'Student not found'
             }), 404
-
-        # Verificar se o estudante já está inscrito neste curso
-        cur.execute('''
-            SELECT course_course_id 
-            FROM student_course 
-            WHERE student_person_person_id = %s AND course_course_id = %s
-        ''', (flask.g.person_id, edition[3]))  # edition[3] é o course_id
-        
-        if cur.fetchone():
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Student is already enrolled in this course',
-                'results': None
-            }), 400
-
-        # Verificar se há vagas disponíveis
-        cur.execute('''
-            SELECT COUNT(*) 
-            FROM student_course 
-            WHERE course_course_id = %s
-        ''', (edition[3],))
-        
-        current_enrollments = cur.fetchone()[0]
-        if current_enrollments >= edition[2]:  # edition[2] é a capacidade
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': 'Course edition is at maximum capacity',
-                'results': None
-            }), 400
-
-        # Verificar se todas as classes existem e pertencem a esta edição
-        class_placeholders = ','.join(['%s'] * len(classes))
-        cur.execute(f'''
-            SELECT class_id 
-            FROM class 
-            WHERE class_id IN ({class_placeholders})
-        ''', classes)
+            
+        # Deletar registros nas tabelas relacionadas ao estudante e da tabela student
+        delete_students(cur, [student_id])
         
-        valid_classes = {r[0] for r in cur.fetchall()}
-        invalid_classes = [cid for cid in classes if cid not in valid_classes]
-        if invalid_classes:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': f'Invalid class IDs: {invalid_classes}',
-                'results': None
-            }), 400
-
-        # Inscrever o estudante no curso
-        cur.execute('''
-            INSERT INTO student_course (student_person_person_id, course_course_id)
-            VALUES (%s, %s)
-        ''', (flask.g.person_id, edition[3]))
-
-        # Criar registros de presença para cada classe
-        for class_id in classes:
-            cur.execute('''
-                INSERT INTO attendance (student_person_person_id, class_class_id, present)
-                VALUES (%s, %s, false)
-            ''', (flask.g.person_id, class_id))
-
         conn.commit()
         return flask.jsonify({
-            'status': StatusCodes['success'],
-            'errors': None,
-            'results': {
-                'message': f'Successfully enrolled in course: {edition[1]}',
-                'course_edition_id': edition[0],
-                'course_name': edition[1],
-                'course_id': edition[3],
-                'enrolled_classes': list(classes)
-            }
+            'status': StatusCodes['success']
         })
-
+        
     except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f'Error deleting student data: {error}')
         conn.rollback()
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
-            'errors': str(error),
-            'results': None
-        })
+            'errors': str(error)
+        }), 500
+        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/submit_grades/<course_edition_id>', methods=['POST'])
+@app.route('/dbproj/delete_details/bulk', methods=['POST'])
 @token_required
-def submit_grades(course_edition_id):
-    # Verificar se o usuário é instrutor
-    if flask.g.role != 'instructor':
-        return flask.jsonify({
-            'status': StatusCodes['unauthorized'],
-            'errors': 'Only instructors can submit grades',
-            'results': None
-        }), 403
-
-    data = flask.request.get_json()
-    period = data.get('period')
-    grades = data.get('grades', [])
-
-    if not period or not grades:
+def purge_students():
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
         return flask.jsonify({
-            'status': StatusCodes['api_error'],
-            'errors': 'Evaluation period and grades are required',
-            'results': None
-        }), 400
-
-    conn = db_connection()
-    cur = conn.cursor()
-    
-    try:
-        # Verificar se a edição do curso existe e se o instrutor é o coordenador
-        cur.execute('''
-            SELECT e.edition_id, c.course_name, e.exam_exam_id
-            FROM edition e
-            JOIN course c ON e.course_course_id = c.course_id
-            WHERE e.edition_id = %s AND e.coordinator_instructor_worker_person_person_id = %s
-        ''', (course_edition_id, flask.g.person_id))
-        
-        edition = cur.fetchone()
-        if not edition:
-            return flask.jsonify({
-                'status': StatusCodes['unauthorized'],
-                'errors': 'You are not the coordinator of this course edition',
-                'results': None
-            }), 403
-
-        # Verificar se todos os estudantes estão matriculados nesta edição
-        student_ids = [grade[0] for grade in grades]
-        placeholders = ','.join(['%s'] * len(student_ids))
-        
-        cur.execute(f'''
-            SELECT student_person_person_id
-            FROM student_course sc
-            JOIN edition e ON sc.course_course_id = e.course_course_id
-            WHERE e.edition_id = %s AND sc.student_person_person_id IN ({placeholders})
-        ''', (course_edition_id, *student_ids))
-        
-        enrolled_students = {r[0] for r in cur.fetchall()}
-        invalid_students = [sid for sid in student_ids if sid not in enrolled_students]
-        
-        if invalid_students:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': f'Students with IDs {invalid_students} are not enrolled in this course edition',
-                'results': None
-            }), 400
+            'status': StatusCodes['unauthorized'],
+            'errors': 'Only staff members can delete student data',
+            'results': None
+        }), 403
 
-        # Validar as notas (entre 0 e 20)
-        invalid_grades = [(sid, grade) for sid, grade in grades if not 0 <= grade <= 20]
-        if invalid_grades:
-            return flask.jsonify({
-                'status': StatusCodes['api_error'],
-                'errors': f'Invalid grades (must be between 0 and 20): {invalid_grades}',
-                'results': None
-            }), 400
+    data = flask.request.get_json()
+    student_ids = data.get('student_ids')
+    enrolled_before = data.get('enrolled_before')
+    chunk_size = data.get('chunk_size', PURGE_CHUNK_SIZE)
 
-        # Inserir ou atualizar as notas
-        results = []
-        for student_id, grade in grades:
-            # Verificar se já existe uma nota para este estudante neste exame
-            cur.execute('''
-                SELECT result_id
-                FROM result
-                WHERE student_person_person_id = %s AND exam_exam_id = %s
-            ''', (student_id, edition[2]))  # edition[2] é o exam_exam_id
-            
-            existing_result = cur.fetchone()
-            
-            if existing_result:
-                # Atualizar nota existente
-                cur.execute('''
-                    UPDATE result
-                    SET score = %s
-                    WHERE result_id = %s
-                    RETURNING result_id
-                ''', (grade, existing_result[0]))
-                result_id = existing_result[0]
-                action = 'updated'
+    if (student_ids is None) == (enrolled_before is None):
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'Either student_ids or enrolled_before is required',
+            'results': None
+        }), 400
+
+    try:
+        chunk_size = int(chunk_size)
+        if student_ids is not None:
+            if not isinstance(student_ids, list) or len(student_ids) > MAX_BULK_ITEMS:
+                raise ValueError(f'student_ids must be a list of at most {MAX_BULK_ITEMS} ids')
+            student_ids = sorted({int(sid) for sid in student_ids})
+        else:
+            enrolled_before = datetime.date.fromisoformat(enrolled_before)
+    except (TypeError, ValueError) as error:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'Invalid request: {error}',
+            'results': None
+        }), 400
+
+    if not 0 < chunk_size <= PURGE_CHUNK_SIZE:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'chunk_size must be between 1 and {PURGE_CHUNK_SIZE}',
+            'results': None
+        }), 400
+
+    conn = db_connection()
+    cur = conn.cursor()
+    purged = 0
+    chunks = 0
+
+    try:
+        # Cada bloco é apagado e confirmado numa transação curta, para manter pequenos os locks e o WAL
+        last_id = 0
+        while True:
+            if student_ids is not None:
+                chunk = student_ids[chunks * chunk_size:(chunks + 1) * chunk_size]
             else:
-                # Primeiro garantir que o estudante está inscrito no exame
-                cur.execute('''
-                    INSERT INTO exam_student (exam_exam_id, student_person_person_id)
-                    VALUES (%s, %s)
-                    ON CONFLICT DO NOTHING
-                ''', (edition[2], student_id))
-                
-                # Inserir nova nota
+                # Só estudantes que já não frequentam nenhuma licenciatura (sem inscrição ativa ou paga)
                 cur.execute('''
-                    INSERT INTO result (student_person_person_id, exam_exam_id, score)
-                    VALUES (%s, %s, %s)
-                    RETURNING result_id
-                ''', (student_id, edition[2], grade))
-                result_id = cur.fetchone()[0]
-                action = 'inserted'
-            
-            results.append({
-                'student_id': student_id,
-                'grade': grade,
-                'result_id': result_id,
-                'action': action
-            })
+                    SELECT s.person_person_id FROM student s
+                    WHERE s.enrolment_date < %s AND s.person_person_id > %s
+                      AND NOT EXISTS (
+                          SELECT 1 FROM major_info mi
+                          WHERE mi.student_person_person_id = s.person_person_id
+                            AND mi.status IN ('Active', 'Paid')
+                      )
+                    ORDER BY s.person_person_id
+                    LIMIT %s
+                ''', (enrolled_before, last_id, chunk_size))
+                chunk = [row[0] for row in cur.fetchall()]
+            if not chunk:
+                break
 
-        # Atualizar a média do estudante
-        for student_id, _ in grades:
-            cur.execute('''
-                UPDATE student
-                SET mean = (
-                    SELECT AVG(score)
-                    FROM result
-                    WHERE student_person_person_id = %s
-                )
-                WHERE person_person_id = %s
-            ''', (student_id, student_id))
+            deleted = delete_students(cur, chunk)
+            conn.commit()
+            chunks += 1
+            purged += len(deleted)
+            last_id = chunk[-1]
+            logger.info(f'purge progress: chunk {chunks}, {purged} students deleted')
 
-        conn.commit()
         return flask.jsonify({
             'status': StatusCodes['success'],
             'errors': None,
-            'results': {
-                'message': f'Successfully submitted grades for {edition[1]}',
-                'course_edition_id': edition[0],
-                'course_name': edition[1],
-                'exam_id': edition[2],
-                'period': period,
-                'grades': results
-            }
+            'results': {'purged': purged, 'chunks': chunks}
         })
 
     except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f'Error purging student data: {error}')
         conn.rollback()
+        # os blocos anteriores já foram confirmados
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
-            'results': None
-        })
+            'results': {'purged': purged, 'chunks': chunks}
+        }), 500
+
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/student_details/<int:student_id>', methods=['GET'])
+def delete_students(cur, student_ids):
+    # Todas as tabelas dependentes numa só instrução; as chaves estrangeiras são verificadas no fim dela
+    cur.execute('''
+        WITH ids AS (
+            SELECT unnest(%s::bigint[]) AS student_id
+        ), exams AS (
+            DELETE FROM exam_student WHERE student_person_person_id IN (SELECT student_id FROM ids)
+        ), courses AS (
+            DELETE FROM student_course WHERE student_person_person_id IN (SELECT student_id FROM ids)
+        ), activities AS (
+            DELETE FROM extraactivities_student WHERE student_person_person_id IN (SELECT student_id FROM ids)
+        ), attendances AS (
+            DELETE FROM attendance WHERE student_person_person_id IN (SELECT student_id FROM ids)
+        ), results AS (
+            DELETE FROM result WHERE student_person_person_id IN (SELECT student_id FROM ids)
+        ), majors AS (
+            DELETE FROM major_info WHERE student_person_person_id IN (SELECT student_id FROM ids)
+        ), activity_fees AS (
+            DELETE FROM extraactivities_fees WHERE student_person_person_id IN (SELECT student_id FROM ids)
+        )
+        DELETE FROM student WHERE person_person_id IN (SELECT student_id FROM ids)
+        RETURNING person_person_id
+    ''', (student_ids,))
+    return [row[0] for row in cur.fetchall()]
+
+@app.route('/dbproj/student/financial-status/<int:student_id>', methods=['GET'])
 @token_required
-def student_course_details(student_id):
+def student_financial_status(student_id):
     # Verificar se o usuário é staff ou o próprio estudante
     if flask.g.role != 'staff' and str(flask.g.person_id) != str(student_id):
         return flask.jsonify({
@@ -1113,44 +3852,152 @@ def student_course_details(student_id):
     cur = conn.cursor()
     
     try:
-        # Verificar se o estudante existe
-        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (student_id,))
-        if cur.fetchone() is None:
+        # Obter informações financeiras do estudante
+        cur.execute('''
+            WITH student_majors AS (
+                SELECT 
+                    s.person_person_id,
+                    m.major_name,
+                    mi.fees as tuition_fee,
+                    fa.values_acumulate as paid_amount,
+                    mi.status
+                FROM student s
+                JOIN major_info mi ON s.person_person_id = mi.student_person_person_id
+                JOIN major m ON mi.major_major_id = m.major_id
+                JOIN fees_account fa ON mi.fees_account_fees_account_id = fa.fees_account_id
+                WHERE s.person_person_id = %s
+            ),
+            student_activities AS (
+                SELECT 
+                    s.person_person_id,
+                    ea.name as activity_name,
+                    ef.fees as activity_fee,
+                    fa.values_acumulate as paid_amount,
+                    ef.status
+                FROM student s
+                JOIN extraactivities_student eas ON s.person_person_id = eas.student_person_person_id
+                JOIN extraactivities ea ON eas.extraactivities_activity_id = ea.activity_id
+                LEFT JOIN extraactivities_fees ef ON s.person_person_id = ef.student_person_person_id
+                    AND eas.extraactivities_activity_id = ef.extraactivities_activity_id
+                LEFT JOIN fees_account fa ON ef.fees_account_fees_account_id = fa.fees_account_id
+                WHERE s.person_person_id = %s
+            )
+            SELECT 
+                COALESCE(
+                json_agg(
+                    json_build_object(
+                            'major_name', sm.major_name,
+                            'tuition_fee', sm.tuition_fee,
+                            'paid_amount', COALESCE(sm.paid_amount, 0),
+                            'pending_amount', sm.tuition_fee - COALESCE(sm.paid_amount, 0),
+                            'status', sm.status
+                        )
+                    ) FILTER (WHERE sm.major_name IS NOT NULL),
+                    '[]'
+                ) as majors,
+                COALESCE(
+                json_agg(
+                    json_build_object(
+                            'activity_name', sa.activity_name,
+                            'activity_fee', sa.activity_fee,
+                            'paid_amount', COALESCE(sa.paid_amount, 0),
+                            'pending_amount', sa.activity_fee - COALESCE(sa.paid_amount, 0),
+                            'status', sa.status
+                        )
+                    ) FILTER (WHERE sa.activity_name IS NOT NULL),
+                    '[]'
+                ) as activities
+            FROM student_majors sm
+            FULL OUTER JOIN student_activities sa ON sm.person_person_id = sa.person_person_id;
+        ''', (student_id, student_id))
+        
+        result = cur.fetchone()
+        
+        if result is None or (result[0] is None and result[1] is None):
             return flask.jsonify({
                 'status': StatusCodes['api_error'],
-                'errors': 'Student not found',
+                'errors': 'Student not found or not enrolled in any major/activity',
                 'results': None
             }), 404
             
-        # Buscar todos os cursos em que o estudante está matriculado
-        cur.execute('''
-            SELECT 
-                e.edition_id as course_edition_id,
-                c.course_name as course_name
-            FROM student_course sc
-            JOIN course c ON sc.course_course_id = c.course_id
-            JOIN edition e ON c.course_id = e.course_course_id
-            WHERE sc.student_person_person_id = %s
-            ORDER BY e.edition_id DESC, c.course_name
-        ''', (student_id,))
+        majors_data, activities_data = result
         
-        results = []
-        for row in cur.fetchall():
-            results.append({
-                'course_edition_id': row[0],
-                'course_name': row[1],
-                'course_edition_year': None,  # Não temos o ano na tabela
-                'grade': None  # Como não temos acesso direto às notas
-            })
+        # Processar informações dos majors
+        majors = []
+        total_majors_fees = 0
+        total_majors_paid = 0
+        
+        if majors_data:
+            for major in majors_data:
+                tuition_fee = float(major['tuition_fee']) if major['tuition_fee'] else 0
+                paid_amount = float(major['paid_amount']) if major['paid_amount'] else 0
+                pending_amount = float(major['pending_amount']) if major['pending_amount'] else 0
+                
+                majors.append({
+                    'name': major['major_name'],
+                    'tuition_fee': tuition_fee,
+                    'paid_amount': paid_amount,
+                    'pending_amount': pending_amount,
+                    'status': major['status']
+                })
+                
+                total_majors_fees += tuition_fee
+                total_majors_paid += paid_amount
+        
+        # Processar atividades extracurriculares
+        activities = []
+        total_activities_fees = 0
+        total_activities_paid = 0
+        
+        if activities_data:
+            for activity in activities_data:
+                if activity['activity_name'] is not None:
+                    activity_fee = float(activity['activity_fee']) if activity['activity_fee'] else 0
+                    paid_amount = float(activity['paid_amount']) if activity['paid_amount'] else 0
+                    pending_amount = float(activity['pending_amount']) if activity['pending_amount'] else 0
+                    
+                    activities.append({
+                        'name': activity['activity_name'],
+                        'activity_fee': activity_fee,
+                        'paid_amount': paid_amount,
+                        'pending_amount': pending_amount,
+                        'status': activity['status']
+                    })
+                    
+                    total_activities_fees += activity_fee
+                    total_activities_paid += paid_amount
+        
+        # Calcular totais gerais
+        total_fees = total_majors_fees + total_activities_fees
+        total_paid = total_majors_paid + total_activities_paid
+        total_pending = total_fees - total_paid
         
         return flask.jsonify({
             'status': StatusCodes['success'],
             'errors': None,
-            'results': results
+            'results': {
+                'majors': majors,
+                'majors_summary': {
+                    'total_fees': total_majors_fees,
+                    'total_paid': total_majors_paid,
+                    'total_pending': total_majors_fees - total_majors_paid
+                },
+                'activities': activities,
+                'activities_summary': {
+                    'total_fees': total_activities_fees,
+                    'total_paid': total_activities_paid,
+                    'total_pending': total_activities_fees - total_activities_paid
+                },
+                'overall_summary': {
+                    'total_fees': total_fees,
+                    'total_paid': total_paid,
+                    'total_pending': total_pending
+                }
+            }
         })
         
     except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'Error getting student details: {error}')
+        logger.error(f'Error getting student financial status: {error}')
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
@@ -1159,561 +4006,526 @@ def student_course_details(student_id):
         
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/degree_details/<degree_id>', methods=['GET'])
+
+@app.route('/dbproj/payments', methods=['POST'])
 @token_required
-def degree_details(degree_id):
+def post_payment():
     # Verificar se o usuário é staff
     if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can access this information',
+            'errors': 'Only staff members can post payments',
             'results': None
         }), 403
 
+    data = flask.request.get_json()
+    fees_account_id = data.get('fees_account_id')
+    amount = data.get('amount')
+    # Só inteiros (ou texto só com dígitos): 12.9 ou true não podem virar outro montante
+    integral = lambda value: (type(value) is int) or (isinstance(value, str) and value.isdigit())
+    if not integral(fees_account_id) or not integral(amount) or int(amount) <= 0:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'fees_account_id and a positive integer amount are required',
+            'results': None
+        }), 400
+    fees_account_id = int(fees_account_id)
+    amount = int(amount)
+
     conn = db_connection()
     cur = conn.cursor()
-    
+
     try:
-        # Uma única query para obter todos os detalhes necessários
+        # Registar o pagamento e atualizar o saldo da conta na mesma instrução
         cur.execute('''
-            SELECT 
-                c.course_id,
-                c.course_name,
-                e.edition_id as course_edition_id,
-                e.capacity as course_edition_year,
-                e.capacity,
-                (SELECT COUNT(DISTINCT sc.student_person_person_id)
-                 FROM student_course sc
-                 WHERE sc.course_course_id = c.course_id) as enrolled_count,
-                (SELECT COUNT(DISTINCT r.student_person_person_id)
-                 FROM result r
-                 JOIN exam ex ON r.exam_exam_id = ex.exam_id
-                 WHERE r.score >= 9.5 AND ex.exam_id = e.exam_exam_id) as approved_count,
-                e.coordinator_instructor_worker_person_person_id as coordinator_id,
-                ARRAY(
-                    SELECT DISTINCT i.worker_person_person_id
-                    FROM instructor i
-                    JOIN assistant a ON i.worker_person_person_id = a.instructor_worker_person_person_id
-                    JOIN assistant_class ac ON a.instructor_worker_person_person_id = ac.assistant_instructor_worker_person_person_id
-                    JOIN class cl ON ac.class_class_id = cl.class_id
-                    WHERE cl.class_id = e.class_class_id
-                ) as instructors
-            FROM course c
-            JOIN edition e ON c.course_id = e.course_course_id
-            WHERE c.course_id = %s
-            ORDER BY e.edition_id DESC
-        ''', (degree_id,))
-        
-        results = []
-        for row in cur.fetchall():
-            results.append({
-                'course_id': row[0],
-                'course_name': row[1],
-                'course_edition_id': row[2],
-                'course_edition_year': row[3],
-                'capacity': row[4],
-                'enrolled_count': row[5] or 0,
-                'approved_count': row[6] or 0,
-                'coordinator_id': row[7],
-                'instructors': row[8] if row[8] else []
-            })
-            
+            WITH account AS (
+                UPDATE fees_account
+                SET values_acumulate = values_acumulate + %s
+                WHERE fees_account_id = %s
+                RETURNING fees_account_id, values_acumulate
+            )
+            INSERT INTO payment (paid_amount, fees_account_fees_account_id)
+            SELECT %s, fees_account_id FROM account
+            RETURNING payment_id, (SELECT values_acumulate FROM account)
+        ''', (amount, fees_account_id, amount))
+
+        payment = cur.fetchone()
+        if payment is None:
+            conn.rollback()
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Fees account not found',
+                'results': None
+            }), 404
+
+        conn.commit()
         return flask.jsonify({
             'status': StatusCodes['success'],
             'errors': None,
-            'results': results
+            'results': {
+                'payment_id': payment[0],
+                'fees_account_id': fees_account_id,
+                'amount': amount,
+                'balance': payment[1]
+            }
         })
-        
+
     except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'Error getting degree details: {error}')
+        conn.rollback()
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
         }), 500
-        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/top3', methods=['GET'])
+@app.route('/dbproj/payments/import', methods=['POST'])
 @token_required
-def top3_students():
+def import_payments():
     # Verificar se o usuário é staff
     if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can access this information',
+            'errors': 'Only staff members can import payments',
             'results': None
         }), 403
 
     conn = db_connection()
     cur = conn.cursor()
-    
+
     try:
-        # Query única para obter top 3 estudantes do ano acadêmico atual
+        # O ficheiro do banco (CSV com cabeçalho: fees_account_id,amount) é copiado
+        # diretamente do pedido para uma tabela temporária, sem passar por Python linha a linha
         cur.execute('''
-            WITH top_students AS (
-                SELECT 
-                    p.name as student_name,
-                    AVG(r.score) as average_grade,
-                    ARRAY_AGG(DISTINCT ea.activity_id) as activities,
-                    ROW_NUMBER() OVER (ORDER BY AVG(r.score) DESC) as rank
-                FROM student s
-                JOIN person p ON s.person_person_id = p.person_id
-                JOIN result r ON s.person_person_id = r.student_person_person_id
-                JOIN exam ex ON r.exam_exam_id = ex.exam_id
-                JOIN edition e ON ex.exam_id = e.exam_exam_id
-                LEFT JOIN extraactivities_student eas ON s.person_person_id = eas.student_person_person_id
-                LEFT JOIN extraactivities ea ON eas.extraactivities_activity_id = ea.activity_id
-                WHERE EXTRACT(YEAR FROM ex.data) = 
-                    CASE 
-                        WHEN EXTRACT(MONTH FROM CURRENT_DATE) >= 9 THEN EXTRACT(YEAR FROM CURRENT_DATE)
-                        ELSE EXTRACT(YEAR FROM CURRENT_DATE) - 1
-                    END
-                GROUP BY p.name
-                HAVING COUNT(DISTINCT e.edition_id) > 0
-            )
-            SELECT 
-                ts.student_name,
-                ROUND(ts.average_grade::numeric, 2) as average_grade,
-                json_agg(
-                    json_build_object(
-                        'course_edition_id', e.edition_id,
-                        'course_name', c.course_name,
-                        'score', r.score,
-                        'exam_date', ex.data
-                    ) ORDER BY ex.data DESC
-                ) as grades,
-                ts.activities
-            FROM top_students ts
-            JOIN result r ON r.student_person_person_id = (
-                SELECT s2.person_person_id 
-                FROM student s2 
-                JOIN person p2 ON s2.person_person_id = p2.person_id 
-                WHERE p2.name = ts.student_name
-                LIMIT 1
-            )
-            JOIN exam ex ON r.exam_exam_id = ex.exam_id
-            JOIN edition e ON ex.exam_id = e.exam_exam_id
-            JOIN course c ON e.course_course_id = c.course_id
-            WHERE ts.rank <= 3
-            GROUP BY ts.student_name, ts.average_grade, ts.activities, ts.rank
-            ORDER BY ts.average_grade DESC
+            CREATE TEMP TABLE payment_staging (
+                line            BIGINT GENERATED ALWAYS AS IDENTITY,
+                fees_account_id BIGINT,
+                amount          BIGINT
+            ) ON COMMIT DROP
         ''')
-        
-        results = []
-        for row in cur.fetchall():
-            student_name, average_grade, grades, activities = row
-            results.append({
-                    'student_name': student_name,
-                'average_grade': float(average_grade),
-                'grades': grades,
-                'activities': activities if activities else []
-            })
-            
+        try:
+            cur.copy_expert('''
+                COPY payment_staging (fees_account_id, amount) FROM STDIN WITH (FORMAT csv, HEADER true)
+            ''', flask.request.stream)
+        except psycopg2.DataError as error:
+            conn.rollback()
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': f'Invalid payment file: {error}'.strip(),
+                'results': None
+            }), 400
+
+        # Linhas rejeitadas: conta inexistente ou montante inválido (linha 1 é o cabeçalho)
+        cur.execute('''
+            SELECT s.line + 1, s.fees_account_id, s.amount,
+                   CASE WHEN s.amount IS NULL OR s.amount <= 0 THEN 'Invalid amount' ELSE 'Fees account not found' END
+            FROM payment_staging s
+            LEFT JOIN fees_account fa ON s.fees_account_id = fa.fees_account_id
+            WHERE s.amount IS NULL OR s.amount <= 0 OR fa.fees_account_id IS NULL
+            ORDER BY s.line
+        ''')
+        rejected = [{'line': line, 'fees_account_id': account, 'amount': amount, 'error': reason}
+                    for line, account, amount, reason in cur.fetchall()]
+
+        # Bloquear as contas por ordem de id e depois inserir os pagamentos e
+        # atualizar cada conta uma só vez (uma só ida à base de dados)
+        valid = '''
+            SELECT s.fees_account_id, s.amount
+            FROM payment_staging s
+            JOIN fees_account fa ON s.fees_account_id = fa.fees_account_id
+            WHERE s.amount > 0
+        '''
+        execute_pipeline(cur, [
+            (f'''
+                SELECT fees_account_id FROM fees_account
+                WHERE fees_account_id IN (SELECT fees_account_id FROM ({valid}) v)
+                ORDER BY fees_account_id
+                FOR UPDATE
+            ''', ()),
+            (f'''
+                WITH valid AS ({valid}),
+                payments AS (
+                    INSERT INTO payment (paid_amount, fees_account_fees_account_id)
+                    SELECT amount, fees_account_id FROM valid
+                    RETURNING paid_amount
+                ), totals AS (
+                    SELECT fees_account_id, SUM(amount) AS total FROM valid GROUP BY fees_account_id
+                ), accounts AS (
+                    UPDATE fees_account fa
+                    SET values_acumulate = fa.values_acumulate + t.total
+                    FROM totals t
+                    WHERE fa.fees_account_id = t.fees_account_id
+                    RETURNING fa.fees_account_id
+                )
+                SELECT (SELECT COUNT(*) FROM payments),
+                       (SELECT COALESCE(SUM(paid_amount), 0)::bigint FROM payments),
+                       (SELECT COUNT(*) FROM accounts)
+            ''', ())
+        ])
+        imported, total_amount, accounts = cur.fetchone()
+
+        results = {
+            'imported': imported,
+            'total_amount': total_amount,
+            'accounts_updated': accounts,
+            'rejected': rejected[:PAYMENT_IMPORT_MAX_REJECTED],
+            'rejected_count': len(rejected)
+        }
+
+        # Opcional: recalcular o estado de todas as propinas na mesma transação
+        if flask.request.args.get('reconcile', '').lower() in ('1', 'true'):
+            results['reconciliation'] = reconcile_payment_status(cur)
+
+        conn.commit()
         return flask.jsonify({
             'status': StatusCodes['success'],
             'errors': None,
             'results': results
         })
-        
+
     except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'Error getting top 3 students: {error}')
+        conn.rollback()
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
         }), 500
-        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/top_by_district/', methods=['GET'])
+@app.route('/dbproj/payments/reconcile', methods=['POST'])
 @token_required
-def top_by_district():
+def reconcile_payments():
     # Verificar se o usuário é staff
     if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'This endpoint is only available for staff members',
+            'errors': 'Only staff members can reconcile payments',
             'results': None
         }), 403
 
     conn = db_connection()
     cur = conn.cursor()
-    
+
     try:
-        # Query para obter o melhor aluno por distrito
-        # Usando uma única query SQL com window functions
-        cur.execute('''
-            WITH student_averages AS (
-                -- Calcular média de notas por aluno
-                SELECT 
-                    s.person_person_id as student_id,
-                    p.address as district,
-                    AVG(r.score) as average_grade,
-                    -- Rank dentro do distrito
-                    RANK() OVER (PARTITION BY p.address ORDER BY AVG(r.score) DESC) as district_rank
-                FROM student s
-                JOIN person p ON s.person_person_id = p.person_id
-                JOIN result r ON s.person_person_id = r.student_person_person_id
-                GROUP BY s.person_person_id, p.address
-            )
-            -- Selecionar apenas os melhores de cada distrito
-            SELECT 
-                student_id,
-                district,
-                ROUND(average_grade::numeric, 2) as average_grade
-            FROM student_averages
-            WHERE district_rank = 1
-            ORDER BY average_grade DESC;
-        ''')
-        
-        results = []
-        for student_id, district, average_grade in cur.fetchall():
-            results.append({
-                'student_id': student_id,
-                'district': district,
-                'average_grade': float(average_grade)
-            })
-            
+        results = reconcile_payment_status(cur)
+        conn.commit()
         return flask.jsonify({
             'status': StatusCodes['success'],
             'errors': None,
             'results': results
         })
-        
+
     except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'Error getting top students by district: {error}')
+        conn.rollback()
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
         }), 500
-        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
+def reconcile_payment_status(cur):
+    # Uma passagem por cada tabela de propinas (ver sql/procedures.sql)
+    cur.execute('SELECT reconcile_payment_status()')
+    outcome = cur.fetchone()[0]
+    return {key: outcome[key] for key in ('majors_paid', 'majors_reopened', 'activities_paid', 'activities_pending')}
 
-@app.route('/dbproj/report', methods=['GET'])
+@app.route('/dbproj/export/grades/<int:edition_id>', methods=['GET'])
 @token_required
-def monthly_report():
+def export_grades(edition_id):
     # Verificar se o usuário é staff
     if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can access this information',
+            'errors': 'Only staff members can export grades',
             'results': None
-        }), 403
-
-    conn = db_connection()
-    cur = conn.cursor()
-    
-    try:
-        # Query única para obter o relatório mensal dos últimos 12 meses
-        cur.execute('''
-            WITH monthly_course_stats AS (
-                SELECT 
-                    TO_CHAR(ex.data, 'YYYY-MM') as month,
-                    e.edition_id as course_edition_id,
-                    c.course_name as course_edition_name,
-                    COUNT(DISTINCT r.student_person_person_id) as evaluated,
-                    COUNT(DISTINCT CASE WHEN r.score >= 9.5 THEN r.student_person_person_id END) as approved,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY TO_CHAR(ex.data, 'YYYY-MM')
-                        ORDER BY COUNT(DISTINCT CASE WHEN r.score >= 9.5 THEN r.student_person_person_id END) DESC
-                    ) as rank
-                FROM result r
-                JOIN exam ex ON r.exam_exam_id = ex.exam_id
-                JOIN edition e ON ex.exam_id = e.exam_exam_id
-                JOIN course c ON e.course_course_id = c.course_id
-                WHERE EXTRACT(YEAR FROM ex.data) = 
-                    CASE 
-                        WHEN EXTRACT(MONTH FROM CURRENT_DATE) >= 9 THEN EXTRACT(YEAR FROM CURRENT_DATE)
-                        ELSE EXTRACT(YEAR FROM CURRENT_DATE) - 1
-                    END
-                GROUP BY month, e.edition_id, c.course_name
-            )
-            SELECT 
-                month,
-                course_edition_id,
-                course_edition_name,
-                approved,
-                evaluated
-            FROM monthly_course_stats
-            WHERE rank = 1
-            ORDER BY month DESC;
-        ''')
-        
-        results = []
-        for row in cur.fetchall():
-            results.append({
-                'month': row[0],
-                'course_edition_id': row[1],
-                'course_edition_name': row[2],
-                'approved': row[3],
-                'evaluated': row[4]
-            })
-            
-        return flask.jsonify({
-            'status': StatusCodes['success'],
-            'errors': None,
-            'results': results
-        })
-        
+        }), 403
+
+    conn = db_connection()
+    cur = conn.cursor()
+
+    try:
+        # Exame da edição e o seu ano letivo (a exportação só lê essa partição de result)
+        cur.execute('''
+            SELECT e.exam_exam_id, academic_year(ex.data)
+            FROM edition e
+            JOIN exam ex ON e.exam_exam_id = ex.exam_id
+            WHERE e.edition_id = %s
+        ''', (edition_id,))
+        edition = cur.fetchone()
+        if edition is None:
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'Course edition not found',
+                'results': None
+            }), 404
+
+        response = csv_response(conn, '''
+            SELECT r.student_person_person_id AS student_id, p.name, p.email, r.score,
+                   to_char(ex.data, 'YYYY-MM-DD') AS exam_date, r.academic_year
+            FROM result r
+            JOIN person p ON r.student_person_person_id = p.person_id
+            JOIN exam ex ON r.exam_exam_id = ex.exam_id
+            WHERE r.exam_exam_id = %s AND r.academic_year = %s
+            ORDER BY r.student_person_person_id
+        ''', edition, f'grades-edition-{edition_id}.csv')
+        # A ligação passa a pertencer ao stream, que a devolve quando termina
+        conn = None
+        return response
+
     except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'Error generating monthly report: {error}')
+        conn.rollback()
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
         }), 500
-        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/delete_details/<int:student_id>', methods=['DELETE'])
+@app.route('/dbproj/export/enrollments/<int:major_id>', methods=['GET'])
 @token_required
-def delete_student_details(student_id):
+def export_enrollments(major_id):
     # Verificar se o usuário é staff
     if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff members can delete student data'
+            'errors': 'Only staff members can export enrollments',
+            'results': None
         }), 403
-    
+
     conn = db_connection()
-    cur = conn.cursor()
-    
+
     try:
-        # Verificar se o estudante existe
-        cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (student_id,))
-        if cur.fetchone() is None:
+        # Um major inexistente é rejeitado sem ir à base de dados
+        if major_id not in reference_cache.get()['majors']:
             return flask.jsonify({
                 'status': StatusCodes['api_error'],
-                'errors': 'Student not found'
+                'errors': 'Major not found',
+                'results': None
             }), 404
-            
-        # Deletar registros nas tabelas relacionadas ao estudante
-        # Deletar referências nas tabelas relacionadas a student
-        cur.execute('DELETE FROM exam_student WHERE student_person_person_id = %s', (student_id,))
-        cur.execute('DELETE FROM student_course WHERE student_person_person_id = %s', (student_id,))
-        cur.execute('DELETE FROM extraactivities_student WHERE student_person_person_id = %s', (student_id,))
-        cur.execute('DELETE FROM attendance WHERE student_person_person_id = %s', (student_id,))
-        cur.execute('DELETE FROM result WHERE student_person_person_id = %s', (student_id,))
-        cur.execute('DELETE FROM major_info WHERE student_person_person_id = %s', (student_id,))
-        cur.execute('DELETE FROM extraactivities_fees WHERE student_person_person_id = %s', (student_id,))
-        # Deletar da tabela student
-        cur.execute('DELETE FROM student WHERE person_person_id = %s', (student_id,))
-        
-        conn.commit()
-        return flask.jsonify({
-            'status': StatusCodes['success']
-        })
-        
+
+        response = csv_response(conn, '''
+            SELECT mi.student_person_person_id AS student_id, p.name, p.email, s.enrolment_date,
+                   mi.status, mi.fees, fa.values_acumulate AS paid_amount
+            FROM major_info mi
+            JOIN student s ON mi.student_person_person_id = s.person_person_id
+            JOIN person p ON s.person_person_id = p.person_id
+            JOIN fees_account fa ON mi.fees_account_fees_account_id = fa.fees_account_id
+            WHERE mi.major_major_id = %s
+            ORDER BY mi.student_person_person_id
+        ''', (major_id,), f'enrollments-major-{major_id}.csv')
+        # A ligação passa a pertencer ao stream, que a devolve quando termina
+        conn = None
+        return response
+
     except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'Error deleting student data: {error}')
         conn.rollback()
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
-            'errors': str(error)
+            'errors': str(error),
+            'results': None
         }), 500
-        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
 
-@app.route('/dbproj/student/financial-status/<int:student_id>', methods=['GET'])
+@app.route('/dbproj/export/attendance/<int:class_id>', methods=['GET'])
 @token_required
-def student_financial_status(student_id):
-    # Verificar se o usuário é staff ou o próprio estudante
-    if flask.g.role != 'staff' and str(flask.g.person_id) != str(student_id):
+def export_attendance(class_id):
+    # Verificar se o usuário é staff
+    if flask.g.role != 'staff':
         return flask.jsonify({
             'status': StatusCodes['unauthorized'],
-            'errors': 'Only staff or the student themselves can access this information',
+            'errors': 'Only staff members can export attendance',
             'results': None
         }), 403
 
+    # Filtro opcional por ano letivo (?academic_year=2024), que limita a leitura a uma partição
+    query = '''
+        SELECT a.student_person_person_id AS student_id, p.name, a.present, a.academic_year
+        FROM attendance a
+        JOIN person p ON a.student_person_person_id = p.person_id
+        WHERE a.class_class_id = %s
+    '''
+    params = [class_id]
+    academic_year = flask.request.args.get('academic_year')
+    if academic_year is not None:
+        if not academic_year.isdigit():
+            return flask.jsonify({
+                'status': StatusCodes['api_error'],
+                'errors': 'academic_year must be a year, e.g. 2024 for 2024/2025',
+                'results': None
+            }), 400
+        query += ' AND a.academic_year = %s'
+        params.append(int(academic_year))
+    query += ' ORDER BY a.academic_year, a.student_person_person_id'
+
     conn = db_connection()
-    cur = conn.cursor()
-    
+
     try:
-        # Obter informações financeiras do estudante
-        cur.execute('''
-            WITH student_majors AS (
-                SELECT 
-                    s.person_person_id,
-                    m.major_name,
-                    mi.fees as tuition_fee,
-                    fa.values_acumulate as paid_amount,
-                    mi.status
-                FROM student s
-                JOIN major_info mi ON s.person_person_id = mi.student_person_person_id
-                JOIN major m ON mi.major_major_id = m.major_id
-                JOIN fees_account fa ON mi.fees_account_fees_account_id = fa.fees_account_id
-                WHERE s.person_person_id = %s
-            ),
-            student_activities AS (
-                SELECT 
-                    s.person_person_id,
-                    ea.name as activity_name,
-                    ef.fees as activity_fee,
-                    fa.values_acumulate as paid_amount,
-                    ef.status
-                FROM student s
-                JOIN extraactivities_student eas ON s.person_person_id = eas.student_person_person_id
-                JOIN extraactivities ea ON eas.extraactivities_activity_id = ea.activity_id
-                LEFT JOIN extraactivities_fees ef ON s.person_person_id = ef.student_person_person_id
-                    AND eas.extraactivities_activity_id = ef.extraactivities_activity_id
-                LEFT JOIN fees_account fa ON ef.fees_account_fees_account_id = fa.fees_account_id
-                WHERE s.person_person_id = %s
-            )
-            SELECT 
-                COALESCE(
-                json_agg(
-                    json_build_object(
-                            'major_name', sm.major_name,
-                            'tuition_fee', sm.tuition_fee,
-                            'paid_amount', COALESCE(sm.paid_amount, 0),
-                            'pending_amount', sm.tuition_fee - COALESCE(sm.paid_amount, 0),
-                            'status', sm.status
-                        )
-                    ) FILTER (WHERE sm.major_name IS NOT NULL),
-                    '[]'
-                ) as majors,
-                COALESCE(
-                json_agg(
-                    json_build_object(
-                            'activity_name', sa.activity_name,
-                            'activity_fee', sa.activity_fee,
-                            'paid_amount', COALESCE(sa.paid_amount, 0),
-                            'pending_amount', sa.activity_fee - COALESCE(sa.paid_amount, 0),
-                            'status', sa.status
-                        )
-                    ) FILTER (WHERE sa.activity_name IS NOT NULL),
-                    '[]'
-                ) as activities
-            FROM student_majors sm
-            FULL OUTER JOIN student_activities sa ON sm.person_person_id = sa.person_person_id;
-        ''', (student_id, student_id))
-        
-        result = cur.fetchone()
-        
-        if result is None or (result[0] is None and result[1] is None):
+        if class_id not in reference_cache.get()['classes']:
             return flask.jsonify({
                 'status': StatusCodes['api_error'],
-                'errors': 'Student not found or not enrolled in any major/activity',
+                'errors': 'Class not found',
                 'results': None
             }), 404
-            
-        majors_data, activities_data = result
-        
-        # Processar informações dos majors
-        majors = []
-        total_majors_fees = 0
-        total_majors_paid = 0
-        
-        if majors_data:
-            for major in majors_data:
-                tuition_fee = float(major['tuition_fee']) if major['tuition_fee'] else 0
-                paid_amount = float(major['paid_amount']) if major['paid_amount'] else 0
-                pending_amount = float(major['pending_amount']) if major['pending_amount'] else 0
-                
-                majors.append({
-                    'name': major['major_name'],
-                    'tuition_fee': tuition_fee,
-                    'paid_amount': paid_amount,
-                    'pending_amount': pending_amount,
-                    'status': major['status']
-                })
-                
-                total_majors_fees += tuition_fee
-                total_majors_paid += paid_amount
-        
-        # Processar atividades extracurriculares
-        activities = []
-        total_activities_fees = 0
-        total_activities_paid = 0
-        
-        if activities_data:
-            for activity in activities_data:
-                if activity['activity_name'] is not None:
-                    activity_fee = float(activity['activity_fee']) if activity['activity_fee'] else 0
-                    paid_amount = float(activity['paid_amount']) if activity['paid_amount'] else 0
-                    pending_amount = float(activity['pending_amount']) if activity['pending_amount'] else 0
-                    
-                    activities.append({
-                        'name': activity['activity_name'],
-                        'activity_fee': activity_fee,
-                        'paid_amount': paid_amount,
-                        'pending_amount': pending_amount,
-                        'status': activity['status']
-                    })
-                    
-                    total_activities_fees += activity_fee
-                    total_activities_paid += paid_amount
-        
-        # Calcular totais gerais
-        total_fees = total_majors_fees + total_activities_fees
-        total_paid = total_majors_paid + total_activities_paid
-        total_pending = total_fees - total_paid
-        
-        return flask.jsonify({
-            'status': StatusCodes['success'],
-            'errors': None,
-            'results': {
-                'majors': majors,
-                'majors_summary': {
-                    'total_fees': total_majors_fees,
-                    'total_paid': total_majors_paid,
-                    'total_pending': total_majors_fees - total_majors_paid
-                },
-                'activities': activities,
-                'activities_summary': {
-                    'total_fees': total_activities_fees,
-                    'total_paid': total_activities_paid,
-                    'total_pending': total_activities_fees - total_activities_paid
-                },
-                'overall_summary': {
-                    'total_fees': total_fees,
-                    'total_paid': total_paid,
-                    'total_pending': total_pending
-                }
-            }
-        })
-        
+
+        response = csv_response(conn, query, params, f'attendance-class-{class_id}.csv')
+        # A ligação passa a pertencer ao stream, que a devolve quando termina
+        conn = None
+        return response
+
     except (Exception, psycopg2.DatabaseError) as error:
-        logger.error(f'Error getting student financial status: {error}')
+        conn.rollback()
         return flask.jsonify({
             'status': StatusCodes['internal_error'],
             'errors': str(error),
             'results': None
         }), 500
-        
     finally:
         if conn is not None:
-            conn.close()
+            release_connection(conn)
+
+@app.route('/dbproj/batch', methods=['POST'])
+@token_required
+def batch_requests():
+    data = flask.request.get_json()
+    requests = data.get('requests')
+    atomic = bool(data.get('atomic', False))
+
+    if not requests or not isinstance(requests, list):
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': 'requests must be a non-empty list',
+            'results': None
+        }), 400
+
+    if len(requests) > MAX_BATCH_REQUESTS:
+        return flask.jsonify({
+            'status': StatusCodes['api_error'],
+            'errors': f'At most {MAX_BATCH_REQUESTS} requests per batch',
+            'results': None
+        }), 400
+
+    conn = db_connection()
+    conn.batch = 'atomic' if atomic else 'independent'
+    flask.g.batch_connection = conn
+    adapter = app.url_map.bind('')
+    results = []
+    failed = False
+
+    # cursor sem prazo para os savepoints: o prazo é o do pedido do batch
+    control = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+
+    try:
+        # Os sub-pedidos correm pela ordem dada, com a autenticação e a ligação deste pedido
+        for item in requests:
+            if failed:
+                results.append({'status': None, 'skipped': True})
+                continue
+
+            if atomic:
+                control.execute('SAVEPOINT batch_item')
+                conn.item_rolled_back = False
+            result = dispatch_batch_item(adapter, item)
+            results.append(result)
+
+            # O erro pode vir só no envelope (HTTP 200 com status >= 400), ou o handler
+            # pode ter desfeito parte do seu trabalho e continuado
+            if atomic and (request_failed(result['status'], result['body']) or conn.item_rolled_back):
+                failed = True
+            elif atomic:
+                control.execute('RELEASE SAVEPOINT batch_item')
+            elif conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                # um handler que falhou sem rollback não pode bloquear os seguintes
+                conn.rollback()
+
+        conn.batch = None
+        if failed:
+            conn.rollback()
+        else:
+            conn.commit()
+
+        return flask.jsonify({
+            'status': StatusCodes['api_error'] if failed else StatusCodes['success'],
+            'errors': 'Batch rolled back: a request failed' if failed else None,
+            'results': results
+        }), 409 if failed else 200
 
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.batch = None
+        conn.rollback()
+        return flask.jsonify({
+            'status': StatusCodes['internal_error'],
+            'errors': str(error),
+            'results': results
+        }), 500
+    finally:
+        flask.g.batch_connection = None
+        conn.batch = None
+        conn.item_rolled_back = False
+        release_connection(conn)
+
+def dispatch_batch_item(adapter, item):
+    if not isinstance(item, dict) or not item.get('path'):
+        return {'status': 400, 'body': {'status': StatusCodes['api_error'], 'errors': 'path is required', 'results': None}}
+
+    method = str(item.get('method', 'GET')).upper()
+    path = item['path']
+    # o adapter só conhece o caminho; a query string segue para o sub-pedido
+    url = urllib.parse.urlsplit(path)
+    try:
+        endpoint, view_args = adapter.match(url.path, method)
+    except werkzeug.exceptions.HTTPException as error:
+        return {'status': error.code, 'body': {'status': StatusCodes['api_error'], 'errors': error.description, 'results': None}}
+
+    if endpoint in BATCH_EXCLUDED or route_class(endpoint) != 'transactional':
+        return {'status': 400, 'body': {'status': StatusCodes['api_error'],
+                                        'errors': f'{url.path} cannot be used in a batch', 'results': None}}
+
+    # a autenticação já foi feita pelo pedido do batch: chamar a função sem o token_required.
+    # Os hooks after_request não correm para os sub-pedidos, de propósito: a captura, o
+    # registo de escritas (track_writes) e o prazo são os do pedido do batch, que é o
+    # que um replay volta a enviar; os logs dos handlers continuam a ser escritos
+    view = app.view_functions[endpoint]
+    view = getattr(view, '__wrapped__', view)
+    with app.test_request_context(url.path, method=method, query_string=url.query, json=item.get('body')):
+        response = app.make_response(view(**view_args))
+    return {'status': response.status_code, 'body': response.get_json(silent=True)}
+
+
+@app.route('/dbproj/metrics', methods=['GET'])
+def metrics():
+    # contadores internos deste worker (admission control, bulkheads, encaminhamento de ligações, check-ins, cache, compressão, exportações, logging)
+    return flask.jsonify({
+        'status': StatusCodes['success'],
+        'errors': None,
+        'results': {
+            'admission': {name: controller.snapshot() for name, controller in admission_controllers.items()},
+            'bulkheads': bulkhead_snapshot(),
+            'db_routing': db_routing_snapshot(),
+            'checkins': checkin_buffer.snapshot(),
+            'reference_cache': reference_cache.status(),
+            'compression': compression_snapshot(),
+            'exports': export_snapshot(),
+            'log_dropped': log_dropped
+        }
+    })
 
 
 if __name__ == '__main__':
     # set up logging
-    logging.basicConfig(filename='log_file.log')
-    logger = logging.getLogger('logger')
-    logger.setLevel(logging.DEBUG)
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
-
-    # create formatter
-    formatter = logging.Formatter('%(asctime)s [%(levelname)s]:  %(message)s', '%H:%M:%S')
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
+    setup_logging('log_file.log')
 
     host = '127.0.0.1'
     port = 8080
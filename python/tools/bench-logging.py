@@ -0,0 +1,138 @@
+##
+## =============================================
+## ============== Bases de Dados ===============
+## ============== LEI  2024/2025 ===============
+## =============================================
+## ========= Logging overhead benchmark ========
+## =============================================
+##
+## Measures the time a request thread spends in logging calls with the
+## original synchronous setup (basicConfig file handler + StreamHandler)
+## and with the queue-based pipeline of demo-api.py.
+##
+## Usage:
+##   python bench-logging.py --threads 16 --requests 2000 --records 3
+##   python bench-logging.py --io-delay-us 200    # slow console / disk
+
+
+import argparse
+import importlib.util
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import flask
+
+
+def load_api():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'demo-api.py')
+    spec = importlib.util.spec_from_file_location('demo_api', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class SlowStream:
+    # simulates a slow disk or terminal: each write blocks (without holding the GIL)
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, data):
+        time.sleep(self.delay)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def setup_sync(api, filename, stream):
+    # the configuration used before the queue-based pipeline
+    logging.basicConfig(filename=filename, force=True)
+    logger = api.logger
+    logger.handlers = []
+    logger.propagate = True
+    logger.setLevel(logging.DEBUG)
+    ch = logging.StreamHandler(stream)
+    ch.setLevel(logging.DEBUG)
+    ch.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s]:  %(message)s', '%H:%M:%S'))
+    logger.addHandler(ch)
+    return lambda: None
+
+
+def setup_async(api, filename, stream):
+    logging.getLogger().handlers = []
+    api.setup_logging(filename, stream)
+    return api.stop_logging
+
+
+def run(api, threads, requests, records):
+    samples = []
+    lock = threading.Lock()
+
+    def client():
+        local = []
+        for _ in range(requests):
+            with api.app.test_request_context('/dbproj/top3', method='GET'):
+                flask.g.person_id = 1
+                flask.g.role = 'staff'
+                start = time.perf_counter()
+                for i in range(records):
+                    api.logger.info(f'GET /dbproj/top3 - step {i}')
+                local.append(time.perf_counter() - start)
+        with lock:
+            samples.extend(local)
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return samples, time.perf_counter() - start
+
+
+def summary(samples):
+    samples = sorted(samples)
+    pick = lambda p: samples[max(1, math.ceil(p / 100.0 * len(samples))) - 1] * 1e6
+    return {
+        'mean_us': sum(samples) / len(samples) * 1e6,
+        'p50_us': pick(50),
+        'p99_us': pick(99),
+        'max_us': samples[-1] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-request logging overhead, synchronous vs queue-based')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per thread')
+    parser.add_argument('--records', type=int, default=3, help='log records per request')
+    parser.add_argument('--io-delay-us', type=float, default=0.0, help='extra latency of each console write')
+    args = parser.parse_args()
+
+    api = load_api()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        stream = SlowStream(devnull, args.io_delay_us / 1e6) if args.io_delay_us else devnull
+        for name, setup in (('sync', setup_sync), ('queue', setup_async)):
+            teardown = setup(api, os.path.join(tmp, f'{name}.log'), stream)
+            samples, elapsed = run(api, args.threads, args.requests, args.records)
+            teardown()
+            results[name] = dict(summary(samples), elapsed_s=elapsed, dropped=api.log_dropped)
+
+    print(f'{args.threads} threads x {args.requests} requests x {args.records} records, '
+          f'console write delay {args.io_delay_us} us')
+    print(f'{"setup":<8}{"mean us":>10}{"p50 us":>10}{"p99 us":>10}{"max us":>12}{"wall s":>10}{"dropped":>10}')
+    for name, stats in results.items():
+        print(f'{name:<8}{stats["mean_us"]:>10.1f}{stats["p50_us"]:>10.1f}{stats["p99_us"]:>10.1f}'
+              f'{stats["max_us"]:>12.1f}{stats["elapsed_s"]:>10.2f}{stats["dropped"]:>10}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
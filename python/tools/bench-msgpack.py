@@ -0,0 +1,137 @@
+##
+## =============================================
+## ============== Bases de Dados ===============
+## ============== LEI  2024/2025 ===============
+## =============================================
+## ===== JSON vs MessagePack wire benchmark ====
+## =============================================
+##
+## Encodes synthetic results shaped like the large responses of the API
+## (persons list, top3 grade lists, district ranking) with the flask.jsonify
+## path and with the MessagePack path of demo-api.py, and decodes them the
+## way a client would. Reports time per response and body size.
+##
+## Usage:
+##   python bench-msgpack.py --rows 10000 --iterations 20
+##
+## Requires the msgpack package.
+
+
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+
+import flask
+import msgpack
+
+
+def load_api():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'demo-api.py')
+    spec = importlib.util.spec_from_file_location('demo_api', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+##########################################################
+## PAYLOADS
+##########################################################
+
+def persons(rng, rows):
+    return [{
+        'person_id': i,
+        'name': f'Person {i}',
+        'age': rng.randint(18, 70),
+        'gender': rng.choice('FM'),
+        'nif': 100000000 + i,
+        'email': f'person{i}@uc.pt',
+        'address': f'Rua {rng.randint(1, 999)}, Coimbra',
+        'phone': 910000000 + i
+    } for i in range(rows)]
+
+
+def top3(rng, rows):
+    start = datetime.datetime(2020, 1, 1)
+    return [{
+        'student_name': f'Student {i}',
+        'average_grade': round(rng.uniform(10, 20), 2),
+        'grades': [{
+            'course_edition_id': rng.randint(1, 500),
+            'course_edition_name': f'Course {rng.randint(1, 500)}',
+            'grade': round(rng.uniform(0, 20), 1),
+            'date': start + datetime.timedelta(days=rng.randint(0, 1800), hours=rng.randint(8, 18))
+        } for _ in range(20)],
+        'activities': [rng.randint(1, 50) for _ in range(3)]
+    } for i in range(max(1, rows // 20))]
+
+
+def districts(rng, rows):
+    return [{
+        'district': f'District {i}',
+        'student_id': i,
+        'average_grade': round(rng.uniform(10, 20), 4)
+    } for i in range(rows)]
+
+
+PAYLOADS = {'persons': persons, 'top3': top3, 'top_by_district': districts}
+
+
+##########################################################
+## MEASUREMENT
+##########################################################
+
+def measure(api, results, accept, decode, iterations):
+    envelope = {'status': api.StatusCodes['success'], 'errors': None, 'results': results}
+    encode_s = decode_s = 0.0
+    size = 0
+    with api.app.test_request_context('/', headers={'Accept': accept}):
+        for _ in range(iterations):
+            start = time.perf_counter()
+            body = flask.jsonify(envelope).get_data()
+            encode_s += time.perf_counter() - start
+
+            start = time.perf_counter()
+            decode(body)
+            decode_s += time.perf_counter() - start
+            size = len(body)
+    return {
+        'encode_ms': encode_s / iterations * 1000.0,
+        'decode_ms': decode_s / iterations * 1000.0,
+        'bytes': size
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='flask.jsonify vs MessagePack encode/decode cost')
+    parser.add_argument('--rows', type=int, default=10000, help='rows per result set')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    api = load_api()
+    if api.msgpack is None:
+        print('msgpack is not installed')
+        return 1
+
+    rng = random.Random(args.seed)
+    print(f'{args.rows} rows, {args.iterations} iterations')
+    print(f'{"payload":<18}{"format":<10}{"encode ms":>12}{"decode ms":>12}{"bytes":>12}')
+    for name, build in PAYLOADS.items():
+        results = build(rng, args.rows)
+        formats = (
+            ('json', 'application/json', json.loads),
+            ('msgpack', 'application/msgpack', api.msgpack_loads),
+        )
+        for label, accept, decode in formats:
+            stats = measure(api, results, accept, decode, args.iterations)
+            print(f'{name:<18}{label:<10}{stats["encode_ms"]:>12.2f}{stats["decode_ms"]:>12.2f}{stats["bytes"]:>12}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
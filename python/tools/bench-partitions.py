@@ -0,0 +1,190 @@
+##
+## =============================================
+## ============== Bases de Dados ===============
+## ============== LEI  2024/2025 ===============
+## =============================================
+## ===== Academic-year partitioning benchmark ==
+## =============================================
+##
+## Builds a synthetic multi-year dataset of exams and results twice, once in
+## a plain table filtered by EXTRACT(YEAR FROM exam date) (the top3 / report
+## queries before partitioning) and once in a table partitioned by
+## academic_year like sql/partitions.sql, and times the current-year
+## aggregate on both. Everything is created as temporary tables in one
+## transaction that is rolled back, so the database is left unchanged.
+##
+## Usage:
+##   python bench-partitions.py --years 8 --results-per-year 500000 --iterations 20
+
+
+import argparse
+import importlib.util
+import math
+import os
+import sys
+import time
+
+import psycopg2
+
+
+def load_api():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'demo-api.py')
+    spec = importlib.util.spec_from_file_location('demo_api', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+##########################################################
+## DATASET
+##########################################################
+
+def build(cur, years, results_per_year, exams_per_year, students):
+    first_year = current_year(cur) - years + 1
+
+    cur.execute('''
+        CREATE TEMP TABLE bench_exam (exam_id BIGINT PRIMARY KEY, data TIMESTAMP NOT NULL)
+    ''')
+    # exams spread over the teaching months of each year (September to June)
+    cur.execute('''
+        INSERT INTO bench_exam
+        SELECT (y - %(first)s) * %(exams)s + e,
+               make_timestamp(y, 9, 1, 0, 0, 0) + (e %% 300) * INTERVAL '1 day'
+        FROM generate_series(%(first)s, %(first)s + %(years)s - 1) AS y,
+             generate_series(1, %(exams)s) AS e
+    ''', {'first': first_year, 'years': years, 'exams': exams_per_year})
+
+    cur.execute('''
+        CREATE TEMP TABLE bench_result_flat (
+            result_id BIGINT, score FLOAT(8) NOT NULL, exam_exam_id BIGINT, student_person_person_id BIGINT
+        )
+    ''')
+    cur.execute('''
+        CREATE TEMP TABLE bench_result_part (
+            result_id BIGINT, score FLOAT(8) NOT NULL, exam_exam_id BIGINT, student_person_person_id BIGINT,
+            academic_year INTEGER NOT NULL
+        ) PARTITION BY RANGE (academic_year)
+    ''')
+    for year in range(first_year, first_year + years):
+        cur.execute(f'''
+            CREATE TEMP TABLE bench_result_y{year} PARTITION OF bench_result_part
+            FOR VALUES FROM ({year}) TO ({year + 1})
+        ''')
+
+    cur.execute('''
+        INSERT INTO bench_result_flat
+        SELECT (y - %(first)s) * %(rows)s + n, (n * 7919) %% 21, (y - %(first)s) * %(exams)s + 1 + n %% %(exams)s,
+               1 + (n * 104729) %% %(students)s
+        FROM generate_series(%(first)s, %(first)s + %(years)s - 1) AS y,
+             generate_series(1::BIGINT, %(rows)s) AS n
+    ''', {'first': first_year, 'years': years, 'exams': exams_per_year, 'rows': results_per_year,
+          'students': students})
+    cur.execute('''
+        INSERT INTO bench_result_part
+        SELECT r.*, EXTRACT(YEAR FROM ex.data - INTERVAL '8 months')::INTEGER
+        FROM bench_result_flat r
+        JOIN bench_exam ex ON r.exam_exam_id = ex.exam_id
+    ''')
+    # same indexes as the real tables: result has none on exam_exam_id
+    cur.execute('CREATE INDEX ON bench_result_flat (student_person_person_id)')
+    cur.execute('CREATE INDEX ON bench_result_part (student_person_person_id)')
+    cur.execute('ANALYZE bench_exam')
+    cur.execute('ANALYZE bench_result_flat')
+    cur.execute('ANALYZE bench_result_part')
+    return first_year
+
+
+def current_year(cur):
+    cur.execute("SELECT EXTRACT(YEAR FROM CURRENT_DATE - INTERVAL '8 months')::INTEGER")
+    return cur.fetchone()[0]
+
+
+##########################################################
+## QUERIES
+##########################################################
+
+# the top3 aggregate before partitioning: every result is joined with its
+# exam before the year filter can be applied
+FLAT = '''
+    SELECT r.student_person_person_id, AVG(r.score)
+    FROM bench_result_flat r
+    JOIN bench_exam ex ON r.exam_exam_id = ex.exam_id
+    WHERE EXTRACT(YEAR FROM ex.data) = %s
+    GROUP BY r.student_person_person_id
+    ORDER BY 2 DESC
+    LIMIT 3
+'''
+
+# the same aggregate on the academic-year key: only one partition is read
+PARTITIONED = '''
+    SELECT r.student_person_person_id, AVG(r.score)
+    FROM bench_result_part r
+    JOIN bench_exam ex ON r.exam_exam_id = ex.exam_id
+    WHERE r.academic_year = %s
+    GROUP BY r.student_person_person_id
+    ORDER BY 2 DESC
+    LIMIT 3
+'''
+
+
+def measure(cur, query, year, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        cur.execute(query, (year,))
+        cur.fetchall()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    pick = lambda p: samples[max(1, math.ceil(p / 100.0 * len(samples))) - 1] * 1000.0
+    return {'mean_ms': sum(samples) / len(samples) * 1000.0, 'p50_ms': pick(50), 'p95_ms': pick(95)}
+
+
+def rows_read(cur, query, year):
+    cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + query, (year,))
+    plan = cur.fetchone()[0][0]['Plan']
+
+    def walk(node):
+        rows = 0
+        if node.get('Relation Name', '').startswith('bench_result'):
+            rows = (node['Actual Rows'] + node.get('Rows Removed by Filter', 0)) * node['Actual Loops']
+        return rows + sum(walk(child) for child in node.get('Plans', []))
+
+    return walk(plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Current-year aggregate on a plain vs an academic-year partitioned table')
+    parser.add_argument('--years', type=int, default=8, help='academic years of history')
+    parser.add_argument('--results-per-year', type=int, default=200000)
+    parser.add_argument('--exams-per-year', type=int, default=200)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    api = load_api()
+    conn = psycopg2.connect(**api.DB_PRIMARY)
+    cur = conn.cursor()
+
+    start = time.perf_counter()
+    build(cur, args.years, args.results_per_year, args.exams_per_year, args.students)
+    print(f'{args.years} years x {args.results_per_year} results loaded in {time.perf_counter() - start:.1f} s')
+
+    # the old filter compares the calendar year of the exam with the first
+    # year of the academic year, so both queries are given the same number
+    year = current_year(cur)
+    results = {}
+    for name, query in (('flat', FLAT), ('partitioned', PARTITIONED)):
+        measure(cur, query, year, 1)
+        results[name] = dict(measure(cur, query, year, args.iterations), rows_read=rows_read(cur, query, year))
+    conn.rollback()
+    conn.close()
+
+    print(f'top3 aggregate of academic year {year}, {args.iterations} iterations')
+    print(f'{"table":<14}{"mean ms":>10}{"p50 ms":>10}{"p95 ms":>10}{"rows read":>12}')
+    for name, stats in results.items():
+        print(f'{name:<14}{stats["mean_ms"]:>10.1f}{stats["p50_ms"]:>10.1f}{stats["p95_ms"]:>10.1f}{stats["rows_read"]:>12}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
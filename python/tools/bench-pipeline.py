@@ -0,0 +1,156 @@
+##
+## =============================================
+## ============== Bases de Dados ===============
+## ============== LEI  2024/2025 ===============
+## =============================================
+## ====== Registration round-trip benchmark ====
+## =============================================
+##
+## Compares the statement-by-statement registration flow with the batched
+## flow used by the API (fetch_pipeline / execute_pipeline) over a simulated
+## high-latency link. A local TCP proxy delays every packet by half the RTT
+## in each direction. Every iteration is rolled back, so the database is left
+## unchanged.
+##
+## Usage:
+##   python bench-pipeline.py --person-id 6 --major-id 2 --rtt-ms 20 --iterations 100
+##
+## --person-id must be a person that is not yet a student.
+
+
+import argparse
+import asyncio
+import datetime
+import importlib.util
+import math
+import os
+import sys
+import threading
+import time
+
+import psycopg2
+
+
+def load_api():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'demo-api.py')
+    spec = importlib.util.spec_from_file_location('demo_api', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+##########################################################
+## LATENCY PROXY
+##########################################################
+
+async def pipe(reader, writer, delay):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+def start_proxy(listen_port, target_host, target_port, rtt):
+    loop = asyncio.new_event_loop()
+    delay = rtt / 2.0
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(target_host, target_port)
+        await asyncio.gather(pipe(client_reader, server_writer, delay), pipe(server_reader, client_writer, delay))
+
+    async def serve():
+        return await asyncio.start_server(handle, '127.0.0.1', listen_port)
+
+    loop.run_until_complete(serve())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+
+##########################################################
+## FLOWS
+##########################################################
+
+def sequential(cur, person_id, major_id):
+    # the register_student flow before batching: one round trip per statement
+    cur.execute('SELECT person_id FROM person WHERE person_id = %s', (person_id,))
+    assert cur.fetchone() is not None, 'person not found'
+    cur.execute('SELECT person_person_id FROM student WHERE person_person_id = %s', (person_id,))
+    assert cur.fetchone() is None, 'person is already a student'
+    cur.execute('INSERT INTO student (person_person_id, enrolment_date, mean) VALUES (%s, %s, %s)',
+                (person_id, datetime.date.today(), 0.0))
+    cur.execute('INSERT INTO fees_account (values_acumulate) VALUES (0) RETURNING fees_account_id')
+    fees_account_id = cur.fetchone()[0]
+    cur.execute('''
+        INSERT INTO major_info (student_person_person_id, major_major_id, fees, status, fees_account_fees_account_id)
+        VALUES (%s, %s, %s, 'Active', %s)
+    ''', (person_id, major_id, 5000.00, fees_account_id))
+
+
+def pipelined(api, cur, person_id, major_id):
+    person_exists, already_student = api.fetch_pipeline(cur, [
+        ('SELECT EXISTS (SELECT 1 FROM person WHERE person_id = %s)', (person_id,)),
+        ('SELECT EXISTS (SELECT 1 FROM student WHERE person_person_id = %s)', (person_id,))
+    ])
+    assert person_exists and not already_student
+    api.execute_pipeline(cur, [
+        ('INSERT INTO student (person_person_id, enrolment_date, mean) VALUES (%s, %s, %s)',
+         (person_id, datetime.date.today(), 0.0)),
+        ('''
+            WITH account AS (
+                INSERT INTO fees_account (values_acumulate) VALUES (0) RETURNING fees_account_id
+            )
+            INSERT INTO major_info (student_person_person_id, major_major_id, fees, status, fees_account_fees_account_id)
+            SELECT %s, %s, %s, 'Active', fees_account_id FROM account
+        ''', (person_id, major_id, 5000.00))
+    ])
+
+
+def measure(conn, flow, iterations):
+    samples = []
+    for _ in range(iterations):
+        cur = conn.cursor()
+        start = time.perf_counter()
+        flow(cur)
+        samples.append(time.perf_counter() - start)
+        conn.rollback()
+    samples.sort()
+    pick = lambda p: samples[max(1, math.ceil(p / 100.0 * len(samples))) - 1] * 1000.0
+    return {'mean_ms': sum(samples) / len(samples) * 1000.0, 'p50_ms': pick(50), 'p95_ms': pick(95)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Statement-by-statement vs batched registration over a slow link')
+    parser.add_argument('--person-id', type=int, required=True, help='a person that is not a student yet')
+    parser.add_argument('--major-id', type=int, default=1)
+    parser.add_argument('--rtt-ms', type=float, default=20.0, help='simulated round-trip time')
+    parser.add_argument('--proxy-port', type=int, default=6543)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    api = load_api()
+    params = dict(api.DB_PRIMARY)
+    start_proxy(args.proxy_port, params['host'], int(params['port']), args.rtt_ms / 1000.0)
+    params.update(host='127.0.0.1', port=str(args.proxy_port))
+    conn = psycopg2.connect(**params)
+
+    results = {
+        'sequential': measure(conn, lambda cur: sequential(cur, args.person_id, args.major_id), args.iterations),
+        'pipelined': measure(conn, lambda cur: pipelined(api, cur, args.person_id, args.major_id), args.iterations),
+    }
+    conn.close()
+
+    print(f'register_student with major, RTT {args.rtt_ms} ms, {args.iterations} iterations (commit excluded)')
+    print(f'{"flow":<12}{"mean ms":>10}{"p50 ms":>10}{"p95 ms":>10}')
+    for name, stats in results.items():
+        print(f'{name:<12}{stats["mean_ms"]:>10.1f}{stats["p50_ms"]:>10.1f}{stats["p95_ms"]:>10.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
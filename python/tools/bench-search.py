@@ -0,0 +1,158 @@
+##
+## =============================================
+## ============== Bases de Dados ===============
+## ============== LEI  2024/2025 ===============
+## =============================================
+## ======== Person search latency benchmark ====
+## =============================================
+##
+## Times the name search of GET /dbproj/persons/search (the statement built
+## by name_search) on a synthetic set of persons with the GIN trigram index of
+## sql/search.sql, for type-ahead texts of increasing length, and checks the
+## p95 against the 50 ms target. Texts shorter than SEARCH_MIN_QUERY_LENGTH
+## are rejected by the API and are only timed to show why. The persons are
+## a temporary table that shadows `person` in one transaction that is rolled
+## back, so the database is left unchanged. Needs the pg_trgm extension.
+##
+## Usage:
+##   python bench-search.py --persons 200000 --iterations 200
+
+
+import argparse
+import importlib.util
+import math
+import os
+import random
+import sys
+import time
+
+import psycopg2
+
+
+TARGET_MS = 50.0
+
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Diogo', 'Eduarda', 'Filipe', 'Gabriela', 'Hugo', 'Inês', 'João',
+               'Leonor', 'Miguel', 'Nuno', 'Olívia', 'Pedro', 'Rita', 'Sofia', 'Tiago', 'Vasco', 'Zé']
+LAST_NAMES = ['Almeida', 'Barbosa', 'Carvalho', 'Costa', 'Ferreira', 'Gomes', 'Lopes', 'Marques', 'Martins',
+              'Mendes', 'Oliveira', 'Pereira', 'Pinto', 'Ribeiro', 'Rodrigues', 'Santos', 'Silva', 'Sousa',
+              'Teixeira', 'Vieira']
+
+
+def load_api():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'demo-api.py')
+    spec = importlib.util.spec_from_file_location('demo_api', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+##########################################################
+## DATASET
+##########################################################
+
+def build(cur, persons):
+    # a temporary table comes first in the search path, so the API's
+    # statement reads it instead of the real person table
+    cur.execute('''
+        CREATE TEMP TABLE person (
+            person_id BIGINT PRIMARY KEY, name TEXT NOT NULL, email TEXT, nif BIGINT NOT NULL
+        )
+    ''')
+    cur.execute('''
+        INSERT INTO person
+        SELECT n,
+               f[1 + n %% array_length(f, 1)] || ' ' || l[1 + (n / 7) %% array_length(l, 1)] || ' '
+                   || l[1 + (n * 7919) %% array_length(l, 1)] || ' ' || n,
+               'person' || n || '@uc.pt',
+               100000000 + n
+        FROM generate_series(1::BIGINT, %s) AS n,
+             (SELECT %s::text[] AS f, %s::text[] AS l) AS names
+    ''', (persons, FIRST_NAMES, LAST_NAMES))
+    cur.execute('CREATE INDEX ON person USING gin (name gin_trgm_ops)')
+    cur.execute('ANALYZE person')
+
+
+def texts(rng, length, count):
+    # what a user has typed so far: the start of a name, sometimes with a typo
+    result = []
+    for _ in range(count):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        text = name[:length]
+        if length >= 5 and rng.random() < 0.2:
+            position = rng.randrange(1, length)
+            text = text[:position] + rng.choice('aeiou') + text[position + 1:]
+        result.append(text)
+    return result
+
+
+##########################################################
+## MEASUREMENT
+##########################################################
+
+def measure(api, cur, queries, limit):
+    samples = []
+    for query in queries:
+        stmt, params = api.name_search(query, limit + 1, 0)
+        start = time.perf_counter()
+        cur.execute(stmt, params)
+        cur.fetchall()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    pick = lambda p: samples[max(1, math.ceil(p / 100.0 * len(samples))) - 1] * 1000.0
+    return {'mean_ms': sum(samples) / len(samples) * 1000.0, 'p50_ms': pick(50), 'p95_ms': pick(95), 'p99_ms': pick(99)}
+
+
+def uses_index(api, cur, query, limit):
+    stmt, params = api.name_search(query, limit + 1, 0)
+    cur.execute('EXPLAIN (FORMAT JSON) ' + stmt, params)
+
+    def walk(node):
+        return node['Node Type'].startswith('Bitmap') or any(walk(child) for child in node.get('Plans', []))
+
+    return walk(cur.fetchone()[0][0]['Plan'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency of the person name search by length of the typed text')
+    parser.add_argument('--persons', type=int, default=200000)
+    parser.add_argument('--iterations', type=int, default=200, help='searches per text length')
+    parser.add_argument('--lengths', default='1,2,3,5,8', help='comma-separated text lengths')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    api = load_api()
+    conn = psycopg2.connect(**api.DB_PRIMARY)
+    cur = conn.cursor()
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+    if not cur.fetchone()[0]:
+        print('pg_trgm is not installed, run sql/search.sql first', file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    build(cur, args.persons)
+    print(f'{args.persons} persons loaded in {time.perf_counter() - start:.1f} s')
+
+    rng = random.Random(args.seed)
+    limit = api.SEARCH_PAGE_SIZE
+    results = {}
+    for length in (int(value) for value in args.lengths.split(',')):
+        queries = texts(rng, length, args.iterations)
+        measure(api, cur, queries[:5], limit)
+        results[length] = dict(measure(api, cur, queries, limit), index=uses_index(api, cur, queries[0], limit))
+    conn.rollback()
+    conn.close()
+
+    print(f'name search, page of {limit}, {args.iterations} searches per length, target p95 < {TARGET_MS:.0f} ms')
+    print(f'{"length":<8}{"mean ms":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"index":>8}  result')
+    for length, stats in results.items():
+        if length < api.SEARCH_MIN_QUERY_LENGTH:
+            verdict = 'rejected by the API'
+        else:
+            verdict = 'ok' if stats['p95_ms'] < TARGET_MS else 'over target'
+        print(f'{length:<8}{stats["mean_ms"]:>10.1f}{stats["p50_ms"]:>10.1f}{stats["p95_ms"]:>10.1f}'
+              f'{stats["p99_ms"]:>10.1f}{"yes" if stats["index"] else "no":>8}  {verdict}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+##
+## =============================================
+## ============== Bases de Dados ===============
+## ============== LEI  2024/2025 ===============
+## =============================================
+## ========= Shared helpers of the tools =======
+## =============================================
+##
+## HTTP client, login and reporting helpers used by load-test.py and
+## replay.py. The tools are run as scripts from this directory, so they
+## import this module as `common`.
+
+
+import argparse
+import json
+import math
+import urllib.error
+import urllib.request
+
+
+##########################################################
+## HTTP CLIENT
+##########################################################
+
+def http_request(base_url, method, path, token=None, body=None, timeout=30):
+    data = None
+    headers = {}
+    if body is not None:
+        data = json.dumps(body).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    if token is not None:
+        headers['Authorization'] = f'Bearer {token}'
+
+    req = urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def login(base_url, email, password):
+    status, payload = http_request(base_url, 'PUT', '/dbproj/user', body={'email': email, 'password': password})
+    response = json.loads(payload)
+    if status != 200 or response.get('status') != 200:
+        raise RuntimeError(f'login failed for {email}: {response.get("errors")}')
+    return response['results']
+
+
+def parse_credentials(value):
+    if ':' not in value:
+        raise argparse.ArgumentTypeError('credentials must be given as email:password')
+    email, password = value.split(':', 1)
+    return email, password
+
+
+##########################################################
+## REPORTING
+##########################################################
+
+def percentile(sorted_values, p):
+    # nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
@@ -0,0 +1,321 @@
+##
+## =============================================
+## ============== Bases de Dados ===============
+## ============== LEI  2024/2025 ===============
+## =============================================
+## ============== Load-test driver =============
+## =============================================
+##
+## Replays a weighted mix of the API routes against a running instance
+## and reports throughput and latency percentiles per route.
+##
+## Usage:
+##   python load-test.py --base-url http://127.0.0.1:8080 \
+##       --student s1@uc.pt:pass --instructor i1@uc.pt:pass --staff st1@uc.pt:pass \
+##       --processes 8 --duration 60 --output results.json
+##
+## The result file is plain JSON with sorted keys so that two runs (e.g.
+## before and after a change) can be compared with `diff`.
+
+
+import argparse
+import collections
+import json
+import multiprocessing
+import random
+import sys
+import time
+import urllib.parse
+
+from common import http_request, login, parse_credentials, percentile
+
+
+##########################################################
+## ROUTE MIX
+##########################################################
+
+# Each entry describes one route of the API. `role` selects which token is
+# sent (None means no Authorization header), `path` and `body` are formatted
+# with the ids given on the command line, and `weight` is the relative
+# frequency of the route in the mix. Out of 145: 62 (43%) student reads,
+# check-ins and the person list, 43 (30%) logins, enrollments and grades,
+# 35 (24%) staff reports and search, and 5 (3%) batches and CSV exports,
+# which are rare but hold their connection much longer.
+ROUTES = [
+    {'name': 'login',                'method': 'PUT',    'path': '/dbproj/user',                                'role': None,         'weight': 10},
+    {'name': 'get_persons',          'method': 'GET',    'path': '/get_persons/',                               'role': None,         'weight': 2},
+    {'name': 'enroll_degree',        'method': 'POST',   'path': '/dbproj/enroll_degree/{major_id}',            'role': 'staff',      'weight': 5},
+    {'name': 'enroll_activity',      'method': 'POST',   'path': '/dbproj/enroll_activity/{activity_id}',       'role': 'student',    'weight': 5},
+    {'name': 'enroll_course_edition','method': 'POST',   'path': '/dbproj/enroll_course_edition/{edition_id}',  'role': 'student',    'weight': 15},
+    {'name': 'submit_grades',        'method': 'POST',   'path': '/dbproj/submit_grades/{edition_id}',          'role': 'instructor', 'weight': 8},
+    {'name': 'student_details',      'method': 'GET',    'path': '/dbproj/student_details/{student_id}',        'role': 'student',    'weight': 15},
+    {'name': 'financial_status',     'method': 'GET',    'path': '/dbproj/student/financial-status/{student_id}','role': 'student',   'weight': 10},
+    {'name': 'dashboard',            'method': 'GET',    'path': '/dbproj/student/dashboard/{student_id}',      'role': 'student',    'weight': 15},
+    {'name': 'check_in',             'method': 'POST',   'path': '/dbproj/attendance/{class_id}/check_in',     'role': 'student',    'weight': 20},
+    {'name': 'batch',                'method': 'POST',   'path': '/dbproj/batch',                               'role': 'student',    'weight': 3},
+    {'name': 'search',               'method': 'GET',    'path': '/dbproj/persons/search?q={search}',           'role': 'staff',      'weight': 5},
+    {'name': 'export_grades',        'method': 'GET',    'path': '/dbproj/export/grades/{edition_id}',          'role': 'staff',      'weight': 1},
+    {'name': 'export_attendance',    'method': 'GET',    'path': '/dbproj/export/attendance/{class_id}',        'role': 'staff',      'weight': 1},
+    {'name': 'degree_details',       'method': 'GET',    'path': '/dbproj/degree_details/{course_id}',          'role': 'staff',      'weight': 8},
+    {'name': 'top3',                 'method': 'GET',    'path': '/dbproj/top3',                                'role': 'staff',      'weight': 8},
+    {'name': 'top_by_district',      'method': 'GET',    'path': '/dbproj/top_by_district/',                    'role': 'staff',      'weight': 7},
+    {'name': 'report',               'method': 'GET',    'path': '/dbproj/report',                              'role': 'staff',      'weight': 7},
+]
+
+
+# Enrollments succeed only once per id, so each call takes a fresh one from
+# a pool given on the command line (split between the processes); otherwise
+# every call after the first measures the 'already enrolled' error path.
+# Degree enrollments are undone right away (not timed), so their ids are
+# reused; an exhausted pool drops its route from that process's mix.
+POOL_KEYS = {
+    'enroll_degree': 'student_id',
+    'enroll_activity': 'activity_id',
+    'enroll_course_edition': 'edition_id',
+}
+
+
+def route_body(route, ids, credentials):
+    name = route['name']
+    if name == 'login':
+        email, password = credentials['student']
+        return {'email': email, 'password': password}
+    if name == 'enroll_degree':
+        return {'student_id': ids['student_id']}
+    if name == 'enroll_course_edition':
+        return {'classes': ids['classes']}
+    if name == 'submit_grades':
+        return {'period': 'load-test', 'grades': [[ids['student_id'], random.randint(0, 20)]]}
+    if name == 'batch':
+        # all-or-nothing, so a failed sub-request turns the whole batch into an error
+        return {'atomic': True, 'requests': [
+            {'method': 'GET', 'path': f'/dbproj/student_details/{ids["student_id"]}'},
+            {'method': 'GET', 'path': f'/dbproj/student/financial-status/{ids["student_id"]}'},
+        ]}
+    if route['method'] in ('POST', 'PUT'):
+        return {}
+    return None
+
+
+##########################################################
+## HTTP CLIENT
+##########################################################
+
+def outcome(status, payload):
+    # most handlers answer errors with HTTP 200 and the code in the envelope;
+    # CSV exports have no envelope
+    try:
+        response = json.loads(payload)
+    except ValueError:
+        return str(status), status >= 400
+    envelope = response.get('status') if isinstance(response, dict) else None
+    if status < 400 and isinstance(envelope, int) and envelope >= 400:
+        return f'{status} (status {envelope})', True
+    return str(status), status >= 400
+
+
+##########################################################
+## WORKERS
+##########################################################
+
+def worker(args):
+    worker_id, config = args
+    rng = random.Random(config['seed'] + worker_id)
+    random.seed(config['seed'] + worker_id)
+
+    routes = config['routes']
+    weights = [r['weight'] for r in routes]
+    deadline = time.monotonic() + config['duration']
+    remaining = config['requests']
+
+    latencies = {r['name']: [] for r in routes}
+    statuses = {r['name']: {} for r in routes}
+    failures = {r['name']: 0 for r in routes}
+    pools = {name: collections.deque(values[worker_id::config['processes']])
+             for name, values in config['pools'].items()}
+    exhausted = []
+
+    while routes and time.monotonic() < deadline and (remaining is None or remaining > 0):
+        route = rng.choices(routes, weights=weights)[0]
+        name = route['name']
+        ids = config['ids']
+        if name in pools:
+            if not pools[name]:
+                exhausted.append(name)
+                routes = [r for r in routes if r['name'] != name]
+                weights = [r['weight'] for r in routes]
+                continue
+            ids = dict(ids, **{POOL_KEYS[name]: pools[name].popleft()})
+
+        token = config['tokens'].get(route['role']) if route['role'] else None
+        path = route['path'].format(**ids)
+        body = route_body(route, ids, config['credentials'])
+
+        start = time.perf_counter()
+        try:
+            status, payload = http_request(config['base_url'], route['method'], path, token, body, config['timeout'])
+            key, failed = outcome(status, payload)
+        except Exception:
+            key, failed = 'error', True
+        elapsed = time.perf_counter() - start
+
+        latencies[name].append(elapsed)
+        statuses[name][key] = statuses[name].get(key, 0) + 1
+        if failed:
+            failures[name] += 1
+        elif name == 'enroll_degree':
+            try:
+                http_request(config['base_url'], 'POST', '/dbproj/unenroll_degree', config['tokens']['staff'],
+                             {'student_id': ids['student_id']}, config['timeout'])
+                pools[name].append(ids['student_id'])
+            except Exception:
+                pass
+        if remaining is not None:
+            remaining -= 1
+
+    return {'latencies': latencies, 'statuses': statuses, 'failures': failures, 'exhausted': exhausted}
+
+
+##########################################################
+## REPORTING
+##########################################################
+
+def summarize(samples, elapsed):
+    count = len(samples)
+    samples = sorted(samples)
+    to_ms = lambda v: round(v * 1000.0, 3) if v is not None else None
+    return {
+        'count': count,
+        'throughput_rps': round(count / elapsed, 3) if elapsed > 0 else 0.0,
+        'p50_ms': to_ms(percentile(samples, 50)),
+        'p95_ms': to_ms(percentile(samples, 95)),
+        'p99_ms': to_ms(percentile(samples, 99)),
+        'max_ms': to_ms(samples[-1] if samples else None),
+        'mean_ms': to_ms(sum(samples) / count if count else None),
+    }
+
+
+def merge(results, routes):
+    latencies = {r['name']: [] for r in routes}
+    statuses = {r['name']: {} for r in routes}
+    failures = {r['name']: 0 for r in routes}
+    exhausted = {}
+    for result in results:
+        for name in result['exhausted']:
+            exhausted[name] = exhausted.get(name, 0) + 1
+        for name, values in result['latencies'].items():
+            latencies[name].extend(values)
+        for name, counts in result['statuses'].items():
+            for status, count in counts.items():
+                statuses[name][status] = statuses[name].get(status, 0) + count
+        for name, count in result['failures'].items():
+            failures[name] += count
+    return latencies, statuses, failures, exhausted
+
+
+##########################################################
+## MAIN
+##########################################################
+
+def main():
+    parser = argparse.ArgumentParser(description='Weighted load-test driver for the API')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8080')
+    parser.add_argument('--student', type=parse_credentials, required=True, help='email:password')
+    parser.add_argument('--instructor', type=parse_credentials, required=True, help='email:password')
+    parser.add_argument('--staff', type=parse_credentials, required=True, help='email:password')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=None, help='requests per process (overrides --duration)')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--student-id', type=int, default=1)
+    parser.add_argument('--major-id', type=int, default=1)
+    parser.add_argument('--activity-ids', type=int, nargs='+', default=[1], help='activities the student enrolls in, each once')
+    parser.add_argument('--edition-id', type=int, default=1, help='edition used for grades and exports')
+    parser.add_argument('--enroll-editions', type=int, nargs='+', help='editions the student enrolls in, each once (default: --edition-id)')
+    parser.add_argument('--degree-students', type=int, nargs='+', help='students enrolled in --major-id and unenrolled again (default: --student-id)')
+    parser.add_argument('--course-id', type=int, default=1)
+    parser.add_argument('--classes', type=int, nargs='+', default=[1], help='classes to enroll in; the first one is used for check-in and export')
+    parser.add_argument('--search', default='Ana', help='name typed in the person search (at least 3 characters)')
+    parser.add_argument('--weights', help='JSON file mapping route name to weight (0 disables a route)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default='', help='free-form label stored in the result file (e.g. git revision)')
+    parser.add_argument('--output', default='load-test-results.json')
+    args = parser.parse_args()
+
+    routes = [dict(r) for r in ROUTES]
+    if args.weights:
+        with open(args.weights) as f:
+            overrides = json.load(f)
+        for route in routes:
+            route['weight'] = overrides.get(route['name'], route['weight'])
+        routes = [r for r in routes if r['weight'] > 0]
+
+    credentials = {'student': args.student, 'instructor': args.instructor, 'staff': args.staff}
+    tokens = {role: login(args.base_url, *creds) for role, creds in credentials.items()}
+
+    config = {
+        'base_url': args.base_url,
+        'routes': routes,
+        'tokens': tokens,
+        'credentials': credentials,
+        'ids': {
+            'student_id': args.student_id,
+            'major_id': args.major_id,
+            'activity_id': args.activity_ids[0],
+            'edition_id': args.edition_id,
+            'course_id': args.course_id,
+            'classes': args.classes,
+            'class_id': args.classes[0],
+            'search': urllib.parse.quote(args.search),
+        },
+        'pools': {
+            'enroll_degree': args.degree_students or [args.student_id],
+            'enroll_activity': args.activity_ids,
+            'enroll_course_edition': args.enroll_editions or [args.edition_id],
+        },
+        'processes': args.processes,
+        'duration': args.duration if args.requests is None else float('inf'),
+        'requests': args.requests,
+        'timeout': args.timeout,
+        'seed': args.seed,
+    }
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(worker, [(i, config) for i in range(args.processes)])
+    elapsed = time.perf_counter() - start
+
+    latencies, statuses, failures, exhausted = merge(results, routes)
+    all_samples = [v for values in latencies.values() for v in values]
+
+    report = {
+        'label': args.label,
+        'base_url': args.base_url,
+        'processes': args.processes,
+        'elapsed_s': round(elapsed, 3),
+        'total': summarize(all_samples, elapsed),
+        'routes': {
+            name: dict(summarize(values, elapsed), statuses=statuses[name], failures=failures[name],
+                       error_rate=round(failures[name] / len(values), 4) if values else None)
+            for name, values in latencies.items()
+        },
+        'exhausted_pools': exhausted,
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+    print(f'{"route":<24}{"count":>8}{"failed":>8}{"err %":>8}{"rps":>10}{"p50":>10}{"p95":>10}{"p99":>10}{"max":>10}')
+    for name, stats in sorted(report['routes'].items()):
+        error_rate = f'{stats["error_rate"] * 100:.1f}' if stats['error_rate'] is not None else '-'
+        print(f'{name:<24}{stats["count"]:>8}{stats["failures"]:>8}{error_rate:>8}{stats["throughput_rps"]:>10}'
+              f'{str(stats["p50_ms"]):>10}{str(stats["p95_ms"]):>10}{str(stats["p99_ms"]):>10}{str(stats["max_ms"]):>10}')
+    for name, workers in sorted(exhausted.items()):
+        print(f'warning: {name} ran out of fresh ids in {workers} of {args.processes} processes')
+    print(f'results written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+##
+## =============================================
+## ============== Bases de Dados ===============
+## ============== LEI  2024/2025 ===============
+## =============================================
+## ============ Traffic replay harness =========
+## =============================================
+##
+## Re-issues a capture written by the API (API_CAPTURE_FILE) against a test
+## instance and compares status codes and latencies with the original run.
+##
+## Usage:
+##   python replay.py capture.jsonl --base-url http://127.0.0.1:8081 \
+##       --student s1@uc.pt:pass --instructor i1@uc.pt:pass --staff st1@uc.pt:pass \
+##       --speed 2 --output replay.json
+##
+## --speed 1 keeps the original pacing, --speed 2 replays twice as fast and
+## --speed 0 sends the requests back-to-back (bounded by --threads).
+##
+## Passwords are redacted in the capture. Logins of the accounts given with
+## --student/--instructor/--staff are replayed with their real password; other
+## redacted fields are sent as the placeholder.
+
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import http_request, login, parse_credentials, percentile
+
+
+##########################################################
+## HTTP CLIENT
+##########################################################
+
+def api_status(payload):
+    try:
+        response = json.loads(payload)
+    except ValueError:
+        return None
+    return response.get('status') if isinstance(response, dict) else None
+
+
+##########################################################
+## REPLAY
+##########################################################
+
+def load_capture(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda r: r['ts'])
+    return records
+
+
+REDACTED = '[redacted]'
+
+
+def restore_credentials(body, passwords):
+    # the capture redacts passwords: put back the known ones so that logins succeed
+    if isinstance(body, dict) and body.get('password') == REDACTED and body.get('email') in passwords:
+        return dict(body, password=passwords[body['email']])
+    return body
+
+
+def replay(records, base_url, tokens, speed, threads, timeout, passwords):
+    outcomes = [None] * len(records)
+    lock = threading.Lock()
+
+    def send(index, record):
+        token = tokens.get(record.get('role'))
+        start = time.perf_counter()
+        try:
+            body = restore_credentials(record.get('body'), passwords)
+            status, payload = http_request(base_url, record['method'], record['path'], token, body, timeout)
+            envelope = api_status(payload)
+        except Exception as error:
+            status, envelope = 'error', str(error)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        with lock:
+            outcomes[index] = {'status': status, 'api_status': envelope, 'duration_ms': elapsed_ms}
+
+    origin = records[0]['ts'] if records else 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for index, record in enumerate(records):
+            if speed > 0:
+                delay = (record['ts'] - origin) / speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(send, index, record)
+
+    return outcomes, time.monotonic() - start
+
+
+##########################################################
+## REPORTING
+##########################################################
+
+def latency_summary(values):
+    values = sorted(values)
+    rounded = lambda v: round(v, 3) if v is not None else None
+    return {
+        'p50_ms': rounded(percentile(values, 50)),
+        'p95_ms': rounded(percentile(values, 95)),
+        'p99_ms': rounded(percentile(values, 99)),
+        'max_ms': round(values[-1], 3) if values else None,
+    }
+
+
+def compare(records, outcomes):
+    routes = {}
+    mismatches = []
+    for record, outcome in zip(records, outcomes):
+        key = f'{record["method"]} {record.get("rule") or record["path"]}'
+        route = routes.setdefault(key, {'count': 0, 'status_mismatches': 0, 'original': [], 'replay': []})
+        route['count'] += 1
+        route['original'].append(record['duration_ms'])
+        route['replay'].append(outcome['duration_ms'])
+
+        same = outcome['status'] == record['status']
+        if record.get('api_status') is not None:
+            same = same and outcome['api_status'] == record['api_status']
+        if not same:
+            route['status_mismatches'] += 1
+            mismatches.append({
+                'method': record['method'],
+                'path': record['path'],
+                'original': [record['status'], record.get('api_status')],
+                'replay': [outcome['status'], outcome['api_status']],
+            })
+
+    report = {}
+    for key, route in routes.items():
+        original = latency_summary(route['original'])
+        replayed = latency_summary(route['replay'])
+        report[key] = {
+            'count': route['count'],
+            'status_mismatches': route['status_mismatches'],
+            'original': original,
+            'replay': replayed,
+            'p95_ratio': round(replayed['p95_ms'] / original['p95_ms'], 3) if original['p95_ms'] else None,
+        }
+    return report, mismatches
+
+
+##########################################################
+## MAIN
+##########################################################
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a captured traffic file against a test instance')
+    parser.add_argument('capture', help='JSONL file written by the API capture middleware')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8080')
+    parser.add_argument('--student', type=parse_credentials, help='email:password')
+    parser.add_argument('--instructor', type=parse_credentials, help='email:password')
+    parser.add_argument('--staff', type=parse_credentials, help='email:password')
+    parser.add_argument('--speed', type=float, default=1.0, help='pace multiplier (0 = as fast as possible)')
+    parser.add_argument('--threads', type=int, default=32, help='maximum requests in flight')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', default='replay-results.json')
+    args = parser.parse_args()
+
+    records = load_capture(args.capture)
+    if not records:
+        print('capture is empty')
+        return 1
+
+    tokens = {}
+    passwords = {}
+    for role in ('student', 'instructor', 'staff'):
+        credentials = getattr(args, role)
+        if credentials:
+            tokens[role] = login(args.base_url, *credentials)
+            passwords[credentials[0]] = credentials[1]
+
+    missing = {r['role'] for r in records if r.get('role') and r['role'] not in tokens}
+    if missing:
+        print(f'warning: no credentials for roles {sorted(missing)}, those requests are sent without a token')
+
+    outcomes, elapsed = replay(records, args.base_url, tokens, args.speed, args.threads, args.timeout, passwords)
+    routes, mismatches = compare(records, outcomes)
+
+    report = {
+        'capture': args.capture,
+        'base_url': args.base_url,
+        'speed': args.speed,
+        'requests': len(records),
+        'elapsed_s': round(elapsed, 3),
+        'status_mismatches': len(mismatches),
+        'routes': routes,
+        'mismatches': mismatches,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+    print(f'{"route":<56}{"count":>7}{"diff":>6}{"p95 orig":>10}{"p95 new":>10}')
+    for key, route in sorted(routes.items()):
+        print(f'{key:<56}{route["count"]:>7}{route["status_mismatches"]:>6}'
+              f'{str(route["original"]["p95_ms"]):>10}{str(route["replay"]["p95_ms"]):>10}')
+    print(f'{len(mismatches)} status mismatches, results written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
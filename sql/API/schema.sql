@@ -72,21 +72,30 @@ CREATE TABLE exam (
 	PRIMARY KEY(exam_id)
 );
 
+-- result and attendance are partitioned by academic year (2024 = 2024/2025),
+-- see sql/partitions.sql. Rows of years without a partition go to the
+-- default partition.
 CREATE TABLE result (
 	result_id		 BIGSERIAL,
 	score			 FLOAT(8) NOT NULL,
 	exam_exam_id		 BIGINT,
 	student_person_person_id BIGINT,
-	PRIMARY KEY(result_id,exam_exam_id,student_person_person_id)
-);
+	academic_year		 INTEGER NOT NULL,
+	PRIMARY KEY(result_id,exam_exam_id,student_person_person_id,academic_year)
+) PARTITION BY RANGE (academic_year);
+
+CREATE TABLE result_default PARTITION OF result DEFAULT;
 
 CREATE TABLE attendance (
 	attendance_id		 BIGSERIAL,
 	present			 BOOL NOT NULL,
 	class_class_id		 INTEGER,
 	student_person_person_id BIGINT,
-	PRIMARY KEY(attendance_id,class_class_id,student_person_person_id)
-);
+	academic_year		 INTEGER NOT NULL,
+	PRIMARY KEY(attendance_id,class_class_id,student_person_person_id,academic_year)
+) PARTITION BY RANGE (academic_year);
+
+CREATE TABLE attendance_default PARTITION OF attendance DEFAULT;
 
 CREATE TABLE department (
 	department_id BIGSERIAL,
@@ -231,12 +240,10 @@ ALTER TABLE major ADD CONSTRAINT major_fk1 FOREIGN KEY (course_course_id) REFERE
 ALTER TABLE coordinator ADD CONSTRAINT coordinator_fk1 FOREIGN KEY (instructor_worker_person_person_id) REFERENCES instructor(worker_person_person_id);
 ALTER TABLE assistant ADD CONSTRAINT assistant_fk1 FOREIGN KEY (instructor_worker_person_person_id) REFERENCES instructor(worker_person_person_id);
 ALTER TABLE payment ADD CONSTRAINT payment_fk1 FOREIGN KEY (fees_account_fees_account_id) REFERENCES fees_account(fees_account_id);
-ALTER TABLE extraactivities_fees ADD UNIQUE (status, extraactivities_activity_id);
 ALTER TABLE extraactivities_fees ADD CONSTRAINT extraactivities_fees_fk1 FOREIGN KEY (extraactivities_activity_id) REFERENCES extraactivities(activity_id);
 ALTER TABLE extraactivities_fees ADD CONSTRAINT extraactivities_fees_fk2 FOREIGN KEY (student_person_person_id) REFERENCES student(person_person_id);
 ALTER TABLE extraactivities_fees ADD CONSTRAINT extraactivities_fees_fk3 FOREIGN KEY (fees_account_fees_account_id) REFERENCES fees_account(fees_account_id);
 ALTER TABLE extraactivities_fees ADD CONSTRAINT constraint_0 CHECK (fees >= 0);
-ALTER TABLE major_info ADD UNIQUE (major_major_id);
 ALTER TABLE major_info ADD CONSTRAINT major_info_fk1 FOREIGN KEY (major_major_id) REFERENCES major(major_id);
 ALTER TABLE major_info ADD CONSTRAINT major_info_fk2 FOREIGN KEY (student_person_person_id) REFERENCES student(person_person_id);
 ALTER TABLE major_info ADD CONSTRAINT major_info_fk3 FOREIGN KEY (fees_account_fees_account_id) REFERENCES fees_account(fees_account_id);
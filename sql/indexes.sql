@@ -0,0 +1,33 @@
+-- ========================================================
+-- ======================= Indexes ========================
+-- ========================================================
+
+-- The primary keys of these tables do not start with the student column, so
+-- lookups and deletes by student (student details, delete_details and the
+-- bulk purge) had to scan the whole table.
+CREATE INDEX IF NOT EXISTS result_student_idx ON result (student_person_person_id);
+CREATE INDEX IF NOT EXISTS attendance_student_idx ON attendance (student_person_person_id);
+CREATE INDEX IF NOT EXISTS exam_student_student_idx ON exam_student (student_person_person_id);
+CREATE INDEX IF NOT EXISTS extraactivities_student_student_idx ON extraactivities_student (student_person_person_id);
+
+-- Covering index for the narrow listing of /get_persons/?fields=person_id,name:
+-- the rows come in person_id order from an index-only scan, without reading
+-- the table pages.
+CREATE INDEX IF NOT EXISTS person_id_name_idx ON person (person_id) INCLUDE (name);
+
+-- Payment status lookups by fees account (trigger_payment_status and
+-- reconcile_payment_status) were sequential scans of both fee tables.
+CREATE INDEX IF NOT EXISTS major_info_fees_account_idx ON major_info (fees_account_fees_account_id);
+CREATE INDEX IF NOT EXISTS extraactivities_fees_fees_account_idx ON extraactivities_fees (fees_account_fees_account_id);
+
+-- The schema used to declare UNIQUE (status, extraactivities_activity_id) on
+-- extraactivities_fees, which allowed a single 'Pending' and a single 'Paid'
+-- fee per activity: a second student could not enroll, and an import paying
+-- two students of the same activity failed. Dropped for existing databases.
+ALTER TABLE extraactivities_fees DROP CONSTRAINT IF EXISTS extraactivities_fees_status_extraactivities_activity_id_key;
+
+-- The schema also used to declare UNIQUE (major_major_id) on major_info, which
+-- allowed a single student per major: the second enrollment in any major
+-- (enroll_student_degree and the bulk enrollment) failed. Dropped for existing
+-- databases.
+ALTER TABLE major_info DROP CONSTRAINT IF EXISTS major_info_major_major_id_key;
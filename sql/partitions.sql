@@ -0,0 +1,76 @@
+-- ========================================================
+-- ================ Academic Year Partitions ===============
+-- ========================================================
+
+-- result and attendance are partitioned by academic_year (see schema.sql).
+-- An academic year starts in September and is named after its first year:
+-- 2024 is 2024/2025. Queries that filter on academic_year only read the
+-- partition of that year.
+
+CREATE OR REPLACE FUNCTION academic_year(p_date TIMESTAMP)
+RETURNS INTEGER AS $$
+    SELECT EXTRACT(YEAR FROM p_date - INTERVAL '8 months')::INTEGER;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION current_academic_year()
+RETURNS INTEGER AS $$
+    SELECT academic_year(CURRENT_DATE::TIMESTAMP);
+$$ LANGUAGE sql STABLE;
+
+-- Create the result and attendance partitions of an academic year. Rows of
+-- that year already stored in the default partition are moved to the new
+-- partition before it is attached. Partitions that already exist are kept.
+CREATE OR REPLACE FUNCTION create_academic_year_partitions(p_year INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_table TEXT;
+    v_partition TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['result', 'attendance'] LOOP
+        v_partition := format('%s_y%s', v_table, p_year);
+        IF to_regclass(v_partition) IS NOT NULL THEN
+            CONTINUE;
+        END IF;
+
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_partition, v_table);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %I WHERE academic_year = $1 RETURNING *) INSERT INTO %I SELECT * FROM moved',
+            v_table || '_default', v_partition
+        ) USING p_year;
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)',
+                       v_table, v_partition, p_year, p_year + 1);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Archive a closed academic year: its partitions are detached and moved to
+-- the archive schema. The rows are kept (archive.result_y2022, ...) but the
+-- API no longer reads them, so they can be dumped and dropped.
+CREATE OR REPLACE FUNCTION archive_academic_year(p_year INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_table TEXT;
+    v_partition TEXT;
+BEGIN
+    IF p_year >= current_academic_year() THEN
+        RAISE EXCEPTION 'Academic year % is not closed yet', p_year;
+    END IF;
+
+    CREATE SCHEMA IF NOT EXISTS archive;
+
+    FOREACH v_table IN ARRAY ARRAY['result', 'attendance'] LOOP
+        v_partition := format('%s_y%s', v_table, p_year);
+        IF to_regclass(v_partition) IS NULL THEN
+            RAISE EXCEPTION 'Table % has no partition for academic year %', v_table, p_year;
+        END IF;
+
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', v_table, v_partition);
+        EXECUTE format('ALTER TABLE %I SET SCHEMA archive', v_partition);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions of the previous, the current and the next academic year. The
+-- next year must be created again every summer, before September.
+SELECT create_academic_year_partitions(y)
+FROM generate_series(current_academic_year() - 1, current_academic_year() + 1) AS y;
@@ -0,0 +1,163 @@
+-- ========================================================
+-- ================== Stored Procedures ====================
+-- ========================================================
+
+-- Each function runs a whole multi-step flow of the API in a single call, so
+-- the checks and the writes take one round trip and the row locks are held
+-- only for the duration of the function. They return a JSON object with
+-- `error` (NULL on success), the HTTP status the API must answer with, and the
+-- values the API includes in its response.
+
+-- Procedure 1: Enroll a student in a major (POST /dbproj/enroll_degree/<major_id>)
+CREATE OR REPLACE FUNCTION enroll_student_degree(p_student_id BIGINT, p_major_id BIGINT)
+RETURNS JSON AS $$
+DECLARE
+    v_major_name TEXT;
+    v_current_status VARCHAR;
+    v_current_major TEXT;
+    v_fees_account_id BIGINT;
+BEGIN
+    PERFORM 1 FROM student WHERE person_person_id = p_student_id;
+    IF NOT FOUND THEN
+        RETURN json_build_object('error', 'Student not found', 'http_status', 404);
+    END IF;
+
+    SELECT major_name INTO v_major_name FROM major WHERE major_id = p_major_id;
+    IF NOT FOUND THEN
+        RETURN json_build_object('error', 'Major not found', 'http_status', 404);
+    END IF;
+
+    -- Lock the student's current record, if any, until the end of the transaction
+    SELECT mi.status, m.major_name INTO v_current_status, v_current_major
+    FROM major_info mi
+    JOIN major m ON mi.major_major_id = m.major_id
+    WHERE mi.student_person_person_id = p_student_id
+    FOR UPDATE OF mi;
+
+    IF FOUND THEN
+        -- 'Paid' is an active enrollment whose fees are covered
+        IF v_current_status IN ('Active', 'Paid') THEN
+            RETURN json_build_object(
+                'error', 'Student is already enrolled in major: ' || v_current_major || '. Must unenroll first.',
+                'http_status', 400
+            );
+        END IF;
+
+        -- Reactivate the inactive record with the new major
+        UPDATE major_info
+        SET major_major_id = p_major_id,
+            status = 'Active',
+            fees = 5000.00
+        WHERE student_person_person_id = p_student_id
+        RETURNING fees_account_fees_account_id INTO v_fees_account_id;
+    ELSE
+        INSERT INTO fees_account (values_acumulate) VALUES (0)
+        RETURNING fees_account_id INTO v_fees_account_id;
+
+        INSERT INTO major_info (student_person_person_id, major_major_id, fees, status, fees_account_fees_account_id)
+        VALUES (p_student_id, p_major_id, 5000.00, 'Active', v_fees_account_id);
+    END IF;
+
+    RETURN json_build_object(
+        'error', NULL,
+        'http_status', 200,
+        'major_name', v_major_name,
+        'fees_account_id', v_fees_account_id
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Procedure 2: Enroll a student in an extra activity (POST /dbproj/enroll_activity/<activity_id>)
+CREATE OR REPLACE FUNCTION enroll_student_activity(p_student_id BIGINT, p_activity_id BIGINT)
+RETURNS JSON AS $$
+DECLARE
+    v_activity_name TEXT;
+    v_fees_account_id BIGINT;
+BEGIN
+    SELECT name INTO v_activity_name FROM extraactivities WHERE activity_id = p_activity_id;
+    IF NOT FOUND THEN
+        RETURN json_build_object('error', 'Activity not found', 'http_status', 404);
+    END IF;
+
+    PERFORM 1
+    FROM extraactivities_student
+    WHERE student_person_person_id = p_student_id AND extraactivities_activity_id = p_activity_id;
+    IF FOUND THEN
+        RETURN json_build_object('error', 'Student is already enrolled in this activity', 'http_status', 400);
+    END IF;
+
+    INSERT INTO fees_account (values_acumulate) VALUES (0)
+    RETURNING fees_account_id INTO v_fees_account_id;
+
+    INSERT INTO extraactivities_student (student_person_person_id, extraactivities_activity_id)
+    VALUES (p_student_id, p_activity_id);
+
+    -- Default fee of 50 for every activity
+    INSERT INTO extraactivities_fees
+        (student_person_person_id, extraactivities_activity_id, fees, status, fees_account_fees_account_id)
+    VALUES (p_student_id, p_activity_id, 50.0, 'Pending', v_fees_account_id);
+
+    RETURN json_build_object(
+        'error', NULL,
+        'http_status', 200,
+        'activity_id', p_activity_id,
+        'activity_name', v_activity_name,
+        'fees_account_id', v_fees_account_id,
+        'fees', 50.0,
+        'status', 'Pending'
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Procedure 3: Recompute the payment status of every fee (POST /dbproj/payments/reconcile)
+-- One pass over each fee table joined with fees_account. Only the rows whose
+-- status is wrong are written. An extra activity fee is 'Paid' or 'Pending';
+-- major_info.status also holds the enrollment state, so only 'Active' and
+-- 'Paid' enrollments are considered: a major fee that is no longer covered
+-- goes back to 'Active' and inactive enrollments are left alone.
+CREATE OR REPLACE FUNCTION reconcile_payment_status()
+RETURNS JSON AS $$
+DECLARE
+    v_majors_paid INTEGER;
+    v_majors_reopened INTEGER;
+    v_activities_paid INTEGER;
+    v_activities_pending INTEGER;
+BEGIN
+    WITH changed AS (
+        UPDATE major_info mi
+        SET status = CASE WHEN mi.fees <= fa.values_acumulate THEN 'Paid' ELSE 'Active' END
+        FROM fees_account fa
+        WHERE mi.fees_account_fees_account_id = fa.fees_account_id
+        AND (
+            (mi.fees <= fa.values_acumulate AND mi.status = 'Active')
+            OR (mi.fees > fa.values_acumulate AND mi.status = 'Paid')
+        )
+        RETURNING mi.status
+    )
+    SELECT COUNT(*) FILTER (WHERE status = 'Paid'), COUNT(*) FILTER (WHERE status = 'Active')
+    INTO v_majors_paid, v_majors_reopened
+    FROM changed;
+
+    WITH changed AS (
+        UPDATE extraactivities_fees ef
+        SET status = CASE WHEN ef.fees <= fa.values_acumulate THEN 'Paid' ELSE 'Pending' END
+        FROM fees_account fa
+        WHERE ef.fees_account_fees_account_id = fa.fees_account_id
+        AND ef.status IN ('Pending', 'Paid')
+        AND ef.status <> CASE WHEN ef.fees <= fa.values_acumulate THEN 'Paid' ELSE 'Pending' END
+        RETURNING ef.status
+    )
+    SELECT COUNT(*) FILTER (WHERE status = 'Paid'), COUNT(*) FILTER (WHERE status = 'Pending')
+    INTO v_activities_paid, v_activities_pending
+    FROM changed;
+
+    RETURN json_build_object(
+        'error', NULL,
+        'http_status', 200,
+        'majors_paid', v_majors_paid,
+        'majors_reopened', v_majors_reopened,
+        'activities_paid', v_activities_paid,
+        'activities_pending', v_activities_pending
+    );
+END;
+$$ LANGUAGE plpgsql;
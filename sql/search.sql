@@ -0,0 +1,15 @@
+-- ========================================================
+-- ==================== Person Search =====================
+-- ========================================================
+
+-- Indexes used by GET /dbproj/persons/search. The name search needs the
+-- pg_trgm extension (part of the PostgreSQL contrib modules): its GIN
+-- operator class serves both the prefix match (ILIKE 'text%') and the
+-- similarity match (name % 'text') of the type-ahead.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS person_name_trgm_idx ON person USING gin (name gin_trgm_ops);
+
+-- Exact lookups by email (also used by the login); lookups by NIF use the
+-- unique index on (nif, email) created by the schema.
+CREATE INDEX IF NOT EXISTS person_email_idx ON person (email);
@@ -17,34 +17,47 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+DROP TRIGGER IF EXISTS trigger_update_mean ON result;
 CREATE TRIGGER trigger_update_mean
 AFTER INSERT OR UPDATE ON result
 FOR EACH ROW
 EXECUTE FUNCTION update_student_mean();
 
 -- Trigger 2: Update payment status when fees are fully paid
+-- Runs once per UPDATE statement on fees_account and reads the updated
+-- accounts from the transition table, so a bulk payment import touching
+-- thousands of accounts issues two set-based updates instead of two per row.
+-- Both lookups use the fees_account indexes of indexes.sql. major_info.status
+-- also holds the enrollment state, so only 'Active' enrollments and 'Pending'
+-- activity fees become 'Paid'; inactive enrollments are never touched.
 CREATE OR REPLACE FUNCTION update_payment_status()
 RETURNS TRIGGER AS $$
 BEGIN
     -- Update major_info payment status
-    UPDATE major_info
+    UPDATE major_info mi
     SET status = 'Paid'
-    WHERE fees_account_fees_account_id = NEW.fees_account_id
-    AND fees <= NEW.values_acumulate;
+    FROM new_accounts na
+    WHERE mi.fees_account_fees_account_id = na.fees_account_id
+    AND mi.fees <= na.values_acumulate
+    AND mi.status = 'Active';
 
     -- Update extraactivities_fees payment status
-    UPDATE extraactivities_fees
+    UPDATE extraactivities_fees ef
     SET status = 'Paid'
-    WHERE fees_account_fees_account_id = NEW.fees_account_id
-    AND fees <= NEW.values_acumulate;
+    FROM new_accounts na
+    WHERE ef.fees_account_fees_account_id = na.fees_account_id
+    AND ef.fees <= na.values_acumulate
+    AND ef.status = 'Pending';
 
-    RETURN NEW;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
+DROP TRIGGER IF EXISTS trigger_payment_status ON fees_account;
 CREATE TRIGGER trigger_payment_status
 AFTER UPDATE ON fees_account
-FOR EACH ROW
+REFERENCING NEW TABLE AS new_accounts
+FOR EACH STATEMENT
 EXECUTE FUNCTION update_payment_status();
 
 -- Trigger 3: Prevent enrollment when course capacity is reached
@@ -73,7 +86,63 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+DROP TRIGGER IF EXISTS trigger_check_capacity ON student_course;
 CREATE TRIGGER trigger_check_capacity
 BEFORE INSERT ON student_course
 FOR EACH ROW
-EXECUTE FUNCTION check_course_capacity(); 
\ No newline at end of file
+EXECUTE FUNCTION check_course_capacity();
+
+-- Trigger 4: Notify the API when reference data changes
+-- The API caches these tables in memory (REFERENCE DATA CACHE) and reloads
+-- them when reference_version changes or a notification arrives.
+CREATE TABLE IF NOT EXISTS reference_version (
+    version BIGINT NOT NULL
+);
+
+INSERT INTO reference_version (version)
+SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM reference_version);
+
+CREATE OR REPLACE FUNCTION notify_reference_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE reference_version SET version = version + 1;
+    PERFORM pg_notify('reference_data', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_reference_major ON major;
+CREATE TRIGGER trigger_reference_major
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON major
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_reference_change();
+
+DROP TRIGGER IF EXISTS trigger_reference_extraactivities ON extraactivities;
+CREATE TRIGGER trigger_reference_extraactivities
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON extraactivities
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_reference_change();
+
+DROP TRIGGER IF EXISTS trigger_reference_department ON department;
+CREATE TRIGGER trigger_reference_department
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON department
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_reference_change();
+
+DROP TRIGGER IF EXISTS trigger_reference_edition ON edition;
+CREATE TRIGGER trigger_reference_edition
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON edition
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_reference_change();
+
+DROP TRIGGER IF EXISTS trigger_reference_course ON course;
+CREATE TRIGGER trigger_reference_course
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON course
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_reference_change();
+
+DROP TRIGGER IF EXISTS trigger_reference_class ON class;
+CREATE TRIGGER trigger_reference_class
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON class
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_reference_change();